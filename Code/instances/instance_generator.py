@@ -1,8 +1,17 @@
 '''
 Script to automatize the process of generate instances, given certain parameters as input
+
+    python instance_generator.py --agents 5 --nodes 7 --capacity low --instances 5
+    python instance_generator.py --agents 30 --nodes 300 --density 0.05 --seed 1 --format npz
+
+All the commodities and edges are drawn at once with NumPy. Each agent has an edge between an ordered pair of nodes
+with probability density (1 gives complete digraphs) and a commodity with probability commodities_density.
+
+The instances are written in this folder by default. An instance is not written if its name is already taken by a text
+or .npz file (a .npz file next to a text instance is loaded instead of it, see src/lib/instances.py), unless --force is given.
 '''
 
-import pandas as pd
+import argparse
 import numpy as np
 import os
 
@@ -10,70 +19,90 @@ import os
 # ----------- INSTANCE PARAMETERS -------------
 # ---------------------------------------------
 
-# ------ Variable parameters
-# Number of agents
-N = 5
-# Capacity ratio: high/low
-cap_ratio = 'low'
-# Number of instances to generate
-num_instances = 5
-
-# ------ Fixed parameters
-# Number of vertices
-V = 7
-# Intervals specifying min and max values for the edges and commodities values
+# Intervals specifying min and max values (max not included) for the edges and commodities values
 edges_cost = [3,6]
 commodities_revenue = [1,2]
 commodities_units = [0,5]
-if cap_ratio == 'high':
-    # High capacity 
-    edges_capacity = [5,12]
-elif cap_ratio == 'low':
-    # Low capacity
-    edges_capacity = [2,8]
-
-
-for inst in range(num_instances):
-    # Instance name
-    instance_name = '%d_%s_%d' %(N,cap_ratio,inst)
-
-    # -----------------------------
-    # ---- INSTANCE GENERATION ----
-    # -----------------------------
-
-    commodities = {i:pd.DataFrame(columns = ['origin','terminal','owner','units','revenue'])for i in range(N)}
-    edges = {i:pd.DataFrame(columns=['head','tail','owner','cost','capacity']) for i in range(N)}
-
-    for i in range(N):
-        for v in range(V):
-            for w in range(V):
-                if v!=w:
-                    commodities[i] = commodities[i].append({'origin': v, 'terminal': w, 'owner':i,
-                                        'units':np.random.randint(commodities_units[0],commodities_units[1]),
-                                        'revenue':np.random.randint(commodities_revenue[0],commodities_revenue[1])},
-                                        ignore_index=True)
-
-                    edges[i] = edges[i].append({'head': v, 'tail': w, 'owner':i,
-                                'cost':np.random.randint(edges_cost[0],edges_cost[1]),
-                                'capacity':np.random.randint(edges_capacity[0],edges_capacity[1])},
-                                ignore_index=True)
-
-
-    # ----------------------------------
-    # ----- CREATION INSTANCE FILE -----
-    # ----------------------------------
-
-    file = open(os.path.join(os.path.join(os.path.dirname(__file__),instance_name)),"w")
-
-    file.write('%d %d\n' %(N,V))
-    for i in range(N):
-        file.write('Agent \n')
-        file.write('%d \n' %(i))
-        file.write('Commodities \n')
-        file.write(commodities[i].to_string(header=False, index=False))
-        file.write('\n')
-        file.write('Edges \n')
-        file.write(edges[i].to_string(header=False, index=False))
-        file.write('\n')
-
-    file.close()
+edges_capacity = {'high':[5,12], # High capacity
+                  'low':[2,8]} # Low capacity
+
+
+# -----------------------------
+# ---- INSTANCE GENERATION ----
+# -----------------------------
+
+def generate_instance(N, V, cap_ratio = 'low', density = 1.0, commodities_density = 1.0, rng = None):
+    # Returns two arrays, with the commodities (origin, terminal, owner, units, revenue) and the edges (head, tail, owner, cost, capacity)
+    # of all the agents, ordered by owner and then by origin/head and terminal/tail
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # All the ordered pairs of different nodes
+    v, w = np.nonzero(~np.eye(V, dtype = bool))
+    owner = np.repeat(np.arange(N), len(v))
+    v = np.tile(v, N)
+    w = np.tile(w, N)
+
+    keep = rng.random(len(v)) < commodities_density
+    commodities = np.column_stack((v[keep], w[keep], owner[keep],
+                                   rng.integers(commodities_units[0], commodities_units[1], keep.sum()),
+                                   rng.integers(commodities_revenue[0], commodities_revenue[1], keep.sum())))
+
+    keep = rng.random(len(v)) < density
+    edges = np.column_stack((v[keep], w[keep], owner[keep],
+                             rng.integers(edges_cost[0], edges_cost[1], keep.sum()),
+                             rng.integers(edges_capacity[cap_ratio][0], edges_capacity[cap_ratio][1], keep.sum())))
+
+    return commodities, edges
+
+
+# ----------------------------------
+# ----- CREATION INSTANCE FILE -----
+# ----------------------------------
+
+def write_text(path, N, V, commodities, edges):
+    with open(path, 'w') as file:
+        file.write('%d %d\n' %(N,V))
+        for i in range(N):
+            file.write('Agent \n')
+            file.write('%d \n' %(i))
+            file.write('Commodities \n')
+            np.savetxt(file, commodities[commodities[:,2] == i], fmt = '%d')
+            file.write('Edges \n')
+            np.savetxt(file, edges[edges[:,2] == i], fmt = '%d')
+
+
+def write_binary(path, N, V, commodities, edges):
+    # Same format as the files written by src/convert_instances.py
+    np.savez(path + '.npz', N = N, num_nodes = V, commodities = commodities.astype(np.int64), edges = edges.astype(np.int64))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Generates random instances')
+    parser.add_argument('--agents', type = int, default = 5, help = 'number of agents')
+    parser.add_argument('--nodes', type = int, default = 7, help = 'number of nodes')
+    parser.add_argument('--capacity', choices = sorted(edges_capacity), default = 'low', help = 'capacity regime of the edges')
+    parser.add_argument('--density', type = float, default = 1.0, help = 'probability of each edge of each agent')
+    parser.add_argument('--commodities-density', type = float, default = 1.0, help = 'probability of each commodity of each agent')
+    parser.add_argument('--instances', type = int, default = 5, help = 'number of instances to generate')
+    parser.add_argument('--seed', type = int, default = None, help = 'seed of the random generator')
+    parser.add_argument('--format', choices = ['text','npz'], default = 'text', help = 'format of the instance files')
+    parser.add_argument('--directory', default = os.path.dirname(os.path.abspath(__file__)), help = 'folder where the instances are written')
+    parser.add_argument('--force', action = 'store_true', help = 'overwrite the instances with the same names')
+    args = parser.parse_args()
+
+    # Instance names, checked before writing any instance
+    paths = [os.path.join(args.directory, '%d_%s_%d' %(args.agents,args.capacity,inst)) for inst in range(args.instances)]
+    taken = [name for path in paths for name in (path, path + '.npz') if os.path.exists(name)]
+    if taken and not args.force:
+        parser.error('these instances already exist (use --force to overwrite them or --directory to write elsewhere): %s' %(', '.join(taken)))
+
+    os.makedirs(args.directory, exist_ok = True)
+    rng = np.random.default_rng(args.seed)
+    for path in paths:
+        commodities, edges = generate_instance(args.agents, args.nodes, args.capacity, args.density, args.commodities_density, rng)
+        if args.format == 'text':
+            write_text(path, args.agents, args.nodes, commodities, edges)
+        else:
+            write_binary(path, args.agents, args.nodes, commodities, edges)
+        print(path)
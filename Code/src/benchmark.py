@@ -0,0 +1,248 @@
+'''
+Benchmark of the mechanisms over families of instances, with a stored baseline to detect performance regressions.
+
+Each family is a set of instances: the shipped ones, or instances generated with a fixed seed (so the same instances are
+generated in every run) by instances/instance_generator.py. Every mechanism is run on every instance several times
+(repeats), each run in its own process, and the running time, peak memory, payoff, largest gap, and total solve time and
+branch-and-bound nodes of the models of each run are recorded. The stand-alone solutions needed by the cooperation
+mechanisms are computed once per instance, in other processes, so the runs only measure the mechanism. The runs of each (instance, mechanism) are summarised (mean, standard deviation, minimum and maximum
+time) and compared with the summary stored as baseline, flagging the ones which are slower, use more memory, give another
+payoff or a larger gap.
+
+    python benchmark.py --families small medium --repeats 3 --save-baseline     # store the baseline
+    python benchmark.py --families small medium --repeats 3                     # compare with it
+    python benchmark.py --families shipped_2 --mechanisms full_cooperation --tolerance 0.2 --output runs.csv
+    python benchmark.py --families small medium --cuts static                   # nodes and solve times with the cuts of lib/cuts.py
+    python benchmark.py --families large --engine matrix --lazy-subtours --heuristic none
+'''
+
+# Python packages
+import argparse
+from collections import namedtuple
+import concurrent.futures as cf
+import importlib.util
+import json
+import os
+import resource
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Own modules
+import lib.classes as cl
+import lib.instances as ins
+import lib.backends as bk
+import runner
+import main_no_cooperation
+
+MECHANISMS = ['no_cooperation','full_cooperation','partial_cooperation','residual_cooperation','iterative_cooperation']
+BASELINE_MECHANISMS = ['full_cooperation','partial_cooperation','residual_cooperation'] # Mechanisms which are given the stand-alone solutions
+BASELINE_FILE = os.path.join(os.path.dirname(__file__),os.pardir,'benchmark_baseline.csv')
+
+# Family of generated instances: number of agents (N), nodes (V), capacity regime, density of the edges, number of
+# instances and seed of the generator
+Family = namedtuple('Family','N V cap_ratio density instances seed', defaults = (1.0, 3, 0))
+
+FAMILIES = {'small':[Family(2,4,'low'), Family(2,4,'high')],
+            'medium':[Family(3,5,'low'), Family(3,5,'high')],
+            'large':[Family(5,7,'low'), Family(5,7,'high')],
+            'sparse':[Family(5,10,'low',0.4), Family(5,10,'high',0.4)],
+            'shipped_2':['2_%s_%d' %(cap,k) for cap in ('low','high') for k in range(5)],
+            'shipped_5':['5_%s_%d' %(cap,k) for cap in ('low','high') for k in range(5)]}
+
+
+# ---------------------------------
+# ---- Instances
+# ---------------------------------
+
+def load_generator():
+    # The generator is a script of the instances folder, not a module of src
+    spec = importlib.util.spec_from_file_location('instance_generator', os.path.join(ins.INSTANCES_DIRECTORY,'instance_generator.py'))
+    generator = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(generator)
+    return generator
+
+
+def family_instances(name):
+    # Names of the instances of the family (relative to the instances folder), generating them if needed
+    instance_list = []
+    generator = None
+    for family in FAMILIES[name]:
+        if isinstance(family, str): # Shipped instance
+            instance_list.append(family)
+            continue
+        if generator is None:
+            generator = load_generator()
+        directory = os.path.join('benchmark', name)
+        os.makedirs(ins.instance_path(directory), exist_ok = True)
+        # The seed depends on the parameters of the family, so each one has its own instances
+        rng = np.random.default_rng([family.seed, family.N, family.V, int(family.density*100), family.cap_ratio == 'high'])
+        for k in range(family.instances):
+            instance = os.path.join(directory, '%d_%d_%s_%d.npz' %(family.N, family.V, family.cap_ratio, k))
+            commodities, edges = generator.generate_instance(family.N, family.V, family.cap_ratio, family.density, 1.0, rng)
+            generator.write_binary(ins.instance_path(instance)[:-len('.npz')], family.N, family.V, commodities, edges)
+            instance_list.append(instance)
+    return instance_list
+
+
+# ---------------------------------
+# ---- Jobs (run in the workers)
+# ---------------------------------
+
+def run_baseline(instance, settings):
+    # Stand-alone solution of the agents, given to the runs of the cooperation mechanisms (not measured)
+    return main_no_cooperation.no_cooperation(instance, settings, None)
+
+
+def run_job(family, instance, mechanism, repeat, settings, baseline = None):
+    # Runs the mechanism on the instance, and returns its row of the benchmark
+    # The process only runs this job (the baseline is computed in another one), so its peak memory is the one of the mechanism
+    with tempfile.TemporaryDirectory() as directory:
+        stats_file = os.path.join(directory,'stats.jsonl')
+        if mechanism == 'no_cooperation':
+            job_result = runner.run_baseline(instance, settings._replace(stats_file = stats_file), None)[1]
+        else:
+            job_result = runner.run_mechanism(instance, mechanism, settings._replace(stats_file = stats_file), baseline, None)
+        models = []
+        if os.path.exists(stats_file):
+            with open(stats_file) as file:
+                models = [json.loads(line) for line in file]
+
+    gaps = [model['gap'] for model in models if model.get('gap') is not None]
+    return {'family':family, 'instance':instance, 'mechanism':mechanism, 'repeat':repeat,
+            'payoff':job_result.value, 'time':job_result.time,
+            'memory':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024, # Peak of the process in MB (one job per process)
+            'gap':max(gaps) if gaps else None, 'models':len(models),
+            'solve_time':sum(model.get('solve_time',0) for model in models), 'nodes':sum(model.get('nodes') or 0 for model in models),
+            'error':job_result.error}
+
+
+def run_benchmark(families, mechanisms, repeats, settings, workers = 1):
+    # Returns the data frame with one row per run
+    # With workers = 1 the runs don't compete for the cores and memory, so their times can be compared between benchmarks
+    jobs = [(family, instance, mechanism, repeat) for family in families for instance in family_instances(family)
+            for mechanism in mechanisms for repeat in range(repeats)]
+    with cf.ProcessPoolExecutor(max_workers = workers, max_tasks_per_child = 1) as pool:
+        # The baselines are deterministic, so each instance has one, used by all the runs of its mechanisms which need it
+        # (iterative cooperation computes its own stand-alone solutions). They are computed before the runs, so they don't compete with them
+        instances = dict.fromkeys(job[1] for job in jobs if job[2] in BASELINE_MECHANISMS)
+        baseline_futures = {instance:pool.submit(run_baseline, instance, settings) for instance in instances}
+        baselines, baseline_errors = {}, {}
+        for instance, future in baseline_futures.items():
+            try:
+                baselines[instance] = future.result()
+            except Exception as error:
+                baseline_errors[instance] = 'The baseline failed: %r' %(error)
+
+        # The runs of the mechanisms of an instance whose baseline failed are not run
+        failed = lambda job: job[2] in BASELINE_MECHANISMS and job[1] in baseline_errors
+        futures = [None if failed(job) else pool.submit(run_job, *job, settings, baselines.get(job[1]) if job[2] in BASELINE_MECHANISMS else None)
+                   for job in jobs]
+        rows = []
+        for job, future in zip(jobs, futures):
+            family, instance, mechanism, repeat = job
+            try:
+                error = baseline_errors[instance] if failed(job) else None
+                if error is None:
+                    rows.append(future.result())
+            except Exception as worker_error: # The worker failed or died
+                error = repr(worker_error)
+            if error is not None:
+                rows.append({'family':family, 'instance':instance, 'mechanism':mechanism, 'repeat':repeat, 'error':error})
+            if rows[-1]['error'] is not None:
+                print('%s in %s failed: %s' %(job[2], job[1], rows[-1]['error']))
+    return pd.DataFrame(rows, columns = ['family','instance','mechanism','repeat','payoff','time','memory','gap','models','solve_time','nodes','error'])
+
+
+# ---------------------------------
+# ---- Summary and regressions
+# ---------------------------------
+
+def summarize(runs_df):
+    # One row per (instance, mechanism), with the statistics of its runs (the values of the failed runs are not counted)
+    solved = runs_df.copy()
+    solved.loc[solved['error'].notna(), ['payoff','time','memory','gap','solve_time','nodes']] = np.nan
+    summary = solved.groupby(['family','instance','mechanism']).agg(
+        runs = ('error', lambda errors: errors.isna().sum()), time_mean = ('time','mean'), time_std = ('time','std'), time_min = ('time','min'),
+        time_max = ('time','max'), memory = ('memory','max'), payoff = ('payoff','first'), payoffs = ('payoff','nunique'),
+        gap = ('gap','max'), solve_time = ('solve_time','mean'), nodes = ('nodes','mean'))
+    return summary.reset_index()
+
+
+def compare(summary_df, baseline_df, tolerance = 0.1, min_time = 0.5):
+    # Adds to the summary the values of the baseline and the regressions found:
+    #   - 'time': mean time larger than the baseline by more than tolerance (relative) and min_time (seconds)
+    #   - 'memory': peak memory larger than the baseline by more than tolerance
+    #   - 'payoff': another payoff (or more than one payoff between the repeats)
+    #   - 'gap': larger gap than the baseline
+    #   - 'failed': solved in the baseline and not now
+    # The baselines stored before the solve times and nodes were recorded don't have them
+    baseline_df = baseline_df.reindex(columns = ['instance','mechanism','time_mean','memory','payoff','gap','solve_time','nodes'])
+    comparison = baseline_df.merge(summary_df, on = ['instance','mechanism'], how = 'right', suffixes = ('_baseline',''))
+
+    def regressions(row):
+        flags = []
+        if row['time_mean'] > row['time_mean_baseline']*(1 + tolerance) and row['time_mean'] - row['time_mean_baseline'] > min_time:
+            flags.append('time')
+        if row['memory'] > row['memory_baseline']*(1 + tolerance):
+            flags.append('memory')
+        if row['payoffs'] > 1 or (pd.notna(row['payoff_baseline']) and abs(row['payoff'] - row['payoff_baseline']) > 1e-6):
+            flags.append('payoff')
+        if pd.notna(row['gap']) and pd.notna(row['gap_baseline']) and row['gap'] > row['gap_baseline'] + 1e-6:
+            flags.append('gap')
+        if row['runs'] == 0 and pd.notna(row['time_mean_baseline']):
+            flags.append('failed')
+        return ' '.join(flags)
+
+    comparison['regressions'] = comparison.apply(regressions, axis = 1) if len(comparison) else ''
+    comparison['time_change%'] = (comparison['time_mean']/comparison['time_mean_baseline'] - 1)*100
+    return comparison
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark of the mechanisms over families of instances')
+    parser.add_argument('--families', nargs = '+', choices = sorted(FAMILIES), default = ['small','medium','shipped_2'])
+    parser.add_argument('--mechanisms', nargs = '+', choices = MECHANISMS, default = MECHANISMS)
+    parser.add_argument('--repeats', type = int, default = 3)
+    parser.add_argument('--workers', type = int, default = 1, help = 'runs at the same time (1 to compare the times)')
+    parser.add_argument('--time-limit', type = float, default = 600)
+    parser.add_argument('--threads', type = int, default = 1)
+    parser.add_argument('--baseline', default = BASELINE_FILE, help = 'CSV file with the stored baseline')
+    parser.add_argument('--save-baseline', action = 'store_true', help = 'store the summary of this benchmark as baseline')
+    parser.add_argument('--tolerance', type = float, default = 0.1, help = 'relative increase of time and memory flagged as regression')
+    parser.add_argument('--min-time', type = float, default = 0.5, help = 'smaller increases of the mean time (seconds) are not flagged')
+    parser.add_argument('--agent-workers', type = int, default = 1, help = 'stand-alone models of the agents solved at the same time')
+    parser.add_argument('--lazy-subtours', action = 'store_true', help = 'separate the subtour elimination constraints when a solution is found')
+    parser.add_argument('--engine', choices = ['arc','matrix','path','benders'], default = 'arc', help = 'formulation of the cooperation models')
+    parser.add_argument('--heuristic', choices = ['none','start','only'], default = 'start', help = 'use of the greedy routes (MIP start or solution)')
+    parser.add_argument('--backend', choices = bk.BACKENDS, default = 'cplex')
+    parser.add_argument('--no-presolve', dest = 'presolve', action = 'store_false', help = 'keep the edges and commodities which cannot have flow')
+    parser.add_argument('--cuts', choices = ['none','static','pool'], default = 'none', help = 'linking and cover inequalities (see lib/cuts.py)')
+    parser.add_argument('--output', default = None, help = 'CSV file to write the runs')
+    args = parser.parse_args()
+
+    # The greedy start is deterministic, and one thread per solve gives repeatable times
+    settings = cl.SolverSettings(time_limit = args.time_limit, lazy_subtours = args.lazy_subtours, threads = args.threads, agent_workers = args.agent_workers,
+                                 engine = args.engine, heuristic = args.heuristic, backend = args.backend, presolve = args.presolve, cuts = args.cuts)
+
+    runs_df = run_benchmark(args.families, args.mechanisms, args.repeats, settings, args.workers)
+    summary_df = summarize(runs_df)
+    if args.output is not None:
+        runs_df.to_csv(args.output, index = False)
+
+    pd.set_option('display.width', 200)
+    if args.save_baseline:
+        summary_df.to_csv(args.baseline, index = False)
+        print(summary_df.round(3).to_string(index = False))
+        print('Baseline stored in %s' %(args.baseline))
+    elif os.path.exists(args.baseline):
+        comparison_df = compare(summary_df, pd.read_csv(args.baseline), args.tolerance, args.min_time)
+        print(comparison_df[['instance','mechanism','runs','time_mean','time_mean_baseline','time_change%','memory','memory_baseline',
+                             'payoff','payoff_baseline','gap','solve_time','solve_time_baseline','nodes','nodes_baseline','regressions']].round(3).to_string(index = False))
+        flagged = comparison_df[comparison_df['regressions'] != '']
+        print('%d regressions in %d (instance, mechanism)' %(len(flagged), len(comparison_df)))
+        sys.exit(1 if len(flagged) else 0)
+    else:
+        print(summary_df.round(3).to_string(index = False))
+        print('No baseline in %s (store one with --save-baseline)' %(args.baseline))
@@ -0,0 +1,92 @@
+'''
+Compares the solvers (backends) on the instances. For each instance and backend, the stand-alone model of each agent and
+the cooperation models are solved, and the objective, status, gap and running time of each solve are reported.
+
+    python compare_backends.py
+    python compare_backends.py --backends cplex highs --instances 2_low_0 2_high_0 --time-limit 600 --output comparison.csv
+'''
+
+# Python packages
+import argparse
+import pandas as pd
+import time
+
+# Own scripts
+import lib.classes as cl
+import lib.models as mdls
+import lib.functions as fn
+import lib.backends as bk
+import main_no_cooperation
+
+shipped_instances = ['%d_%s_%d' %(n,cap,k) for n in (2,5) for cap in ('low','high') for k in range(5)]
+
+
+def solve_row(instance, backend, model_name, model, settings):
+    # Solves the model and returns the row of the comparison
+    init_time = time.time()
+    try:
+        solution = mdls.solve_model(model, settings.time_limit, settings.threads, backend)
+    except Exception as error: # Backend not installed, size limits of the solver...
+        return {'instance':instance,'backend':backend,'model':model_name,'objective':None,'status':repr(error),'gap':None,'time':time.time() - init_time}, None
+    run_time = time.time() - init_time
+    stats = fn.solve_statistics(model)
+    result = fn.model_result(model) if solution else None
+    return {'instance':instance,'backend':backend,'model':model_name,'objective':result['objective'] if result else None,
+            'status':stats['status'],'gap':stats['gap'],'time':run_time}, result
+
+
+def compare(instance, backend, settings):
+    rows = []
+    N, V, commodities, edges = fn.read_data(instance)
+    baseline = cl.Baseline(N, V, commodities, edges)
+
+    # Stand-alone models
+    for agent in baseline.create_agents():
+        model = mdls.build_single_agent_model(V, agent.edges, agent.commodities, settings.lazy_subtours, agent.index, settings.presolve, settings.cuts)
+        row, result = solve_row(instance, backend, 'single_agent_%d' %(agent.id), model, settings)
+        rows.append(row)
+        if result is None:
+            return rows # The cooperation models need the stand-alone solutions
+        fn.apply_single_agent_result(result, agent)
+        agent.payoff_no_cooperation = result['objective']
+        baseline.add_agent_solution(agent, result['edges_costs'])
+
+    # Cooperation models
+    for type_cooperation in ('full_cooperation','partial_cooperation','residual_cooperation'):
+        agents_list = baseline.create_agents()
+        central_planner = cl.CentralizedSystem(agents_list, type_cooperation)
+        if type_cooperation == 'full_cooperation':
+            agents_minimal_profit = [agent.payoff_no_cooperation for agent in agents_list]
+        elif type_cooperation == 'partial_cooperation':
+            agents_minimal_profit = [agent.payoff_no_cooperation + baseline.edges_costs.get(agent.id,0) for agent in agents_list]
+        else:
+            agents_minimal_profit = None
+        model = mdls.build_cooperation_model(V, central_planner.edges, central_planner.commodities, type_cooperation, agents_minimal_profit, settings.lazy_subtours, central_planner.index, settings.presolve, settings.cuts)
+        rows.append(solve_row(instance, backend, type_cooperation, model, settings)[0])
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Compares the runtime and gap of the backends')
+    parser.add_argument('--backends', nargs = '+', choices = bk.BACKENDS, default = list(bk.BACKENDS))
+    parser.add_argument('--instances', nargs = '+', default = shipped_instances)
+    parser.add_argument('--time-limit', type = float, default = 5400)
+    parser.add_argument('--threads', type = int, default = 0)
+    parser.add_argument('--lazy-subtours', action = 'store_true')
+    parser.add_argument('--output', default = None, help = 'CSV file to write the comparison')
+    args = parser.parse_args()
+
+    settings = cl.SolverSettings(time_limit = args.time_limit, lazy_subtours = args.lazy_subtours, threads = args.threads)
+
+    rows = []
+    for instance in args.instances:
+        for backend in args.backends:
+            rows += compare(instance, backend, settings)
+    comparison_df = pd.DataFrame(rows)
+
+    pd.set_option('display.width', 200)
+    print(comparison_df.to_string(index = False))
+    print()
+    print(comparison_df.groupby('backend').agg(total_time = ('time','sum'), max_gap = ('gap','max'), solved = ('objective','count')))
+    if args.output is not None:
+        comparison_df.to_csv(args.output, index = False)
@@ -0,0 +1,28 @@
+'''
+Converts text instances to the binary (.npz) format, which read_data loads without parsing.
+
+    python convert_instances.py              # all the text instances in the instances folder
+    python convert_instances.py 5_low_0 ...  # only the given instances (names in the instances folder or paths)
+'''
+
+# Python packages
+import argparse
+import os
+
+# Own scripts
+import lib.instances as ins
+
+
+def text_instances():
+    # Files of the instances folder which are text instances (not scripts or binary files)
+    return sorted(name for name in os.listdir(ins.INSTANCES_DIRECTORY)
+                  if os.path.isfile(ins.instance_path(name)) and not name.endswith(('.py','.npz')))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Converts text instances to the binary format')
+    parser.add_argument('instances', nargs = '*', help = 'instances to convert (all the text instances by default)')
+    args = parser.parse_args()
+
+    for instance in args.instances or text_instances():
+        print('%s -> %s' %(instance, ins.convert(instance)))
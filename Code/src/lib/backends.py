@@ -0,0 +1,396 @@
+'''
+Solvers which can be used to solve the models of lib/models.py.
+
+The models are always built with docplex. With the 'cplex' backend they are solved directly, and with the other backends
+the model is exported to the LP format (with docplex's own writer, which doesn't need CPLEX nor has size limits), solved
+with an open-source solver, and the values of the variables are set back as the solution of the docplex model, so
+everything that reads the solution (recovery of the data, subtour separation) works the same way with all backends.
+
+    - 'highs': HiGHS (highspy package)
+    - 'cbc': COIN-OR CBC (cbc executable in the PATH)
+    - 'cpsat': OR-Tools CP-SAT (ortools package), through the model builder of OR-Tools. Its LP reader only takes the
+      lp_solve format, so the LP file is read here (read_lp, only the parts of the format written by docplex and by
+      lib/matrix.py) and the model is built with the model builder
+
+The open-source solvers don't support lexicographic objectives nor indicator constraints, so before exporting the model
+the objectives are combined in one weighted objective (exact when the objectives only take integer values, as in our
+models) and the indicator constraints are written with big-M constraints computed from the bounds of the variables.
+MIP starts are only used by CPLEX.
+'''
+
+import math
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+BACKENDS = ('cplex','highs','cbc','cpsat')
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------------- SOLVE --------------------------------------
+# -----------------------------------------------------------------------------------
+
+def solve(mdl, backend = 'cplex', time_limit = None, threads = 0):
+    # Solves the model with the backend, and returns its solution (None if no solution was found)
+    # For the open-source backends, the statistics of the solve are stored in mdl.backend_details (see functions.solve_statistics)
+    if backend == 'cplex':
+        mdl.backend_details = None
+        if time_limit is not None:
+            mdl.set_time_limit(time_limit)
+        if threads:
+            mdl.parameters.threads = threads
+        return mdl.solve()
+    elif backend == 'highs':
+        solver = solve_highs
+    elif backend == 'cbc':
+        solver = solve_cbc
+    elif backend == 'cpsat':
+        solver = solve_cpsat
+    else:
+        raise ValueError('Unknown backend %s' %(backend))
+
+    init_time = time.time()
+    values, details = solver(export_lp(mdl), time_limit, threads)
+    details['solve_time'] = time.time() - init_time
+    mdl.backend_details = details
+    if values is None:
+        mdl._set_solution(None)
+        return None
+
+    values = variable_values(mdl, values)
+    # The objective value is the one of the first objective (as CPLEX gives with lexicographic objectives)
+    objective_value = mdl.new_solution(values).get_value(primary_objective(mdl))
+    solution = mdl.new_solution(values, objective_value = objective_value)
+    mdl._set_solution(solution)
+    return solution
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------------ EXPORT --------------------------------------
+# -----------------------------------------------------------------------------------
+
+def export_lp(mdl):
+    # LP format of the model, without lexicographic objectives, indicator constraints nor user cuts (the model is not modified)
+    if mdl.has_multi_objective() or mdl.number_of_indicator_constraints:
+        original, mdl = mdl, mdl.clone()
+        if mdl.has_multi_objective():
+            weighted_objective(mdl)
+        linearize_indicators(mdl)
+        copy_user_cuts(original, mdl)
+    lp = mdl.export_as_lp_string(hide_user_names = True)
+    # The user cuts (see lib/cuts.py) are valid inequalities, so they are given as constraints
+    return lp.replace('\nUser Cuts\n', '\n')
+
+
+def variable_values(mdl, values):
+    # Values of the variables of the model from the values by name of the solvers, without the zeros
+    # The variables are exported with their index as name (x1 is the variable with index 0)
+    return {mdl.get_var_by_index(int(name[1:]) - 1):value for name, value in values.items() if abs(value) > 1e-9}
+
+
+def copy_user_cuts(mdl, copy):
+    # clone doesn't copy the user cuts, so they are added to the copy as constraints, with the variables of the copy
+    for cut in mdl.iter_user_cut_constraints():
+        expr = difference(mdl, cut.lhs, cut.rhs)
+        expr = copy.linear_expr({copy.get_var_by_index(var.index):coef for var, coef in expr.iter_terms()}, constant = expr.constant)
+        if cut.sense.name in ('LE','EQ'):
+            copy.add_constraint(expr <= 0)
+        if cut.sense.name in ('GE','EQ'):
+            copy.add_constraint(expr >= 0)
+
+
+def primary_objective(mdl):
+    if mdl.has_multi_objective():
+        return max(mdl.iter_multi_objective_tuples(), key = lambda t: t[1])[0]
+    return mdl.objective_expr
+
+
+def expr_range(expr):
+    # Minimum and maximum value of the linear expression, given the bounds of its variables
+    low = high = expr.constant
+    for var, coef in expr.iter_terms():
+        low += coef*(var.lb if coef > 0 else var.ub)
+        high += coef*(var.ub if coef > 0 else var.lb)
+    return low, high
+
+
+def weighted_objective(mdl):
+    # Replaces the lexicographic objective by one objective, where each objective has a weight larger than the range of the next ones
+    exprs = [expr for expr, priority, *_ in sorted(mdl.iter_multi_objective_tuples(), key = lambda t: -t[1])]
+    objective = exprs[0]
+    for expr in exprs[1:]:
+        low, high = expr_range(mdl.linear_expr(expr))
+        objective = objective*(high - low + 1) + expr
+    if mdl.is_maximized():
+        mdl.maximize(objective)
+    else:
+        mdl.minimize(objective)
+
+
+def difference(mdl, lhs, rhs):
+    # lhs - rhs, built from the terms (docplex fails subtracting constant expressions)
+    # The sides can be variables (e.g. the linking cuts f[e,c] <= u[e]) or constants, so they are converted to expressions first
+    lhs, rhs = lhs.to_linear_expr(), rhs.to_linear_expr()
+    terms = {}
+    for var, coef in lhs.iter_terms():
+        terms[var] = terms.get(var,0) + coef
+    for var, coef in rhs.iter_terms():
+        terms[var] = terms.get(var,0) - coef
+    return mdl.linear_expr(terms, constant = lhs.constant - rhs.constant)
+
+
+def linearize_indicators(mdl):
+    # Replaces each indicator constraint (binary = active value -> lhs <= rhs) by lhs - rhs <= M*(1 - binary) (or M*binary if the active value is 0)
+    for indicator in list(mdl.iter_indicator_constraints()):
+        ct = indicator.linear_constraint
+        binary = indicator.binary_var
+        inactive = (1 - binary) if indicator.active_value == 1 else binary
+        expr = difference(mdl, ct.lhs, ct.rhs)
+        low, high = expr_range(expr)
+        if ct.sense.name in ('LE','EQ'):
+            mdl.add_constraint(expr <= max(high,0)*inactive)
+        if ct.sense.name in ('GE','EQ'):
+            mdl.add_constraint(expr >= min(low,0)*inactive)
+        mdl.remove_constraint(indicator)
+
+
+# -----------------------------------------------------------------------------------
+# ----------------------------------- SOLVERS --------------------------------------
+# -----------------------------------------------------------------------------------
+
+# Each solver returns the values of the variables by name (None if no solution was found) and the statistics of the solve
+
+def solve_highs(lp, time_limit, threads):
+    import highspy
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory,'model.lp')
+        with open(path,'w') as file:
+            file.write(lp)
+        highs = highspy.Highs()
+        highs.setOptionValue('output_flag', False)
+        if time_limit is not None:
+            highs.setOptionValue('time_limit', float(time_limit))
+        if threads:
+            highs.setOptionValue('threads', threads)
+        highs.readModel(path)
+        highs.run()
+
+    info = highs.getInfo()
+    details = {'status':highs.modelStatusToString(highs.getModelStatus()),'gap':info.mip_gap,'nodes':info.mip_node_count}
+    if info.primal_solution_status != 2: # 2 is a feasible solution
+        return None, details
+    return highs_values(highs), details
+
+
+def highs_values(highs):
+    # Values of the columns of the solution by name (getColName gives the status of the call and the name)
+    col_value = highs.getSolution().col_value
+    return {highs.getColName(i)[1]:col_value[i] for i in range(len(col_value))}
+
+
+def solve_cbc(lp, time_limit, threads):
+    if shutil.which('cbc') is None:
+        raise RuntimeError('The cbc executable was not found in the PATH')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory,'model.lp')
+        solution_path = os.path.join(directory,'solution.txt')
+        with open(path,'w') as file:
+            file.write(lp)
+        command = ['cbc', path]
+        if time_limit is not None:
+            command += ['sec', str(time_limit)]
+        if threads:
+            command += ['threads', str(threads)]
+        command += ['solve', 'solu', solution_path]
+        output = subprocess.run(command, capture_output = True, text = True).stdout
+        nodes = re.search(r'Enumerated nodes:\s*(\d+)', output)
+        details = {'status':'unknown','gap':None,'nodes':int(nodes.group(1)) if nodes else 0}
+        if not os.path.exists(solution_path):
+            return None, details
+        with open(solution_path) as file:
+            values, details['status'] = read_cbc_solution(file.read())
+    if details['status'].startswith('Optimal'):
+        details['gap'] = 0
+    return values, details
+
+
+def read_cbc_solution(text):
+    # Values by name (None if there is no solution) and status of a solution file of CBC
+    # First line: status (e.g. 'Optimal - objective value 9.0'), then one line per non-zero variable: index name value reduced_cost
+    # (with ** before the index if the value is out of its bounds)
+    # Without an integer solution, the values written are the ones of the continuous relaxation
+    lines = text.splitlines()
+    status = lines[0].split(' - objective value')[0].strip()
+    if 'objective value' not in lines[0] or status.startswith('Infeasible') or 'no integer solution' in status:
+        return None, status
+    values = {}
+    for line in lines[1:]:
+        fields = line.replace('**','').split()
+        if len(fields) >= 3:
+            values[fields[1]] = float(fields[2])
+    return values, status
+
+
+def solve_cpsat(lp, time_limit, threads):
+    from ortools.linear_solver.python import model_builder as mb
+    model = build_model_builder(mb, read_lp(lp))
+    solver = mb.ModelSolver('sat')
+    if time_limit is not None:
+        solver.set_time_limit_in_seconds(time_limit)
+    if threads:
+        solver.set_solver_specific_parameters('num_workers:%d' %(threads))
+    status = solver.solve(model)
+
+    details = {'status':status.name,'gap':None,'nodes':0}
+    if status not in (mb.SolveStatus.OPTIMAL, mb.SolveStatus.FEASIBLE):
+        return None, details
+    objective, bound = solver.objective_value, solver.best_objective_bound
+    details['gap'] = abs(bound - objective)/max(abs(objective),1e-10)
+    variables = [model.var_from_index(i) for i in range(model.num_variables)]
+    return {var.name:solver.value(var) for var in variables}, details
+
+
+def build_model_builder(mb, data):
+    # OR-Tools model of the data of an LP file (see read_lp)
+    model = mb.ModelBuilder()
+    variables = {name:model.new_var(lb, ub, name in data['integers'], name) for name, (lb, ub) in data['bounds'].items()}
+    expression = lambda terms, constant = 0: mb.LinearExpr.weighted_sum([variables[name] for name in terms], list(terms.values()), constant = constant)
+    for terms, sense, rhs in data['constraints']:
+        model.add_linear_constraint(expression(terms), rhs if sense in ('>=','=') else -math.inf, rhs if sense in ('<=','=') else math.inf)
+    objective = expression(data['objective'], data['objective_constant'])
+    if data['maximize']:
+        model.maximize(objective)
+    else:
+        model.minimize(objective)
+    return model
+
+
+# -----------------------------------------------------------------------------------
+# ----------------------------------- LP READER ------------------------------------
+# -----------------------------------------------------------------------------------
+
+LP_TOKEN = re.compile(r'[<>=]=?|[+-]|:|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|[A-Za-z_][\w.]*')
+LP_SECTIONS = {'maximize':'objective', 'maximum':'objective', 'max':'objective', 'minimize':'objective', 'minimum':'objective',
+               'min':'objective', 'subject to':'constraints', 'such that':'constraints', 'st':'constraints', 's.t.':'constraints',
+               'bounds':'bounds', 'bound':'bounds', 'binaries':'binaries', 'binary':'binaries', 'bin':'binaries',
+               'generals':'generals', 'general':'generals', 'gen':'generals', 'end':'end'}
+
+
+def read_lp(lp):
+    # Objective, constraints, bounds and integer variables of an LP file with the parts of the format written by docplex
+    # and lib/matrix.py: a linear objective, linear constraints (with or without name), bounds, binaries and generals.
+    # Returns a dictionary with 'maximize', 'objective' ({name: coefficient}), 'objective_constant', 'constraints'
+    # (list of ({name: coefficient}, sense, rhs)), 'bounds' ({name: (lb, ub)}, all the variables) and 'integers' (set of names)
+    sections = {'objective':[], 'constraints':[], 'bounds':[], 'binaries':[], 'generals':[]}
+    section = None
+    maximize = True
+    for line in lp.splitlines():
+        line = line.split('\\')[0].strip()
+        if not line:
+            continue
+        if line.lower() in LP_SECTIONS:
+            section = LP_SECTIONS[line.lower()]
+            if section == 'objective':
+                maximize = line.lower().startswith('max')
+            continue
+        if section is None or section == 'end':
+            raise ValueError('Unexpected line in the LP file: %s' %(line))
+        sections[section].append(line)
+
+    objective_tokens = LP_TOKEN.findall(' '.join(sections['objective']))
+    if len(objective_tokens) > 1 and objective_tokens[1] == ':': # Name of the objective
+        objective_tokens = objective_tokens[2:]
+    objective, objective_constant, _ = read_expression(objective_tokens, 0)
+
+    constraints = []
+    tokens = LP_TOKEN.findall(' '.join(sections['constraints']))
+    position = 0
+    while position < len(tokens):
+        if position + 1 < len(tokens) and tokens[position + 1] == ':': # Name of the constraint
+            position += 2
+        terms, constant, position = read_expression(tokens, position)
+        sense = {'=<':'<=', '<':'<=', '=>':'>=', '>':'>='}.get(tokens[position], tokens[position])
+        rhs, position = read_number(tokens, position + 1)
+        constraints.append((terms, sense, rhs - constant))
+
+    bounds = {}
+    for terms, *_ in constraints:
+        bounds.update(dict.fromkeys(terms, (0, math.inf)))
+    bounds.update(dict.fromkeys(objective, (0, math.inf)))
+    binaries = ' '.join(sections['binaries']).split()
+    integers = set(binaries) | set(' '.join(sections['generals']).split())
+    bounds.update(dict.fromkeys((name for name in integers if name not in bounds), (0, math.inf)))
+    bounds.update(dict.fromkeys(binaries, (0, 1)))
+    for line in sections['bounds']:
+        read_bound(line, bounds)
+    return {'maximize':maximize, 'objective':objective, 'objective_constant':objective_constant,
+            'constraints':constraints, 'bounds':bounds, 'integers':integers}
+
+
+def read_number(tokens, position):
+    # Signed number (or infinity) starting at the position, and the position after it
+    sign = 1
+    while tokens[position] in ('+','-'):
+        sign *= -1 if tokens[position] == '-' else 1
+        position += 1
+    value = math.inf if tokens[position].lower() in ('inf','infinity') else float(tokens[position])
+    return sign*value, position + 1
+
+
+def read_expression(tokens, position):
+    # Terms ({name: coefficient}) and constant of the linear expression starting at the position (until a sense or the
+    # end of the tokens), and the position after it
+    terms = {}
+    constant = 0
+    while position < len(tokens) and tokens[position][0] not in '<>=':
+        sign = 1
+        while tokens[position] in ('+','-'):
+            sign *= -1 if tokens[position] == '-' else 1
+            position += 1
+        coefficient = 1
+        if tokens[position][0].isdigit() or tokens[position][0] == '.':
+            coefficient = float(tokens[position])
+            position += 1
+            if position == len(tokens) or not (tokens[position][0].isalpha() or tokens[position][0] == '_'):
+                constant += sign*coefficient
+                continue
+        terms[tokens[position]] = terms.get(tokens[position], 0) + sign*coefficient
+        position += 1
+    return terms, constant, position
+
+
+def read_bound(line, bounds):
+    # Updates the bounds of the variable of a line of the Bounds section: 'lb <= x <= ub', 'x <= ub', 'x >= lb', 'lb <= x',
+    # 'x = value' or 'x free'
+    tokens = LP_TOKEN.findall(line)
+    if len(tokens) == 2 and tokens[1].lower() == 'free':
+        bounds[tokens[0]] = (-math.inf, math.inf)
+        return
+    # Numbers and the variable, with the senses between them
+    parts = []
+    position = 0
+    while position < len(tokens):
+        if tokens[position][0] in '<>=':
+            parts.append({'=<':'<=', '<':'<=', '=>':'>=', '>':'>='}.get(tokens[position], tokens[position]))
+            position += 1
+        elif tokens[position][0].isalpha() and tokens[position].lower() not in ('inf','infinity'):
+            parts.append(('name', tokens[position]))
+            position += 1
+        else:
+            value, position = read_number(tokens, position)
+            parts.append(('value', value))
+    name = next(part[1] for part in parts if part[0] == 'name')
+    lb, ub = bounds.get(name, (0, math.inf))
+    for left, sense, right in zip(parts[0::2], parts[1::2], parts[2::2]):
+        # Each comparison of the variable with a number
+        value, on_left = (right[1], False) if left[0] == 'name' else (left[1], True)
+        if sense == '=':
+            lb = ub = value
+        elif (sense == '<=') == on_left: # value <= x or x >= value
+            lb = value
+        else:
+            ub = value
+    bounds[name] = (lb, ub)
@@ -0,0 +1,282 @@
+'''
+Benders decomposition of the full cooperation model without minimal profits ('benders' engine), used for the values
+of the coalitions (lib/coalitions.py).
+
+The full cooperation model is a capacitated fixed-charge network design: the binaries u[e] choose the edges which are
+paid, and the commodities are routed over them. Here the model is split in:
+
+    - A master problem over the edges, max sum_c theta[c] - sum_e cost[e]*u[e], where theta[c] is the revenue of the
+      commodity c, bounded by its value and by the cut-set inequalities of the sets of nodes S which contain its origin
+      and not its terminal (it is only served if an edge it can use leaves S, and the served units of the commodities
+      which leave S fit in the edges leaving S). There is one of them for each set of nodes, so as the subtour
+      elimination constraints in solve_model, they are separated from the master solutions: the nodes reachable from
+      the origin of a commodity over the edges of the design give the violated ones, which are added before the master
+      is solved again.
+    - For the edges of the master solution (the design), the routing subproblem over them. Without minimal profits, the
+      commodities which can't share an edge of the design are independent, so the subproblem is split in groups of
+      commodities, solved at the same time (workers at once).
+
+After each subproblem, cuts are added to the master, until the master has no design better than the best one:
+
+    - Integer optimality cuts: a group can't earn more than with the design unless an edge it can use is added.
+    - Optimality cut of the linear relaxation: the LP of the whole model (with the linking and cover inequalities of
+      lib/cuts.py) is built once, and for each design only the bounds of u are changed to fix them. Its value is
+      concave in the fixed values, so with the reduced costs of u it bounds the revenue for any u (CPLEX backend only,
+      it needs the reduced costs).
+
+With minimal profits the agents are linked by them (what each agent earns depends on the routes of all the groups), so
+the routing subproblem doesn't decompose and the mechanisms solve these models with the arc engine.
+
+The master and the subproblems are much smaller than the full model, and the subproblems only have the edges of the
+design, so larger pooled sets of edges can be solved. The solution only pays the edges used by the routes.
+'''
+
+# Python packages
+import concurrent.futures as cf
+import os
+import time
+from docplex.mp.model import Model
+from docplex.mp.relax_linear import LinearRelaxer
+
+# Own modules
+import lib.classes as cl
+import lib.models as mdls
+import lib.functions as fn
+import lib.presolve as ps
+
+
+def solve_cooperation_benders(V, E, commodities, index = None, time_limit = None, threads = 0, lazy_subtours = False,
+                              backend = 'cplex', start = None, workers = None, max_iterations = 1000, tolerance = 1e-6):
+    # Returns the result of the full cooperation model without minimal profits (as functions.model_result), or None if
+    # no design was evaluated. start is a result (e.g. from the greedy heuristic) whose active edges are the first design
+    init_time = time.time()
+    E, commodities, index = ps.presolve(E, commodities, 'full_cooperation', None, index)
+    capacity = {e:E[e].original_capacity for e in E}
+    usable = {c:ps.usable_edges_of(E, index, capacity, commodities, c, 'full_cooperation') for c in commodities}
+    workers = workers if workers is not None else os.cpu_count()
+    if not commodities:
+        return {'objective':0, 'routes':{}, 'active_edges':set(), 'edges_costs':0,
+                'stats':{'status':'optimal', 'solve_time':time.time() - init_time, 'gap':0, 'nodes':0, 'iterations':0}}
+
+    master = build_master(V, E, commodities, usable)
+    relaxation = build_relaxation(V, E, commodities, index) if backend == 'cplex' else None
+    best = None
+    bound = None
+    status = 'iteration limit'
+    design = set(start['active_edges']) & set(E) if start is not None else None
+    iteration = 0
+    nodes = 0
+    for iteration in range(1, max_iterations + 1):
+        if design is None:
+            design, objective, bound = solve_master(master, remaining(init_time, time_limit), threads)
+            if design is None:
+                status = 'time limit' if best is not None else 'infeasible'
+                break
+            # No design is better than the best one (up to the gap of the master, so its bound is kept for the gap)
+            if best is not None and objective <= best['objective'] + tolerance*max(1, abs(best['objective'])):
+                status = 'time limit' if master.solve_details.has_hit_limit() else 'optimal'
+                break
+
+        groups = subproblem_groups(commodities, usable, design)
+        evaluation = evaluate_design(V, E, commodities, usable, design, groups, lazy_subtours, backend, start,
+                                     remaining(init_time, time_limit), threads, workers)
+        if evaluation is None: # The subproblems ran out of time
+            status = 'time limit'
+            break
+        nodes += evaluation['nodes']
+        if best is None or evaluation['result']['objective'] > best['objective']:
+            best = evaluation['result']
+        add_cuts(master, usable, design, groups, evaluation)
+        if relaxation is not None:
+            add_lp_cut(master, relaxation, E, design, threads)
+        design = None
+        if time_limit is not None and time.time() - init_time >= time_limit:
+            status = 'time limit'
+            break
+
+    if best is None:
+        return None
+    gap = None if bound is None else max(0, bound - best['objective'])/max(1e-10, abs(best['objective']))
+    best['stats'] = {'status':status, 'solve_time':time.time() - init_time, 'gap':gap, 'nodes':nodes, 'iterations':iteration}
+    return best
+
+
+def remaining(init_time, time_limit):
+    return None if time_limit is None else max(0, time_limit - (time.time() - init_time))
+
+
+# ---------------------------------
+# ---- Master problem
+# ---------------------------------
+
+def build_master(V, E, commodities, usable):
+    # Master without cut-set inequalities, they are added by solve_master when they are violated
+    mdl = Model('Benders master')
+    mdl.u = mdl.binary_var_dict(E, name = 'u')
+    values = {c:commodities[c].units*commodities[c].revenue for c in commodities}
+    mdl.theta = mdl.continuous_var_dict(commodities, ub = lambda c: values[c], name = 'theta') # Revenue of each commodity
+    mdl.revenues = mdl.sum(mdl.theta)
+    mdl.maximize(mdl.revenues - mdl.sum(mdl.u[e]*E[e].cost for e in E))
+    mdl.V = V
+    mdl.E = E
+    mdl.commodities = commodities
+    mdl.usable = usable
+    mdl.values = values
+    mdl.cut_sets = set() # (S, commodity) of the connectivity rows and (S, None) of the capacity rows already added
+    return mdl
+
+
+def solve_master(mdl, time_limit, threads):
+    # Returns the design (edges with u = 1), its objective and the bound of the master, or (None, None, None) if it wasn't solved
+    # As in solve_model, the master is solved again while its solution violates cut-set inequalities
+    init_time = time.time()
+    if threads:
+        mdl.parameters.threads = threads
+    while True:
+        if time_limit is not None:
+            if time.time() - init_time >= time_limit:
+                return None, None, None
+            mdl.set_time_limit(time_limit - (time.time() - init_time))
+        solution = mdl.solve()
+        if not solution:
+            return None, None, None
+        design = {e for e, value in solution.get_value_dict(mdl.u, keep_zeros = False).items() if value > 0.9}
+        cuts = separate_cut_sets(mdl, design, solution.get_value_dict(mdl.theta, keep_zeros = False))
+        if not cuts:
+            return design, solution.objective_value, mdl.solve_details.best_bound
+        mdl.add_constraints(cuts)
+
+
+def separate_cut_sets(mdl, design, theta, tolerance = 1e-6):
+    # Returns the cut-set inequalities violated by the design and the revenues theta of a master solution (without the zeros)
+    out_edges = {v:[] for v in mdl.V}
+    for e in design:
+        out_edges[e[0]].append(e)
+    cuts = []
+    candidates = {frozenset([v]) for v in mdl.V} # Capacity of the edges leaving each node
+    for c in mdl.commodities:
+        if theta.get(c,0) <= tolerance:
+            continue
+        # Nodes reachable from the origin over the edges of the design the commodity can use
+        S = {c[0]}
+        pending = [c[0]]
+        while pending:
+            v = pending.pop()
+            for e in out_edges[v]:
+                if e[1] not in S and e in mdl.usable[c]:
+                    S.add(e[1])
+                    pending.append(e[1])
+        S = frozenset(S)
+        candidates.add(S)
+        if c[1] not in S and (S,c) not in mdl.cut_sets:
+            mdl.cut_sets.add((S,c))
+            cuts.append(mdl.theta[c] <= mdl.values[c]*mdl.sum(mdl.u[e] for e in mdl.usable[c] if e[0] in S and e[1] not in S))
+
+    for S in candidates:
+        crossing = [c for c in mdl.commodities if c[0] in S and c[1] not in S]
+        served_units = sum(theta.get(c,0)*mdl.commodities[c].units/mdl.values[c] for c in crossing)
+        free_capacity = sum(mdl.E[e].original_capacity for e in design if e[0] in S and e[1] not in S)
+        if served_units > free_capacity + tolerance and (S,None) not in mdl.cut_sets:
+            mdl.cut_sets.add((S,None))
+            cuts.append(mdl.sum(mdl.theta[c]*mdl.commodities[c].units/mdl.values[c] for c in crossing)
+                        <= mdl.sum(mdl.u[e]*mdl.E[e].original_capacity for e in mdl.E if e[0] in S and e[1] not in S))
+    return cuts
+
+
+def add_cuts(mdl, usable, design, groups, evaluation):
+    # Integer optimality cuts of the evaluated design. Only the commodities of the group can use its edges of the design,
+    # so the group can only earn more (than the bound of its subproblem) with another edge it can use
+    for group, revenue in zip(groups, evaluation['group_bounds']):
+        group_edges = set().union(*(usable[c] for c in group))
+        slack = sum(mdl.values[c] for c in group) - revenue
+        mdl.add_constraint(mdl.sum(mdl.theta[c] for c in group) <= revenue + slack*mdl.sum(mdl.u[e] for e in group_edges if e not in design))
+
+
+# ---------------------------------
+# ---- Linear relaxation
+# ---------------------------------
+
+def build_relaxation(V, E, commodities, index):
+    # Linear relaxation of the full cooperation model (without subtour elimination constraints, and with the linking and
+    # cover inequalities). It is built once, and each design only changes the bounds of u
+    model = mdls.build_cooperation_model(V, E, commodities, 'full_cooperation', [], lazy_subtours = True, index = index,
+                                         presolve = False, cuts = 'static')
+    lp = LinearRelaxer.make_relaxed_model(model)
+    lp.u = {e:lp.get_var_by_index(model.u[e].index) for e in E}
+    return lp
+
+
+def add_lp_cut(mdl, lp, E, design, threads):
+    # Optimality cut from the linear relaxation with u fixed to the design: revenue <= constant + sum_e coefficient*u[e]
+    u = [lp.u[e] for e in E]
+    lp.change_var_lower_bounds(u, 0)
+    lp.change_var_upper_bounds(u, [1 if e in design else 0 for e in E])
+    lp.change_var_lower_bounds(u, [1 if e in design else 0 for e in E])
+    if threads:
+        lp.parameters.threads = threads
+    if not lp.solve():
+        return
+    # The objective is revenue - costs, so the cost of each edge is added to its reduced cost
+    coefficients = {e:reduced_cost + E[e].cost for e, reduced_cost in zip(E, lp.reduced_costs(u))}
+    constant = lp.objective_value + sum(E[e].cost - coefficients[e] for e in design)
+    mdl.add_constraint(mdl.revenues <= constant + mdl.sum(coefficient*mdl.u[e] for e, coefficient in coefficients.items() if coefficient != 0))
+
+
+# ---------------------------------
+# ---- Routing subproblems
+# ---------------------------------
+
+def subproblem_groups(commodities, usable, design):
+    # Groups of commodities which can share an edge of the design
+    parent = {c:c for c in commodities}
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+    first_user = {}
+    for c in sorted(commodities):
+        for e in usable[c] & design:
+            if e in first_user:
+                parent[find(c)] = find(first_user[e])
+            else:
+                first_user[e] = c
+    groups = {}
+    for c in sorted(commodities):
+        groups.setdefault(find(c),[]).append(c)
+    return list(groups.values())
+
+
+def evaluate_design(V, E, commodities, usable, design, groups, lazy_subtours, backend, start, time_limit, threads, workers):
+    # Solves the routing subproblem of each group. Returns the bound of the revenue of each group, the result of the
+    # design and the nodes, or None if a group wasn't solved in time
+    threads = threads or max(1, os.cpu_count() // min(workers, len(groups)))
+    with cf.ThreadPoolExecutor(max_workers = workers) as pool:
+        results = list(pool.map(lambda group: solve_group(V, E, commodities, usable, design, group, lazy_subtours, backend,
+                                                          start, time_limit, threads), groups))
+    if any(result is None for result in results):
+        return None
+
+    nodes = sum(result['stats']['nodes'] or 0 for result in results)
+    routes = {c:route for result in results for c, route in result['routes'].items()}
+    active_edges = set().union(*routes.values()) if routes else set()
+    revenue = sum(result['objective'] for result in results)
+    edges_costs = sum(E[e].cost for e in active_edges)
+    # If a subproblem stopped before proving its optimality, its cut uses the bound of its revenue
+    group_bounds = [result['objective'] + (result['stats']['gap'] or 0)*abs(result['objective']) for result in results]
+    return {'group_bounds':group_bounds, 'nodes':nodes,
+            'result':{'objective':revenue - edges_costs, 'routes':routes, 'active_edges':active_edges, 'edges_costs':edges_costs}}
+
+
+def solve_group(V, E, commodities, usable, design, group, lazy_subtours, backend, start, time_limit, threads):
+    # Routing model of the commodities of the group over their edges of the design (the partial cooperation model, where
+    # the edges are already paid). Returns its result, or None if it wasn't solved in time
+    group_edges = {e:E[e] for e in E if e in design and any(e in usable[c] for c in group)}
+    if not group_edges: # Nothing can be routed
+        return {'objective':0, 'routes':{}, 'stats':{'nodes':0, 'gap':0}}
+    model = mdls.build_cooperation_model(V, group_edges, {c:commodities[c] for c in group}, 'partial_cooperation', [],
+                                         lazy_subtours, cl.GraphIndex(group_edges), presolve = False)
+    mdls.add_routes_mip_start(model, start)
+    if not mdls.solve_model(model, time_limit, threads, backend):
+        return None
+    return fn.model_result(model)
@@ -0,0 +1,136 @@
+'''
+Fast bounds of the single agent and cooperation models, to screen instances without solving the exact models.
+
+For a model, three values are computed:
+    - 'lp': the linear relaxation of the arc model (built as a sparse matrix with lib/matrix.py, with the linking and cover
+      inequalities of lib/cuts.py and without the subtour elimination constraints), an upper bound of its objective.
+    - 'lagrangian': the Lagrangian relaxation of the capacity constraints and of the linking inequalities f[e,c] <= u[e],
+      with the payment and minimal profit constraints dropped, another upper bound. For multipliers lambda[e] >= 0 and
+      mu[e,c] >= 0 the problem splits in one shortest path problem per commodity, with weights
+      lambda[e]*units[c] + mu[e,c] (the commodity is served if its path costs less than its value), and one problem per
+      edge (it is paid if lambda[e]*capacity[e] + sum_c mu[e,c] is larger than its cost). The multipliers are improved
+      with subgradient steps, and the best bound is kept.
+    - 'greedy': the objective of the greedy routes (lib/heuristics.py), a lower bound (None if they don't give the agents
+      their minimal profit).
+'''
+
+import time
+import numpy as np
+
+# Own modules
+import lib.matrix as mx
+import lib.heuristics as hr
+
+
+def model_bounds(V, E, commodities, type_cooperation, agents_minimal_profit = None, index = None, time_limit = None, threads = 0,
+                 backend = 'cplex', iterations = 100):
+    # Bounds of the objective of the model, type_cooperation is 'single_agent' or the type of the cooperation model
+    init_time = time.time()
+    greedy = hr.greedy_routes(E, commodities, type_cooperation, agents_minimal_profit, index)
+    greedy = None if greedy is None else greedy['objective']
+    mm = mx.build_matrix_model(V, E, commodities, type_cooperation, agents_minimal_profit, True, index, True, 'static')
+    lp = mx.solve_matrix_relaxation(mm, time_limit, threads, backend)
+    lagrangian = lagrangian_bound(V, E, commodities, type_cooperation, greedy or 0, iterations)
+    return {'lp':lp, 'lagrangian':lagrangian, 'greedy':greedy, 'time':time.time() - init_time}
+
+
+def upper_bound(bounds):
+    # Best of the upper bounds
+    return min(bound for bound in (bounds['lp'], bounds['lagrangian']) if bound is not None)
+
+
+# ---------------------------------
+# ---- Lagrangian relaxation
+# ---------------------------------
+
+def lagrangian_bound(V, E, commodities, type_cooperation, lower_bound = 0, iterations = 100, tolerance = 1e-6):
+    # Best Lagrangian bound found with the subgradient method (Polyak steps towards the lower bound)
+    edges = list(E)
+    keys = list(commodities)
+    if not keys:
+        return 0
+    nodes = sorted(V)
+    position = {v:p for p, v in enumerate(nodes)}
+    head = np.array([position[e[0]] for e in edges], dtype = np.int64)
+    tail = np.array([position[e[1]] for e in edges], dtype = np.int64)
+    origin = np.array([position[c[0]] for c in keys], dtype = np.int64)
+    terminal = np.array([position[c[1]] for c in keys], dtype = np.int64)
+    capacity = np.array([E[e].free_capacity if type_cooperation == 'residual_cooperation' else E[e].original_capacity for e in edges], dtype = float)
+    cost = np.array([E[e].cost for e in edges], dtype = float)
+    units = np.array([commodities[c].units for c in keys], dtype = float)
+    value = units*np.array([commodities[c].revenue for c in keys], dtype = float)
+    fixed_costs = type_cooperation in ('single_agent','full_cooperation')
+
+    # Pairs (commodity, edge) which can have flow: enough capacity, not leaving the terminal nor entering the origin
+    allowed = (capacity[None,:] >= units[:,None]) & (head[None,:] != terminal[:,None]) & (tail[None,:] != origin[:,None]) & (units[:,None] > 0)
+    lam = np.zeros(len(edges))
+    mu = np.zeros((len(keys), len(edges)))
+    best = np.inf
+    step = 2.0
+    no_improvement = 0
+    for _ in range(iterations):
+        weights = np.where(allowed, lam[None,:]*units[:,None] + mu, np.inf)
+        dist, flow = shortest_paths(weights, head, tail, origin, terminal, len(nodes))
+        profit = value - dist
+        served = profit > tolerance
+        flow[~served] = False
+        bound = profit[served].sum()
+        if fixed_costs:
+            reduced = lam*capacity + mu.sum(axis = 0) - cost
+            paid = reduced > 0
+            bound += reduced[paid].sum()
+            lam_gradient = capacity*paid - (units[:,None]*flow).sum(axis = 0)
+            mu_gradient = np.where(allowed, paid[None,:].astype(float) - flow, 0)
+        else:
+            bound += (lam*capacity).sum()
+            lam_gradient = capacity - (units[:,None]*flow).sum(axis = 0)
+            mu_gradient = np.zeros_like(mu)
+
+        if bound < best - tolerance:
+            best = bound
+            no_improvement = 0
+        else:
+            no_improvement += 1
+            if no_improvement >= 5:
+                step /= 2
+                no_improvement = 0
+        norm = (lam_gradient**2).sum() + (mu_gradient**2).sum()
+        if norm == 0 or best - lower_bound <= tolerance*max(1, abs(best)):
+            break
+        t = step*max(bound - lower_bound, tolerance)/norm
+        lam = np.maximum(0, lam - t*lam_gradient)
+        mu = np.maximum(0, mu - t*mu_gradient)
+    return float(best)
+
+
+def shortest_paths(weights, head, tail, origin, terminal, num_nodes):
+    # Bellman-Ford for all the commodities at once (weights has one row per commodity, inf for the edges it can't use).
+    # Returns the distance from the origin to the terminal of each commodity and the edges of its path (boolean matrix)
+    num_commodities = len(origin)
+    rows = np.arange(num_commodities)
+    dist = np.full((num_commodities, num_nodes), np.inf)
+    dist[rows, origin] = 0
+    pred = np.full((num_commodities, num_nodes), -1)
+    for _ in range(num_nodes - 1):
+        changed = False
+        for e in range(len(head)):
+            candidate = dist[:, head[e]] + weights[:, e]
+            better = candidate < dist[:, tail[e]] - 1e-12
+            if better.any():
+                dist[better, tail[e]] = candidate[better]
+                pred[better, tail[e]] = e
+                changed = True
+        if not changed:
+            break
+
+    flow = np.zeros(weights.shape, dtype = bool)
+    current = terminal.copy()
+    active = np.isfinite(dist[rows, terminal])
+    for _ in range(num_nodes):
+        active &= current != origin
+        if not active.any():
+            break
+        e = pred[rows[active], current[active]]
+        flow[rows[active], e] = True
+        current[active] = head[e]
+    return dist[rows, terminal], flow
@@ -0,0 +1,116 @@
+'''
+Persistent cache of the results of solved models, stored on disk so that unchanged solves are not repeated between runs.
+
+The key of each entry is a hash of the data of the model (edges and commodities), the name of the mechanism, its parameters
+and the solver settings, so any change in one of them gives a different key. Entries are evicted (least recently used first)
+when the cache has more entries or bytes than its bounds.
+'''
+
+import hashlib
+import os
+import pickle
+import threading
+
+# Increase it when the format of the stored results changes, so all the previous entries are invalidated
+CACHE_VERSION = 2
+
+# Settings which don't change the result of a model, so they are not part of the key
+SETTINGS_NOT_IN_KEY = ('threads','agent_workers','stats_file')
+
+
+# -----------------------------------------
+# ---- Functions to build the keys
+# -----------------------------------------
+
+def data_fingerprint(E,commodities):
+    # Hash of the data of the edges and the commodities of a model
+    edges_data = sorted((e,E[e].cost,E[e].original_capacity,E[e].free_capacity) for e in E)
+    commodities_data = sorted((c,commodities[c].units,commodities[c].revenue) for c in commodities)
+    return hashlib.sha256(repr((edges_data,commodities_data)).encode()).hexdigest()
+
+
+def make_key(data_hash,mechanism,params,settings):
+    # params is any tuple with the parameters of the mechanism (e.g. agents_minimal_profit or the order of the agents)
+    settings_data = sorted((k,v) for k,v in settings._asdict().items() if k not in SETTINGS_NOT_IN_KEY)
+    content = repr((CACHE_VERSION,data_hash,mechanism,params,settings_data))
+    return '%s-%s' %(mechanism,hashlib.sha256(content.encode()).hexdigest())
+
+
+# -----------------------------------------
+# ---- CACHE CLASS
+# -----------------------------------------
+
+class ResultCache():
+
+    def __init__(self,directory,max_entries = 10000,max_bytes = 512*1024*1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok = True)
+
+    def __getstate__(self):
+        # The lock can't be sent to other processes, each process creates its own one
+        state = dict(self.__dict__)
+        del state['lock']
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def path(self,key):
+        return os.path.join(self.directory,key + '.pkl')
+
+    def get(self,key):
+        # Returns the stored result, or None if there is no (readable) entry with this key
+        try:
+            with open(self.path(key),'rb') as file:
+                result = pickle.load(file)
+            os.utime(self.path(key)) # The modification time is used as last access time for the eviction
+            return result
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self,key,result):
+        # The entry is written in a temporary file and then renamed, so other processes never read half written entries
+        temp_path = '%s.%d.%d.tmp' %(self.path(key),os.getpid(),threading.get_ident())
+        with open(temp_path,'wb') as file:
+            pickle.dump(result,file,protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path,self.path(key))
+        self.evict()
+
+    def invalidate(self,key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def invalidate_mechanism(self,mechanism):
+        # Removes all the entries of a mechanism (e.g. after changing its model)
+        for name in os.listdir(self.directory):
+            if name.startswith(mechanism + '-'):
+                self.invalidate(name[:-len('.pkl')])
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                self.invalidate(name[:-len('.pkl')])
+
+    def evict(self):
+        # Removes the least recently used entries until the cache is within its bounds
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith('.pkl'):
+                    try:
+                        stat = os.stat(os.path.join(self.directory,name))
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime,stat.st_size,name))
+            entries.sort()
+            total_bytes = sum(entry[1] for entry in entries)
+            while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+                mtime, size, name = entries.pop(0)
+                self.invalidate(name[:-len('.pkl')])
+                total_bytes -= size
@@ -1,4 +1,4 @@
-from collections import namedtuple
+from collections import namedtuple, defaultdict
 import copy
 
 # --------------------------------------
@@ -6,6 +6,8 @@ import copy
 # --------------------------------------
 
 class Commodity():
+        # __slots__: no __dict__ for each object, instances have thousands of commodities
+        __slots__ = ('origin','terminal','owner','units','revenue','route')
 
         def __init__(self,v,w,owner,units,revenue):
             self.origin = v
@@ -16,6 +18,8 @@ class Commodity():
             self.route = None
 
 class Edge():
+    # Only free_capacity changes after creating the edge, so cost_per_unit is computed once
+    __slots__ = ('head','tail','owner','cost','original_capacity','free_capacity','cost_per_unit')
 
     def __init__(self,head,tail,owner,cost,original_capacity):
         self.head = head
@@ -24,10 +28,116 @@ class Edge():
         self.cost = cost
         self.original_capacity = original_capacity
         self.free_capacity = original_capacity
+        self.cost_per_unit = cost/original_capacity
+
+
+# --------------------------------------
+# ------- VIEWS OF THE CENTRAL PLANNER --------
+# --------------------------------------
+
+# The central planner reads the data of the edges and commodities from the objects of the agents, and only the fields
+# which change when the planner solves its model (free_capacity and route) are its own. The routes are never modified
+# in place (a new set is assigned), so the view can start with the same set as the agent.
+
+class CommodityView():
+    __slots__ = ('commodity','route')
+
+    def __init__(self,commodity):
+        self.commodity = commodity
+        self.route = commodity.route
+
+    @property
+    def origin(self):
+        return self.commodity.origin
+
+    @property
+    def terminal(self):
+        return self.commodity.terminal
+
+    @property
+    def owner(self):
+        return self.commodity.owner
+
+    @property
+    def units(self):
+        return self.commodity.units
+
+    @property
+    def revenue(self):
+        return self.commodity.revenue
+
+class EdgeView():
+    __slots__ = ('edge','free_capacity')
+
+    def __init__(self,edge):
+        self.edge = edge
+        self.free_capacity = edge.free_capacity
+
+    @property
+    def head(self):
+        return self.edge.head
+
+    @property
+    def tail(self):
+        return self.edge.tail
+
+    @property
+    def owner(self):
+        return self.edge.owner
+
+    @property
+    def cost(self):
+        return self.edge.cost
+
+    @property
+    def original_capacity(self):
+        return self.edge.original_capacity
 
     @property
     def cost_per_unit(self):
-        return self.cost/self.original_capacity
+        return self.edge.cost_per_unit
+
+
+# --------------------------------------
+# ------- GRAPH INDEX CLASS --------
+# --------------------------------------
+
+class GraphIndex():
+    # In-edges and out-edges of each node, so the constraints of the models don't have to scan all the edges for each node
+
+    def __init__(self,*edges_sets):
+        self.in_edges = defaultdict(list)
+        self.out_edges = defaultdict(list)
+        self.edges = set()
+        for E in edges_sets:
+            self.add_edges(E)
+
+    def add_edges(self,E):
+        for e in E:
+            if e not in self.edges:
+                self.edges.add(e)
+                self.out_edges[e[0]].append(e)
+                self.in_edges[e[1]].append(e)
+
+    def extended(self,E):
+        # New index with the edges of this one and the edges in E, without scanning again the edges of this one
+        index = GraphIndex()
+        index.in_edges = defaultdict(list,{v:list(self.in_edges[v]) for v in self.in_edges})
+        index.out_edges = defaultdict(list,{v:list(self.out_edges[v]) for v in self.out_edges})
+        index.edges = set(self.edges)
+        index.add_edges(E)
+        return index
+
+    @classmethod
+    def merge(cls,indexes):
+        # Index with the edges of all the indexes (e.g. the edges of all the agents)
+        indexes = list(indexes)
+        if not indexes:
+            return cls()
+        index = indexes[0].extended(())
+        for other in indexes[1:]:
+            index.add_edges(e for v in other.out_edges for e in other.out_edges[v])
+        return index
 
 
 # --------------------------------------
@@ -40,6 +150,7 @@ class Agent:
         self.id = id
         self.edges = edges
         self.commodities = commodities        
+        self.index = GraphIndex(edges) # In-edges and out-edges of each node, built once for the agent
         self.served_commodities = {} # List of keys of the demands that are served
         self.unserved_commodities = {} # List of keys of the demands which are not served
         
@@ -56,14 +167,14 @@ class Agent:
         return {e:self.edges[e] for e in self.edges_with_capacity} # A dictionary, not only a list of keys, with the edges that have free capacity
 
     def restore_edges_info(self):
-        for e in self.edges:
-            self.edges[e].free_capacity =  self.edges[e].original_capacity
+        for edge in self.edges.values():
+            edge.free_capacity = edge.original_capacity
         self.active_edges = {}
         self.edges_with_capacity = {}
 
     def restore_commodities_info(self):
-        for c in self.commodities:
-            self.commodities[c].route = None
+        for commodity in self.commodities.values():
+            commodity.route = None
         self.served_commodities = {}
         self.unserved_commodities = {}
 
@@ -84,6 +195,57 @@ class Agent:
         elif type_cooperation == 'partial_cooperation' or type_cooperation == 'full_cooperation':
             return self.payoff_cooperation
     
+# --------------------------------------
+# ------- BASELINE CLASS --------
+# --------------------------------------
+
+class Baseline():
+    # Stand-alone (no cooperation) solution of each agent of an instance. It is computed once per instance and shared by all the mechanisms
+
+    def __init__(self,N,V,commodities,edges):
+        self.N = N
+        self.V = V
+        self.commodities = commodities # Data of the instance, as returned by read_data
+        self.edges = edges
+        self.payoffs = {} # Payoff of each agent without cooperation
+        self.edges_costs = {} # Cost of the edges activated by each agent
+        self.active_edges = {}
+        self.routes = {} # Route of each served commodity of each agent
+        self.free_capacities = {} # Free capacity of each edge of each agent after routing its own commodities
+
+    def add_agent_solution(self,agent,edges_costs):
+        self.payoffs[agent.id] = agent.payoff_no_cooperation
+        self.edges_costs[agent.id] = edges_costs
+        self.active_edges[agent.id] = set(agent.active_edges)
+        self.routes[agent.id] = {c:set(agent.commodities[c].route) for c in agent.served_commodities}
+        self.free_capacities[agent.id] = {e:agent.edges[e].free_capacity for e in agent.edges}
+
+    def create_agents(self):
+        # Returns new agents with the stand-alone solution already recovered. The edges and commodities are new objects,
+        # so each mechanism can modify them without affecting the others
+        agents_list = []
+        for i in range(self.N):
+            edges = {e:copy.copy(x) for e,x in self.edges[i].items()}
+            commodities = {c:copy.copy(x) for c,x in self.commodities[i].items()}
+            agent = Agent(i,edges,commodities)
+            if i in self.payoffs:
+                for e in edges:
+                    edges[e].free_capacity = self.free_capacities[i][e]
+                for c in self.routes[i]:
+                    commodities[c].route = set(self.routes[i][c])
+                agent.active_edges = set(self.active_edges[i])
+                agent.served_commodities = set(self.routes[i])
+                agent.unserved_commodities = {c for c in commodities if c not in agent.served_commodities and commodities[c].units != 0}
+                agent.edges_with_capacity = {e for e in agent.active_edges if edges[e].free_capacity > 0}
+                agent.payoff_no_cooperation = self.payoffs[i]
+            agents_list.append(agent)
+        return agents_list
+
+    @property
+    def payoff(self):
+        return sum(self.payoffs.values())
+
+
 # --------------------------------------
 # ------- CENTRAL PLANNER CLASS --------
 # --------------------------------------
@@ -99,31 +261,38 @@ class CentralizedSystem:
 
         self.create_commodities_set(AGENTS,TYPE_COOPERATION)
         self.create_edges_set(AGENTS, TYPE_COOPERATION)
+        self.create_index(AGENTS, TYPE_COOPERATION)
 
 
     def create_commodities_set(self,agents, type_cooperation):
         if type_cooperation == 'residual_cooperation':
             for i in agents:
                 for d in i.unserved_commodities:
-                    self.commodities[d] = copy.deepcopy(i.commodities[d])
+                    self.commodities[d] = CommodityView(i.commodities[d])
         elif type_cooperation == 'partial_cooperation' or type_cooperation == 'full_cooperation':
             for i in agents:
                 for d in i.commodities:
-                    self.commodities[d] = copy.deepcopy(i.commodities[d])
+                    self.commodities[d] = CommodityView(i.commodities[d])
 
     def create_edges_set(self,agents,type_cooperation):
         if type_cooperation == 'residual_cooperation':
             for i in agents:
                 for e in i.edges_with_capacity:
-                    self.edges[e] = copy.deepcopy(i.edges[e])
+                    self.edges[e] = EdgeView(i.edges[e])
         elif type_cooperation == 'partial_cooperation':
             for i in agents:
                 for e in i.active_edges:
-                    self.edges[e] = copy.deepcopy(i.edges[e])
+                    self.edges[e] = EdgeView(i.edges[e])
         elif type_cooperation == 'full_cooperation':
             for i in agents:
                 for e in i.edges:
-                    self.edges[e] = copy.deepcopy(i.edges[e])
+                    self.edges[e] = EdgeView(i.edges[e])
+
+    def create_index(self,agents,type_cooperation):
+        if type_cooperation == 'full_cooperation': # All the edges are pooled, so we merge the indexes of the agents
+            self.index = GraphIndex.merge(i.index for i in agents)
+        else:
+            self.index = GraphIndex(self.edges)
 
 
 
@@ -142,6 +311,34 @@ class informationPlatform():
         self.demanded_edges[agent.id] = {}
         self.demanded_edges_conditions[agent.id] = []
 
+    # --- What an agent sees from all the other agents ---
+
+    def shared_edges_for(self,agent):
+        # Union of the edges shared by the other agents
+        return {e:edge for i in self.shared_edges if i != agent.id for e,edge in self.shared_edges[i].items()}
+
+    def demanded_edges_for(self,agent):
+        # Capacity that the other agents demand on each edge of the agent
+        demanded = {}
+        for i in self.demanded_edges:
+            if i != agent.id:
+                for e in self.demanded_edges[i]:
+                    if e[2] == agent.id:
+                        demanded[e] = demanded.get(e,0) + self.demanded_edges[i][e]
+        return demanded
+
+    def demanded_edges_conditions_for(self,agent):
+        # Conditions of the other agents on the edges of the agent
+        return [condition for i in self.demanded_edges_conditions if i != agent.id for condition in self.demanded_edges_conditions[i] if condition.edges[0][2] == agent.id]
+
+    def snapshot(self):
+        # Copy of the current state, which doesn't change when the agents update the platform (the shared edges are copied, since their free capacity changes)
+        platform = informationPlatform([])
+        platform.shared_edges = {i:{e:copy.copy(edge) for e,edge in self.shared_edges[i].items()} for i in self.shared_edges}
+        platform.demanded_edges = {i:dict(self.demanded_edges[i]) for i in self.demanded_edges}
+        platform.demanded_edges_conditions = {i:list(self.demanded_edges_conditions[i]) for i in self.demanded_edges_conditions}
+        return platform
+
 
 
 # -------------------------------------
@@ -154,7 +351,13 @@ class Solution():
         self.out_payments = model.out_payments.solution_value
         self.in_payments = model.in_payments.solution_value
         self.served_commodities = {c:agent.commodities[c].route for c in agent.served_commodities}
-        self.active_edges = {e for e in agent.active_edges}        
+        self.active_edges = {e for e in agent.active_edges}
+        # Hash of the solution, so the solutions of previous rounds can be found in a dictionary (two equal solutions have the same fingerprint)
+        self.fingerprint = hash(self.key())
+
+    def key(self):
+        return (self.payoff, self.out_payments, self.in_payments,
+                frozenset((c,frozenset(route)) for c, route in self.served_commodities.items()), frozenset(self.active_edges))
 
     def print_data(self):
         print("Payoff: %s" %(self.payoff))
@@ -165,18 +368,7 @@ class Solution():
         print()
 
     def equal_to(self,other):
-        if self.payoff != other.payoff:
-            return False
-        elif self.out_payments != other.out_payments:
-            return False
-        elif self.in_payments != other.in_payments:
-            return False
-        elif self.served_commodities != other.served_commodities:
-            return False
-        elif self.active_edges != other.active_edges:
-            return False
-        else:
-            return True
+        return self.fingerprint == other.fingerprint and self.key() == other.key()
 
     
 # ------------------
@@ -185,4 +377,19 @@ class Solution():
 
 EdgesConditions = namedtuple('EdgesConditions','edges price')
 
+# ------------------
+# ---- namedtuple with the settings used to build and solve the models of the mechanisms
+# ------------------
+
+# threads = 0 lets CPLEX decide, agent_workers is the number of stand-alone models of the agents solved at the same time
+# engine is the formulation of the cooperation models: 'arc' (flow variables for each edge and commodity), 'matrix'
+# (the same arc formulation built as a sparse matrix, faster on large instances), 'path' (column generation) or 'benders'
+# (Benders decomposition of the values of the coalitions, see lib/benders.py; the models with minimal profits use 'arc')
+# heuristic is how the greedy routing heuristic is used: 'none', 'start' (MIP start of the exact models) or 'only' (its solution, feasible but not optimal, is used instead of solving the models)
+# backend is the solver of the models: 'cplex', 'highs', 'cbc' or 'cpsat' (see lib/backends.py)
+# stats_file is the JSON lines file where the times and size of each solved model are written (None to not write them, see lib/instrumentation.py)
+# presolve removes the commodities and edges which can't have flow before building the models (see lib/presolve.py)
+# cuts adds the linking and cover inequalities of the capacity constraints: 'none', 'static' (as constraints) or 'pool' (as user cuts, see lib/cuts.py)
+SolverSettings = namedtuple('SolverSettings','time_limit lazy_subtours threads agent_workers engine heuristic backend stats_file presolve cuts', defaults = (5400, False, 0, 1, 'arc', 'start', 'cplex', None, True, 'none'))
+
 test = EdgesConditions([(0,1,2),(2,3,1)],4)
\ No newline at end of file
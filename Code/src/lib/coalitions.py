@@ -0,0 +1,144 @@
+'''
+Values of the coalitions of agents, and the Shapley value and core of the game they define.
+
+The value v(S) of a coalition S is the largest profit its agents can obtain pooling all their edges (the full cooperation
+model with the agents of S and no minimal profit for each agent). The 2^N - 1 coalitions are solved by size, so when a
+coalition is solved the values of all its sub-coalitions are known:
+    - For each split of S in two coalitions T and S - T, the union of their solutions is a solution of S (they use
+      different edges and commodities), so the best split is given as MIP start, and its value is a lower bound of v(S).
+    - The coalitions of the same size are independent, so they are solved at the same time (workers at once).
+    - The solutions are memoized by coalition, and stored in the cache if one is given, so they are solved only once.
+'''
+
+# Python packages
+import concurrent.futures as cf
+import itertools
+import math
+import os
+from docplex.mp.model import Model
+
+# Own modules
+import lib.classes as cl
+import lib.functions as fn
+import lib.engines as eng
+
+
+class CoalitionGame():
+
+    def __init__(self, instance, settings = cl.SolverSettings(), cache = None, workers = None):
+        N, V, commodities, edges = fn.read_data(instance)
+        self.N = N
+        self.V = V
+        self.agents = [cl.Agent(i,edges[i],commodities[i]) for i in range(N)] # Only read, all the coalitions share them
+        self.settings = settings
+        self.cache = cache
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.results = {} # Result of the model of each solved coalition (frozenset of agent ids), as model_result
+
+    # ---------------------------------
+    # ---- Values of the coalitions
+    # ---------------------------------
+
+    def value(self, coalition):
+        coalition = frozenset(coalition)
+        if not coalition:
+            return 0
+        if coalition not in self.results:
+            self.solve_coalitions(subsets(coalition))
+        return self.results[coalition]['objective']
+
+    def values(self):
+        # Value of every coalition, {frozenset of agent ids: value}
+        self.solve_coalitions(subsets(range(self.N)))
+        return {coalition:result['objective'] for coalition, result in self.results.items()}
+
+    def solve_coalitions(self, coalitions):
+        # Solves the coalitions which are not solved yet, by size. The list of coalitions has to include their sub-coalitions
+        pending = [coalition for coalition in coalitions if coalition not in self.results]
+        for size in sorted({len(coalition) for coalition in pending}):
+            level = [coalition for coalition in pending if len(coalition) == size]
+            workers = min(self.workers, len(level))
+            # The threads are divided among the models solved at the same time
+            threads = self.settings.threads or max(1, os.cpu_count() // workers)
+            if workers > 1:
+                with cf.ThreadPoolExecutor(max_workers = workers) as pool:
+                    results = list(pool.map(lambda coalition: self.solve_coalition(coalition, threads), level))
+            else:
+                results = [self.solve_coalition(coalition, threads) for coalition in level]
+            for coalition, result in zip(level, results):
+                if result is None:
+                    raise RuntimeError('The model of the coalition %s has no solution' %(sorted(coalition)))
+                self.results[coalition] = result
+
+    def solve_coalition(self, coalition, threads):
+        # Result of the full cooperation model of the agents of the coalition (None if no solution was found)
+        central_planner = cl.CentralizedSystem([self.agents[i] for i in sorted(coalition)],'full_cooperation')
+        # The best split is the MIP start (the agents alone have no split, so they start from the greedy routes)
+        return eng.solve_cooperation(self.V,central_planner,'full_cooperation',None,self.settings,cache = self.cache,mechanism = 'coalition_value',
+                                     start = self.best_split(coalition),threads = threads,workers = 1)
+
+    def best_split(self, coalition):
+        # Union of the solutions of the split of the coalition in two solved coalitions with the largest value (None for one agent)
+        best = None
+        members = sorted(coalition)
+        # Each split is counted once, with the first agent in the first part
+        for part in subsets(members[1:]):
+            first = frozenset(part) | {members[0]}
+            second = coalition - first
+            if not second or first not in self.results or second not in self.results:
+                continue
+            value = self.results[first]['objective'] + self.results[second]['objective']
+            if best is None or value > best['objective']:
+                best = {'objective':value,
+                        'routes':{**self.results[first]['routes'], **self.results[second]['routes']},
+                        'active_edges':self.results[first]['active_edges'] | self.results[second]['active_edges'],
+                        'edges_costs':self.results[first]['edges_costs'] + self.results[second]['edges_costs'],
+                        'stats':{'status':'split','solve_time':0,'gap':None,'nodes':0}}
+        return best
+
+    # ---------------------------------
+    # ---- Shapley value and core
+    # ---------------------------------
+
+    def shapley_values(self):
+        # Average marginal contribution of each agent over all the orders in which the agents can join the grand coalition
+        v = self.values()
+        v[frozenset()] = 0
+        shapley = []
+        for i in range(self.N):
+            others = [j for j in range(self.N) if j != i]
+            shapley.append(sum(math.factorial(len(S))*math.factorial(self.N - len(S) - 1)/math.factorial(self.N)*(v[frozenset(S) | {i}] - v[frozenset(S)])
+                               for S in subsets(others, include_empty = True)))
+        return shapley
+
+    def core_violations(self, allocation, tolerance = 1e-6):
+        # Coalitions which obtain less with the allocation (payoff of each agent) than their value, {coalition: value - payoff}.
+        # The grand coalition is violated if the allocation doesn't divide exactly its value. The allocation is in the core if it is empty
+        v = self.values()
+        violations = {coalition:v[coalition] - sum(allocation[i] for i in coalition) for coalition in v}
+        grand_coalition = frozenset(range(self.N))
+        return {coalition:excess for coalition, excess in violations.items()
+                if excess > tolerance or (coalition == grand_coalition and excess < -tolerance)}
+
+    def in_core(self, allocation, tolerance = 1e-6):
+        return not self.core_violations(allocation, tolerance)
+
+    def core_allocation(self):
+        # An allocation in the core (the one which minimizes the largest excess of the coalitions, i.e. in the least core),
+        # and the largest excess. The core is empty if the excess is positive
+        v = self.values()
+        mdl = Model('least core')
+        x = mdl.continuous_var_list(self.N, lb = -mdl.infinity, name = 'x')
+        excess = mdl.continuous_var(lb = -mdl.infinity, name = 'excess')
+        grand_coalition = frozenset(range(self.N))
+        mdl.add_constraint(mdl.sum(x) == v[grand_coalition])
+        mdl.add_constraints(v[coalition] - mdl.sum(x[i] for i in coalition) <= excess for coalition in v if coalition != grand_coalition)
+        mdl.minimize(excess)
+        mdl.solve()
+        return [var.solution_value for var in x], excess.solution_value
+
+
+def subsets(elements, include_empty = False):
+    # All the subsets of the elements, as frozensets, by size
+    elements = list(elements)
+    return [frozenset(S) for size in range(0 if include_empty else 1, len(elements) + 1) for S in itertools.combinations(elements, size)]
@@ -0,0 +1,317 @@
+'''
+Path based formulation of the cooperation models, solved with column generation (price-and-branch).
+
+Instead of one binary variable for each edge and commodity, the restricted master problem has one variable for each
+(commodity, path) in a pool of paths, so no subtour elimination constraints are needed. A path is only a column if the
+revenue of the commodity covers the payments to the owners of its edges (the payment constraints of the arc model).
+
+The linear relaxation of the master is built once and solved again after each round of new columns, which are added to
+it in place. The columns are priced exactly: for each owner and origin, the elementary paths with the least weight (the
+duals of the capacity and minimal profit constraints) whose payments to the other agents per unit are at most the
+revenue of the commodity. This resource constrained shortest path problem is solved with labels: for each node, the
+paths kept are the ones which no other path with less weight, less payments and a subset of its nodes dominates.
+In full cooperation, the relaxation spreads the fixed cost of an edge over fractions of u[e], so the linking rows
+sum of the paths of c through e <= u[e] (the inequalities f[e,c] <= u[e] of lib/cuts.py) are added when the solution
+violates them, and their duals are added to the weights of the edges of c when its paths are priced. When no path
+improves the relaxation and no linking row is violated, its value is an upper bound of the model ('relaxation_bound'
+in the stats, None if the iterations or the time ran out before).
+
+The master is then solved once with binary variables over the generated paths. There is no branching, so this integer
+solution can be worse than the optimum of the model: the paths of the optimum may not be needed by the relaxation. The
+gap to the relaxation bound ('bound_gap' in the stats) bounds how far it is from the optimum. The routes of a MIP start
+(e.g. the greedy routes) can be given as initial columns, so the solution is at least as good as them.
+'''
+
+from docplex.mp.model import Model # For modeling the LP problem and solving it with CPLEX
+import time
+
+# Own modules
+import lib.classes as cl
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------ RESTRICTED MASTER ---------------------------------
+# -----------------------------------------------------------------------------------
+
+def build_master(E, commodities, columns, type_cooperation, agents_minimal_profit = None, integer = False, **kwargs):
+    # columns is a list of (commodity, path), where path is a tuple of edges from the origin to the terminal of the commodity
+    # The rows are built without columns, and add_columns adds the terms of each column to them
+    mdl = Model('Master ' + type_cooperation, **kwargs)
+    mdl.integer = integer
+    mdl.columns = []
+    mdl.x = [] # Variable indicating if a commodity is routed through a path, one for each column
+
+    # --- decision variables ---
+    if type_cooperation == 'full_cooperation':
+        if integer:
+            mdl.u = mdl.binary_var_dict(E, name = 'u') # Variable which would indicate if an edge is used or not.
+        else:
+            mdl.u = mdl.continuous_var_dict(E, ub = 1, name = 'u')
+    num_agents = len(agents_minimal_profit) if agents_minimal_profit is not None else 0
+    mdl.slack = mdl.continuous_var_list(num_agents, name = 'slack') # Violation of the minimal profit of each agent, penalized in the objective
+
+    # --- constraints ---
+    # Each commodity is routed through one path at most
+    mdl.convexity = {c:mdl.add_constraint(mdl.linear_expr() <= 1) for c in commodities}
+    # The sum of commodities on an edge can't exceed its capacity
+    if type_cooperation == 'residual_cooperation':
+        mdl.capacity = {e:mdl.add_constraint(mdl.linear_expr() <= E[e].free_capacity) for e in E}
+    elif type_cooperation == 'partial_cooperation':
+        mdl.capacity = {e:mdl.add_constraint(mdl.linear_expr() <= E[e].original_capacity) for e in E}
+    elif type_cooperation == 'full_cooperation':
+        mdl.capacity = {e:mdl.add_constraint(mdl.linear_expr(- E[e].original_capacity*mdl.u[e]) <= 0) for e in E}
+    # Linking rows of the models with fixed costs, sum of the paths of c through e <= u[e], added when they are violated
+    mdl.linking = {}
+    # Every agent has to earn at least as much as he will win without cooperation
+    mdl.minimal_profit = [mdl.add_constraint(mdl.linear_expr(mdl.slack[i] - (mdl.sum(mdl.u[e]*E[e].cost for e in E if e[2] == i) if type_cooperation == 'full_cooperation' else 0))
+                                             >= agents_minimal_profit[i]) for i in range(num_agents)]
+
+    # --- objective ---
+    penalty = 1 + sum(commodities[c].units*commodities[c].revenue for c in commodities) + sum(E[e].cost for e in E)
+    mdl.revenues = mdl.linear_expr()
+    mdl.edges_costs = mdl.sum(mdl.u[e]*E[e].cost for e in E) if type_cooperation == 'full_cooperation' else 0
+    mdl.maximize(mdl.linear_expr(- mdl.edges_costs - penalty*mdl.sum(mdl.slack)))
+
+    add_columns(mdl, E, commodities, columns)
+    return mdl
+
+
+def add_columns(mdl, E, commodities, new_columns):
+    # Adds a variable for each column, with its terms in the rows and in the objective (the master keeps its rows, so
+    # the next solve of the relaxation starts from the previous basis)
+    first = len(mdl.x)
+    names = ['x_%d' %(first + k) for k in range(len(new_columns))]
+    new_x = mdl.binary_var_list(len(new_columns), name = names) if mdl.integer else mdl.continuous_var_list(len(new_columns), ub = 1, name = names)
+    for x, (c, path) in zip(new_x, new_columns):
+        units = commodities[c].units
+        mdl.convexity[c].lhs.add_term(x, 1)
+        for e in path:
+            mdl.capacity[e].lhs.add_term(x, units)
+            if (e, c) in mdl.linking:
+                mdl.linking[e, c].lhs.add_term(x, 1)
+        for i, ct in enumerate(mdl.minimal_profit):
+            payoff = column_agent_payoff(E, commodities, (c, path), i)
+            if payoff:
+                ct.lhs.add_term(x, payoff)
+        mdl.revenues.add_term(x, units*commodities[c].revenue)
+        mdl.objective_expr.add_term(x, units*commodities[c].revenue)
+    mdl.x.extend(new_x)
+    mdl.columns.extend(new_columns)
+
+
+def add_linking_rows(mdl):
+    # Adds the linking rows violated by the solution of the relaxation, and returns whether there was any
+    flow = {}
+    for x, (c, path) in zip(mdl.x, mdl.columns):
+        value = x.solution_value
+        if value > 1e-6:
+            for e in path:
+                flow[e, c] = flow.get((e, c), 0) + value
+    violated = {(e, c) for (e, c), value in flow.items() if (e, c) not in mdl.linking and value > mdl.u[e].solution_value + 1e-6}
+    for e, c in violated:
+        mdl.linking[e, c] = mdl.add_constraint(mdl.linear_expr(- mdl.u[e]) <= 0)
+    for x, (c, path) in zip(mdl.x, mdl.columns):
+        for e in path:
+            if (e, c) in violated:
+                mdl.linking[e, c].lhs.add_term(x, 1)
+    return bool(violated)
+
+
+def column_agent_payoff(E, commodities, column, i):
+    # What the agent i earns if the commodity is routed through the path: the revenue minus the payments to the owners
+    # of the edges if the commodity is of the agent, or the payments for its edges if the commodity is of other agent
+    c, path = column
+    units = commodities[c].units
+    if c[2] == i:
+        return units*commodities[c].revenue - sum(units*E[e].cost_per_unit for e in path if e[2] != i)
+    return sum(units*E[e].cost_per_unit for e in path if e[2] == i)
+
+
+def path_is_profitable(E, commodities, c, path):
+    # A commodity can only be routed through a path if its revenue covers the payments to the owners of the edges
+    units = commodities[c].units
+    return units*commodities[c].revenue - sum(units*E[e].cost_per_unit for e in path if e[2] != c[2]) >= 0
+
+
+# -----------------------------------------------------------------------------------
+# -------------------------------- PRICING PROBLEM ---------------------------------
+# -----------------------------------------------------------------------------------
+
+def resource_constrained_paths(index, origin, weight, resource, max_resource, max_edges, tolerance = 1e-9):
+    # Elementary paths from the origin with at most max_edges edges whose resource is at most max_resource (the weights
+    # can be negative). Returns for each node the list of (weight, resource, path) of the paths which are not dominated
+    bits = {}
+    def bit(v):
+        return bits.setdefault(v, 1 << len(bits))
+
+    # A label is [weight, resource, visited nodes (bit mask), path, alive]
+    first = [0, 0, bit(origin), (), True]
+    labels = {origin:[first]}
+    frontier = [(origin, first)]
+    for _ in range(max_edges):
+        new_frontier = []
+        for v, label in frontier:
+            if not label[4]: # Dominated after it was added
+                continue
+            cost, used, visited, path = label[:4]
+            for e in index.out_edges[v]:
+                if visited & bit(e[1]):
+                    continue
+                new_used = used + resource[e]
+                if new_used > max_resource + tolerance:
+                    continue
+                new_label = [cost + weight[e], new_used, visited | bit(e[1]), path + (e,), True]
+                if add_label(labels.setdefault(e[1], []), new_label, tolerance):
+                    new_frontier.append((e[1], new_label))
+        frontier = new_frontier
+        if not frontier:
+            break
+    return {v:[(label[0], label[1], label[3]) for label in node_labels] for v, node_labels in labels.items()}
+
+
+def add_label(node_labels, label, tolerance):
+    # Adds the label to the ones of its node, unless other label dominates it (less weight and resource through a subset
+    # of its nodes, so any extension of the label is also an extension of the other one), and removes the ones it dominates
+    cost, used, visited = label[:3]
+    for other in node_labels:
+        if other[0] <= cost + tolerance and other[1] <= used + tolerance and not other[2] & ~visited:
+            return False
+    kept = []
+    for other in node_labels:
+        if cost <= other[0] + tolerance and used <= other[1] + tolerance and not visited & ~other[2]:
+            other[4] = False
+        else:
+            kept.append(other)
+    node_labels[:] = kept + [label]
+    return True
+
+
+def price_columns(E, commodities, index, duals, type_cooperation, columns_set, max_edges, tolerance = 1e-6):
+    # Returns the best column of each commodity if its reduced cost is positive
+    # Reduced cost of a path p of commodity c: units*revenue*(1 - mu_owner) - sigma_c - units*sum_{e in p} w_e - sum_{e in p} rho_ec,
+    # with w_e = pi_e + cost_per_unit_e*(mu_{owner of e} - mu_owner) for the edges of other agents, w_e = pi_e for own edges,
+    # and rho_ec the dual of the linking row of e and c (if it is in the master), over the paths whose payments to the
+    # other agents per unit (sum of their cost_per_unit) are at most the revenue per unit
+    sigma, pi, mu, rho = duals
+    new_columns = []
+
+    groups = {} # Commodities with the same owner and origin share the weights and resources of the edges
+    for c in commodities:
+        if commodities[c].units > 0:
+            groups.setdefault((c[2], c[0]), []).append(c)
+    linked = {} # Duals of the linking rows of each commodity, which only change its own weights
+    for (e, c), value in rho.items():
+        if value > tolerance:
+            linked.setdefault(c, {})[e] = value
+
+    for (owner, origin), group in groups.items():
+        mu_owner = mu.get(owner, 0)
+        weight = {e:pi[e] + (E[e].cost_per_unit*(mu.get(e[2], 0) - mu_owner) if e[2] != owner else 0) for e in E}
+        resource = {e:(E[e].cost_per_unit if e[2] != owner else 0) for e in E}
+        shared = [c for c in group if c not in linked]
+        paths = resource_constrained_paths(index, origin, weight, resource, max(commodities[c].revenue for c in shared), max_edges) if shared else {}
+        for c in group:
+            units = commodities[c].units
+            if c in linked:
+                own_weight = {e:weight[e] + linked[c].get(e, 0)/units for e in E}
+                candidates = resource_constrained_paths(index, origin, own_weight, resource, commodities[c].revenue, max_edges).get(c[1], [])
+            else:
+                candidates = paths.get(c[1], [])
+            constant = units*commodities[c].revenue*(1 - mu_owner) - sigma[c]
+            feasible = [(cost, path) for cost, used, path in candidates if used <= commodities[c].revenue + 1e-9]
+            if not feasible:
+                continue
+            cost, path = min(feasible)
+            if constant - units*cost > tolerance and (c, path) not in columns_set:
+                new_columns.append((c, path))
+    return new_columns
+
+
+# -----------------------------------------------------------------------------------
+# ----------------------------------- ENGINE ---------------------------------------
+# -----------------------------------------------------------------------------------
+
+def solve_cooperation_paths(E, commodities, type_cooperation, agents_minimal_profit = None, index = None, time_limit = None, threads = 0, start = None, max_iterations = 1000):
+    # Column generation on the linear relaxation of the master, and then the master with binary variables over the generated paths.
+    # start is a result (e.g. of the greedy heuristic) whose routes are initial columns.
+    # Returns the result of the solution (as functions.model_result), or None if no feasible solution was found.
+    init_time = time.time()
+    if index is None:
+        index = cl.GraphIndex(E)
+    max_edges = len({v for e in E for v in e[:2]}) - 1
+
+    # Initial columns: the routes the commodities already have (e.g. the stand-alone routes of the agents), which make the
+    # master feasible, and the routes of start
+    routes = [(c, commodities[c].route) for c in commodities if commodities[c].route]
+    if start is not None:
+        routes += [(c, route) for c, route in start['routes'].items() if c in commodities]
+    columns = []
+    columns_set = set()
+    for c, route in routes:
+        if all(e in E for e in route):
+            path = order_route(route, c[0])
+            if path is not None and (c, path) not in columns_set and path_is_profitable(E, commodities, c, path):
+                columns.append((c, path))
+                columns_set.add((c, path))
+
+    mdl = build_master(E, commodities, columns, type_cooperation, agents_minimal_profit)
+    if threads:
+        mdl.parameters.threads = threads
+    iterations = 0
+    converged = False
+    while iterations < max_iterations and (time_limit is None or time.time() - init_time < time_limit):
+        iterations += 1
+        if not mdl.solve():
+            break
+        # Duals with the convention of CPLEX (reduced cost = objective coefficient - column * duals)
+        sigma = {c:ct.dual_value for c, ct in mdl.convexity.items()}
+        pi = {e:ct.dual_value for e, ct in mdl.capacity.items()}
+        mu = {i:ct.dual_value for i, ct in enumerate(mdl.minimal_profit)}
+        rho = {key:ct.dual_value for key, ct in mdl.linking.items()}
+        new_columns = price_columns(E, commodities, index, (sigma, pi, mu, rho), type_cooperation, columns_set, max_edges)
+        if not new_columns:
+            # No path improves the relaxation, so the linking rows it violates are added and it is solved again
+            if type_cooperation == 'full_cooperation' and add_linking_rows(mdl):
+                continue
+            converged = True
+            break
+        add_columns(mdl, E, commodities, new_columns)
+        columns_set.update(new_columns)
+    # The relaxation only bounds the model when no column can improve it
+    relaxation_bound = mdl.objective_value if converged else None
+    columns = mdl.columns
+
+    # --- price-and-branch: integer master over the generated columns ---
+    mdl = build_master(E, commodities, columns, type_cooperation, agents_minimal_profit, integer = True)
+    if threads:
+        mdl.parameters.threads = threads
+    if time_limit is not None:
+        mdl.set_time_limit(max(time_limit - (time.time() - init_time), 1))
+    if not mdl.solve() or any(s.solution_value > 1e-6 for s in mdl.slack):
+        return None
+
+    routes = {columns[j][0]:set(columns[j][1]) for j in range(len(columns)) if mdl.x[j].solution_value > 0.9}
+    edges_costs = mdl.edges_costs.solution_value if type_cooperation == 'full_cooperation' else 0
+    objective = mdl.revenues.solution_value - edges_costs
+    result = {'objective':objective,
+              'routes':routes,
+              'active_edges':set(),
+              'edges_costs':0,
+              'stats':{'status':str(mdl.solve_details.status),'solve_time':time.time() - init_time,'gap':mdl.solve_details.mip_relative_gap,
+                       'nodes':mdl.solve_details.nb_nodes_processed,'columns':len(columns),'iterations':iterations,'relaxation_bound':relaxation_bound,
+                       'bound_gap':relaxation_bound - objective if relaxation_bound is not None else None}}
+    if type_cooperation == 'full_cooperation':
+        result['active_edges'] = {e for e in E if mdl.u[e].solution_value > 0.9}
+        result['edges_costs'] = edges_costs
+    return result
+
+
+def order_route(route, origin):
+    # Sorts the edges of a route from the origin, returns None if they are not a path
+    next_edge = {e[0]:e for e in route}
+    path = []
+    node = origin
+    while node in next_edge and len(path) < len(route):
+        path.append(next_edge[node])
+        node = next_edge[node][1]
+    return tuple(path) if len(path) == len(route) else None
@@ -0,0 +1,58 @@
+'''
+Valid inequalities which tighten the linear relaxation of the capacity constraints of the single agent and cooperation models.
+
+The capacity constraint of an edge, sum_c units[c]*f[e,c] <= capacity[e]*u[e] (a constant instead of u[e] in partial and
+residual cooperation), is the only link between the flows and the activation of the edge. In the linear relaxation a
+commodity can pay a small fraction of the fixed cost of the edge, u[e] = units[c]/capacity[e], so the bound is weak and the
+branch-and-bound trees are large. The inequalities are:
+
+    - Linking: f[e,c] <= u[e] for each edge and commodity (models with fixed costs). Any flow activates the whole edge.
+    - Covers: for a set C of commodities which don't fit together in the edge (sum of their units larger than the
+      capacity), sum_{c in C} f[e,c] <= (|C| - 1)*u[e]. Since u[e] is binary, these are also the flow covers of the
+      capacity constraints. Not all the minimal covers are generated (there can be exponentially many), only:
+          - The commodities larger than the capacity alone (their flow on the edge is 0).
+          - The commodities larger than half of the capacity, of which at most one fits: sum_{c in C} f[e,c] <= u[e].
+          - For each commodity, the cover with it and the next smaller commodities until they don't fit, with up to
+            MAX_COVER_SIZE commodities (the larger covers hardly cut the relaxation).
+
+With settings.cuts = 'static' the inequalities are added to the model as constraints, and with 'pool' they are given to
+CPLEX as user cuts, which it only adds to the relaxation of a node when they are violated (with the other backends they
+are written as constraints).
+'''
+
+MAX_COVER_SIZE = 4
+
+
+def capacity_covers(units, capacity, max_size = MAX_COVER_SIZE):
+    # Covers of a capacity constraint, as a list of (commodities, right hand side), where units is {commodity: units}
+    # and the inequality is sum_{c in commodities} f[e,c] <= right hand side (times u[e] in the models with fixed costs)
+    covers = [((c,), 0) for c in units if units[c] > capacity]
+    fitting = sorted((c for c in units if units[c] <= capacity), key = lambda c: -units[c])
+
+    large = [c for c in fitting if 2*units[c] > capacity]
+    if len(large) > 1:
+        covers.append((tuple(large), 1))
+
+    for first in range(len(fitting)):
+        cover = []
+        load = 0
+        for c in fitting[first:first + max_size]:
+            cover.append(c)
+            load += units[c]
+            if load > capacity:
+                break
+        # The covers of large commodities are implied by the one of all of them
+        if load > capacity and not all(2*units[c] > capacity for c in cover):
+            covers.append((tuple(cover), len(cover) - 1))
+    return covers
+
+
+def edges_covers(E, commodities, capacity, max_size = MAX_COVER_SIZE):
+    # Covers of the capacity constraint of each edge, {edge: covers}, where capacity is {edge: capacity}
+    # The covers only depend on the capacity, so they are computed once for each value
+    units = {c:commodities[c].units for c in commodities}
+    by_capacity = {}
+    for e in E:
+        if capacity[e] not in by_capacity:
+            by_capacity[capacity[e]] = capacity_covers(units, capacity[e], max_size)
+    return {e:by_capacity[capacity[e]] for e in E}
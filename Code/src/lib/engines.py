@@ -0,0 +1,97 @@
+'''
+Solution of the cooperation model of a central planner with the engine of the settings.
+
+The full, partial and residual cooperation mechanisms and the coalitions of lib/coalitions.py solve the same model
+with the engines of SolverSettings:
+    - 'arc': the arc model of lib/models.py, built with docplex.
+    - 'matrix': the same model built as a sparse matrix (lib/matrix.py).
+    - 'path': the path formulation solved with column generation (lib/column_generation.py).
+    - 'benders': Benders decomposition (lib/benders.py), only for full cooperation without minimal profits (the values
+      of the coalitions). The mechanisms, whose agents are linked by their minimal profits, use the arc model, with a
+      warning. The engine which solved the model is the 'engine' of the statistics.
+With heuristic 'start' the greedy routes (lib/heuristics.py) are the MIP start, and with heuristic 'only' they are the
+solution. The result is looked up in the cache before solving the model, and stored in it afterwards.
+'''
+
+import warnings
+
+# Own modules
+import lib.models as mdls
+import lib.functions as fn
+import lib.cache as ch
+import lib.column_generation as cg
+import lib.matrix as mx
+import lib.benders as bd
+import lib.heuristics as hr
+import lib.instrumentation as ins
+
+
+def solve_cooperation(V, central_planner, type_cooperation, agents_minimal_profit, settings, stats = None, cache = None,
+                      mechanism = None, start = None, threads = None, workers = None):
+    # Returns the result of the model (as functions.model_result), or None if no solution was found
+    # mechanism is the name of the result in the cache (type_cooperation by default), start is a result used as MIP start
+    # instead of the greedy routes, threads replaces settings.threads and workers is the number of Benders subproblems
+    # solved at once. The times and statistics of the model are added to stats (a ModelStats), which the caller writes
+    E, commodities, index = central_planner.edges, central_planner.commodities, central_planner.index
+    mechanism = mechanism or type_cooperation
+    threads = settings.threads if threads is None else threads
+    if stats is None:
+        stats = ins.ModelStats(settings._replace(stats_file = None), None, mechanism)
+
+    if cache is not None:
+        key = ch.make_key(ch.data_fingerprint(E,commodities),mechanism,tuple(agents_minimal_profit or ()),settings)
+        result = cache.get(key)
+        stats.add(cached = result is not None)
+        if result is not None:
+            return result
+
+    if settings.heuristic == 'only':
+        # Fast mode: the greedy routes (or the given start) are the solution
+        with stats.measure('solve'):
+            if start is None:
+                start = hr.heuristic_solution(E,commodities,type_cooperation,agents_minimal_profit,index)
+        return start
+
+    with stats.measure('build'):
+        if start is None and settings.heuristic == 'start':
+            start = hr.greedy_routes(E,commodities,type_cooperation,agents_minimal_profit,index)
+
+    engine = settings.engine
+    if engine == 'benders' and (type_cooperation != 'full_cooperation' or agents_minimal_profit is not None):
+        warnings.warn("engine = 'benders' only solves full cooperation without minimal profits, the %s model is solved "
+                      "with the arc model" %(mechanism), stacklevel = 2)
+        engine = 'arc'
+    stats.add(engine = engine)
+
+    if engine == 'path':
+        # Path formulation solved with column generation
+        with stats.measure('solve'):
+            result = cg.solve_cooperation_paths(E,commodities,type_cooperation,agents_minimal_profit,index,settings.time_limit,threads,start)
+        stats.add_result(result)
+    elif engine == 'benders':
+        # Benders decomposition: master over the edges, routing subproblems over the chosen edges
+        with stats.measure('solve'):
+            result = bd.solve_cooperation_benders(V,E,commodities,index,settings.time_limit,threads,settings.lazy_subtours,settings.backend,start,workers = workers)
+        stats.add_result(result)
+    elif engine == 'matrix':
+        # Same model built as a sparse matrix
+        with stats.measure('build'):
+            model = mx.build_matrix_model(V,E,commodities,type_cooperation,agents_minimal_profit,settings.lazy_subtours,index,settings.presolve,settings.cuts)
+        with stats.measure('solve'):
+            result = mx.solve_matrix_model(model,settings.time_limit,threads,settings.backend,start)
+        stats.add_matrix_model(model,result)
+    else:
+        with stats.measure('build'):
+            model = mdls.build_cooperation_model(V,E,commodities,type_cooperation,agents_minimal_profit or [],settings.lazy_subtours,index,settings.presolve,settings.cuts)
+            mdls.add_routes_mip_start(model,start)
+        with stats.measure('solve'):
+            solution = mdls.solve_model(model,settings.time_limit,threads,settings.backend)
+        stats.add_model(model)
+        result = None
+        if solution:
+            with stats.measure('recover'):
+                result = fn.model_result(model)
+
+    if result is not None and cache is not None:
+        cache.put(key,result)
+    return result
@@ -1,34 +1,10 @@
 import lib.classes as cl
-import os # Necessary to open the file from any working directory
+import lib.instances as ins
 
 
-# Function to read the data from an instance
+# Function to read the data from an instance (from its binary file if it has been converted with convert_instances.py)
 def read_data(instance):
-    file = open(os.path.join(os.path.join(os.path.dirname(__file__),os.pardir,os.pardir,'instances',instance)),'r')
-    lines_list = file.readlines()
-    N, V = (int(x) for x in lines_list[0].split())
-    V = {i for i in range(V)}
-    commodities = {i:{} for i in range(N)}
-    edges = {i:{} for i in range(N)}
-
-    for line in lines_list[1:]:
-        if line.rstrip() == 'Agent':
-            prev = 'Agent'
-        elif line.rstrip() == 'Commodities':
-            prev = 'Commodities'
-        elif line.rstrip() == 'Edges':
-            prev = 'Edges'
-        else:
-            if prev == 'Agent':
-                owner = int(line)
-            if prev == 'Commodities':
-                temp = [int(x) for x in line.split()]
-                commodities[owner][(temp[0],temp[1],temp[2])] = cl.Commodity(temp[0],temp[1],temp[2],temp[3],temp[4])
-            if prev == 'Edges':
-                temp = [int(x) for x in line.split()]
-                edges[owner][(temp[0],temp[1],temp[2])] = cl.Edge(temp[0],temp[1],temp[2],temp[3],temp[4])
-    
-    return N, V, commodities, edges
+    return ins.build_objects(*ins.load_arrays(instance))
 
 
 
@@ -63,21 +39,77 @@ def print_iterative_solution(mdl):
 # Function for recover data from solved model
 # ----------------------------
 
+# Values of the variables are taken from the solution in one call (only the non-zero ones), instead of asking the value of each variable
+
+# Route of each served commodity, grouping the active flow variables by commodity in one pass
+def solution_routes(mdl):
+    routes = {}
+    for (e,c), value in mdl.solution.get_value_dict(mdl.f, keep_zeros = False).items():
+        if value > 0.9: # We use >0.9 because sometimes CPLEX can say the value is 0.99999, even if it is 1
+            routes.setdefault(c,set()).add(e)
+    return routes
+
+
+# Keys of the binary variables of the dictionary with value 1
+def active_keys(mdl,var_dict):
+    return {key for key, value in mdl.solution.get_value_dict(var_dict, keep_zeros = False).items() if value > 0.9}
+
+
+# Units routed through each edge
+def used_capacity(routes,commodities):
+    used = {}
+    for c, route in routes.items():
+        for e in route:
+            used[e] = used.get(e,0) + commodities[c].units
+    return used
+
+
+# Plain result of a solved model (objective, routes, active edges and solve statistics), which can be stored in the cache
+def model_result(mdl):
+    result = {'objective':mdl.objective_value,
+              'routes':solution_routes(mdl),
+              'active_edges':set(),
+              'edges_costs':0,
+              'stats':solve_statistics(mdl)}
+    if hasattr(mdl,'u'):
+        result['active_edges'] = active_keys(mdl,mdl.u)
+        result['edges_costs'] = mdl.edges_costs.solution_value
+    return result
+
+
+# Statistics of the last solve of a model
+def solve_statistics(mdl):
+    if getattr(mdl,'backend_details',None) is not None: # Solved with an open-source backend
+        return dict(mdl.backend_details)
+    details = mdl.solve_details
+    nodes = details.nb_nodes_processed
+    gap = details.mip_relative_gap
+    # With lexicographic objectives, CPLEX gives these values for each objective
+    if not isinstance(nodes,(int,float)):
+        nodes = sum(nodes)
+    if not isinstance(gap,(int,float)):
+        gap = max(gap, default = 0)
+    if gap >= 1e20: # CPLEX gives 1e20 when the gap is not defined (e.g. with lexicographic objectives)
+        gap = None
+    return {'status':str(details.status),'solve_time':details.time,'gap':gap,'nodes':nodes}
+
+
 # Single agent model
 def recover_data_single_agent(mdl,agent):
-    agent.active_edges = {e for e in agent.edges if mdl.u[e].solution_value>0.9} # We use >0.9 because sometimes CPLEX can say the value is 0.99999, even if it is 1
-    active_flow= [flow_var for flow_var in [(edge,commodity) for edge in agent.edges for commodity in agent.commodities] if mdl.f[flow_var].solution_value>0.9]
-    
-    agent.served_commodities = {a[1] for a in active_flow} # Dictionary with the served commodities as keys
-  
+    apply_single_agent_result(model_result(mdl),agent)
+
+
+def apply_single_agent_result(result,agent):
+    agent.active_edges = set(result['active_edges'])
+    agent.served_commodities = set(result['routes']) # Dictionary with the served commodities as keys
+
     # We assign to each satisfied commodity its proper flow from origin to terminal
     for c in agent.served_commodities:
-        agent.commodities[c].route = {flow_var[0] for flow_var in active_flow if flow_var[1] == c}
-        
+        agent.commodities[c].route = set(result['routes'][c])
+
     # We update the free capacity of the edges
-    for c in agent.served_commodities:
-        for e in agent.commodities[c].route:
-            agent.edges[e].free_capacity -= agent.commodities[c].units
+    for e, units in used_capacity(result['routes'],agent.commodities).items():
+        agent.edges[e].free_capacity -= units
 
     # We get dictionary of commodities of the agent which are not served (and are different to 0)
     agent.unserved_commodities = {c for c in agent.commodities if c not in agent.served_commodities and agent.commodities[c].units != 0}
@@ -88,57 +120,55 @@ def recover_data_single_agent(mdl,agent):
 
 # Central planner model
 def recover_data_cooperation(mdl,central_planner,type_cooperation):
-    active_flow= [flow_var for flow_var in [(edge,commodity) for edge in central_planner.edges for commodity in central_planner.commodities] if mdl.f[flow_var].solution_value>0.9]
-    central_planner.served_commodities = {a[1] for a in active_flow} # Dictionary with the satisfied commodities as keys
-  
+    apply_cooperation_result(model_result(mdl),central_planner,type_cooperation)
+
+
+def apply_cooperation_result(result,central_planner,type_cooperation):
+    central_planner.served_commodities = set(result['routes']) # Dictionary with the satisfied commodities as keys
+
     # We assign to each satisfied commodity its proper flow from origin to terminal
     for c in central_planner.served_commodities:
-        central_planner.commodities[c].route = {flow_var[0] for flow_var in active_flow if flow_var[1] == c}
+        central_planner.commodities[c].route = set(result['routes'][c])
 
-    
     if type_cooperation == 'full_cooperation':
-        central_planner.active_edges = {e for e in central_planner.edges if mdl.u[e].solution_value>0.9} # We use >0.9 because sometimes CPLEX can say the value is 0.99999, even if it is 1
+        central_planner.active_edges = set(result['active_edges'])
         # We assign to each edge, its used capacity
-        for c in central_planner.served_commodities:
-            for e in central_planner.commodities[c].route:
-                central_planner.edges[e].free_capacity -= central_planner.commodities[c].units
+        for e, units in used_capacity(result['routes'],central_planner.commodities).items():
+            central_planner.edges[e].free_capacity -= units
 
 
 #Iterative model
 def recover_data_iterative(mdl,agent,info_platform):
-    
-    if agent.id == 0:
-        other_agent_id = 1
-    else:
-        other_agent_id = 0
+    # The edges shared by the other agents are taken from the model (the ones it could use in the last solve), since with
+    # the parallel schedule the platform can already contain the new edges shared by other agents
 
-    agent.active_edges = {e for e in agent.edges if mdl.u[e].solution_value>0.9} # We use >0.9 because sometimes CPLEX can say the value is 0.99999, even if it is 1
+    agent.active_edges = active_keys(mdl,mdl.u)
     
-    active_flow = [flow_var for flow_var in [(edge,commodity) for edge in {**agent.edges,**info_platform.shared_edges[other_agent_id]} for commodity in agent.commodities] if mdl.f[flow_var].solution_value>0.9]
+    # Only the own edges and the shared ones can have flow (the flow variables of the other edges are fixed to 0)
+    routes = solution_routes(mdl)
     
-    agent.served_commodities = {a[1] for a in active_flow} # Dictionary with the served commodities as keys
+    agent.served_commodities = set(routes) # Dictionary with the served commodities as keys
   
     # We assign to each satisfied commodity its proper flow from origin to terminal
     for c in agent.served_commodities:
-        agent.commodities[c].route = {flow_var[0] for flow_var in active_flow if flow_var[1] == c}
+        agent.commodities[c].route = routes[c]
         
-        # Also take which edges shared for the other agent that demands requires, and how much it would generate
-        temp_list = [e for e in agent.commodities[c].route if e[2]!=agent.id]
-        temp_value = sum(info_platform.shared_edges[other_agent_id][e].cost_per_unit*agent.commodities[c].units for e in temp_list)
-        if temp_list:
+        # Also take which edges shared for the other agents that demands requires, and how much it would generate to each owner
+        temp_lists = {}
+        for e in agent.commodities[c].route:
+            if e[2] != agent.id:
+                temp_lists.setdefault(e[2],[]).append(e)
+        for owner, temp_list in temp_lists.items():
+            temp_value = sum(mdl.other_edges[e].cost_per_unit*agent.commodities[c].units for e in temp_list)
             info_platform.demanded_edges_conditions[agent.id].append(cl.EdgesConditions(temp_list,temp_value))
 
-    # We get which edges from the other agent the current agent uses
-    info_platform.demanded_edges[agent.id] = {flow_var[0]:0 for flow_var in active_flow if flow_var[0][2] != agent.id}
-
-
-    # We update the free capacity of the edges
-    for c in agent.served_commodities:
-        for e in agent.commodities[c].route:
-            if e[2] == agent.id: # We have to update the capacity of the edge in differenc dictionaries depending who is the owner
-                agent.edges[e].free_capacity -= agent.commodities[c].units
-            else:
-                info_platform.demanded_edges[agent.id][e] += agent.commodities[c].units
+    # We get which edges from the other agents the current agent uses, and update the free capacity of the own edges
+    info_platform.demanded_edges[agent.id] = {}
+    for e, units in used_capacity(routes,agent.commodities).items():
+        if e[2] == agent.id: # We have to update the capacity of the edge in differenc dictionaries depending who is the owner
+            agent.edges[e].free_capacity -= units
+        else:
+            info_platform.demanded_edges[agent.id][e] = units
 
     # We get dictionary of commodities of the agent which are not served (and are different to 0)
     agent.unserved_commodities = {c for c in agent.commodities if c not in agent.served_commodities and agent.commodities[c].units != 0}
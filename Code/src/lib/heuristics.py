@@ -0,0 +1,250 @@
+'''
+Greedy routing heuristic for the single agent and cooperation models.
+
+The commodities are routed one by one, from the most valuable (units*revenue) to the least, through the shortest path
+by cost_per_unit among the edges with enough capacity left. The commodity can't route through a path whose payments to
+the edges of the other agents are larger than its revenue.
+
+In the models without fixed costs (partial and residual cooperation) a path is kept if the commodity fits. In the models
+with fixed costs (single agent and full cooperation), a commodity that had to pay alone the edges it activates is never
+routed if its revenue is smaller than their costs, even when other commodities could share them. So the fixed costs are
+spread with slope scaling: each inactive edge costs a share of its fixed cost per unit of flow (at first its cost_per_unit,
+the share when it is full), all the commodities which pay their shares are routed, and then:
+    - The commodities (or the groups of commodities sharing an edge) whose revenue doesn't cover the edges only they use
+      are removed.
+    - The commodities left are routed again if their revenue covers the whole cost of the edges they activate.
+    - The share of each active edge becomes its cost divided by its flow, for the next round.
+The best routes of SLOPE_ITERATIONS rounds are kept. The result has the same format as functions.model_result, so it can
+be used directly as a (fast) solution of the mechanism, or given to the exact model as a MIP start. It is a feasible
+solution of the model, but not an optimal one.
+'''
+
+import heapq
+import time
+import warnings
+
+# Own modules
+import lib.classes as cl
+
+SLOPE_ITERATIONS = 10
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------- GREEDY HEURISTIC ---------------------------------
+# -----------------------------------------------------------------------------------
+
+def greedy_routes(E, commodities, type_cooperation = 'single_agent', agents_minimal_profit = None, index = None):
+    # type_cooperation is 'single_agent' or the type of the cooperation model. Returns the result of the solution
+    # (as functions.model_result), or None if the agents can't get their minimal profit with the greedy routes
+    init_time = time.time()
+    if index is None:
+        index = cl.GraphIndex(E)
+
+    result = best_greedy(E, commodities, type_cooperation, agents_minimal_profit, index, {})
+    if result is None:
+        # We keep the routes the commodities already have (e.g. the stand-alone routes of the agents, which give each agent
+        # its minimal profit), and only route greedily the rest of commodities
+        fixed_routes = {c:commodities[c].route for c in commodities if commodities[c].route and all(e in E for e in commodities[c].route)}
+        result = best_greedy(E, commodities, type_cooperation, agents_minimal_profit, index, fixed_routes, keep_payoffs = True)
+        if result is None:
+            return None
+
+    result['stats'] = {'status':'greedy','solve_time':time.time() - init_time,'gap':None,'nodes':0}
+    return result
+
+
+def heuristic_solution(E, commodities, type_cooperation = 'single_agent', agents_minimal_profit = None, index = None):
+    # Greedy routes used instead of the solution of the model (settings.heuristic = 'only')
+    warnings.warn("heuristic = 'only': the greedy routes are used as the solution of the models, they are feasible but "
+                  "not optimal, so the payoffs can be lower than the ones of the exact models", stacklevel = 2)
+    return greedy_routes(E, commodities, type_cooperation, agents_minimal_profit, index)
+
+
+def best_greedy(E, commodities, type_cooperation, agents_minimal_profit, index, fixed_routes, keep_payoffs = False):
+    # Best greedy routes which give each agent its minimal profit (None if there are none), with slope scaling in the
+    # models with fixed costs
+    if type_cooperation not in ('single_agent', 'full_cooperation'):
+        result = greedy_from(E, commodities, type_cooperation, index, fixed_routes, keep_payoffs)
+        return result if has_minimal_profit(E, commodities, type_cooperation, agents_minimal_profit, result) else None
+
+    best = None
+    # The paths are chosen with and without the payments for the flow (they cancel out in the objective, but the
+    # commodities have to pay them), each with its own rounds of slope scaling
+    for flow_weight in (1, 0):
+        shares = {e:E[e].cost_per_unit for e in E}
+        seen = set()
+        for _ in range(SLOPE_ITERATIONS):
+            result = greedy_from(E, commodities, type_cooperation, index, fixed_routes, keep_payoffs, shares, flow_weight)
+            if has_minimal_profit(E, commodities, type_cooperation, agents_minimal_profit, result) and (best is None or result['objective'] > best['objective']):
+                best = result
+            key = frozenset((c, frozenset(route)) for c, route in result['routes'].items())
+            if key in seen: # The next rounds would repeat the same routes
+                break
+            seen.add(key)
+            flow = {}
+            for c, route in result['routes'].items():
+                for e in route:
+                    flow[e] = flow.get(e, 0) + commodities[c].units
+            for e, units in flow.items():
+                shares[e] = E[e].cost/units
+    # The routes of the first greedy (each commodity pays the edges it activates) are kept if they are better
+    result = greedy_from(E, commodities, type_cooperation, index, fixed_routes, keep_payoffs)
+    if has_minimal_profit(E, commodities, type_cooperation, agents_minimal_profit, result) and (best is None or result['objective'] > best['objective']):
+        best = result
+    return best
+
+
+def greedy_from(E, commodities, type_cooperation, index, fixed_routes, keep_payoffs = False, shares = None, flow_weight = 1):
+    # Routes greedily the commodities which are not in fixed_routes
+    # If keep_payoffs is True, a path is only used if none of the agents earns less with it than without it
+    # shares is the cost per unit of flow of the inactive edges in the models with fixed costs (slope scaling). If it is
+    # None, a commodity is only routed if it pays the whole cost of the edges it activates (flow_weight, see shortest_path)
+    pays_edges = type_cooperation in ('single_agent', 'full_cooperation') # Models where the cost of the used edges is paid
+    if type_cooperation == 'residual_cooperation':
+        capacity = {e:E[e].free_capacity for e in E}
+    else:
+        capacity = {e:E[e].original_capacity for e in E}
+
+    routes = {}
+    active_edges = set()
+    for c, route in fixed_routes.items():
+        routes[c] = set(route)
+        for e in route:
+            capacity[e] -= commodities[c].units
+            active_edges.add(e)
+
+    order = sorted(commodities, key = lambda c: -commodities[c].units*commodities[c].revenue)
+    route_commodities(E, commodities, index, order, routes, capacity, active_edges, pays_edges, keep_payoffs, shares, flow_weight)
+    if pays_edges and shares is not None:
+        remove_unprofitable(E, commodities, routes, capacity, active_edges, fixed_routes)
+        route_commodities(E, commodities, index, order, routes, capacity, active_edges, pays_edges, keep_payoffs)
+
+    revenues = sum(commodities[c].units*commodities[c].revenue for c in routes)
+    result = {'routes':routes, 'active_edges':set(), 'edges_costs':0}
+    if pays_edges:
+        result['active_edges'] = active_edges
+        result['edges_costs'] = sum(E[e].cost for e in active_edges)
+    result['objective'] = revenues - result['edges_costs']
+    return result
+
+
+def route_commodities(E, commodities, index, order, routes, capacity, active_edges, pays_edges, keep_payoffs, shares = None, flow_weight = 1):
+    # Routes the commodities of the order which are not routed yet (updating routes, capacity and active_edges)
+    for c in order:
+        units = commodities[c].units
+        if c in routes or units <= 0:
+            continue
+        path = shortest_path(E, index, c[0], c[1], units, capacity, active_edges if pays_edges else None, shares, flow_weight)
+        if path is None:
+            continue
+        revenue = units*commodities[c].revenue
+        # The commodity has to pay the edges of the other agents with its revenue (for the single agent there are no such edges)
+        if revenue - sum(units*E[e].cost_per_unit for e in path if e[2] != c[2]) < 0:
+            continue
+        if pays_edges and shares is None and revenue - sum(E[e].cost for e in path if e not in active_edges) <= 0:
+            continue
+        if pays_edges and shares is not None and revenue - sum(units*shares[e] for e in path if e not in active_edges) <= 0:
+            continue
+        if keep_payoffs and any(change < 0 for change in payoffs_change(E, commodities, c, path, active_edges if pays_edges else None).values()):
+            continue
+        routes[c] = set(path)
+        for e in path:
+            capacity[e] -= units
+            active_edges.add(e)
+
+
+def remove_unprofitable(E, commodities, routes, capacity, active_edges, fixed_routes):
+    # Removes the commodities which share an active edge while their revenue is smaller than the costs of the edges that
+    # only they use, one group at a time (the one that improves the objective the most), until there is none
+    while True:
+        users = {e:set() for e in active_edges}
+        for c, route in routes.items():
+            for e in route:
+                users[e].add(c)
+        best = None
+        for e in active_edges:
+            group = users[e]
+            if not group or any(c in fixed_routes for c in group):
+                continue
+            saving = sum(E[other].cost for other in active_edges if users[other] <= group) - sum(commodities[c].units*commodities[c].revenue for c in group)
+            if saving > 1e-9 and (best is None or saving > best[0]):
+                best = (saving, group)
+        if best is None:
+            break
+        for c in best[1]:
+            for e in routes.pop(c):
+                capacity[e] += commodities[c].units
+        active_edges.intersection_update(e for route in routes.values() for e in route)
+        active_edges.update(e for route in fixed_routes.values() for e in route)
+
+
+def shortest_path(E, index, origin, terminal, units, capacity, active_edges = None, shares = None, flow_weight = 1):
+    # Dijkstra from the origin to the terminal over the edges with at least units of capacity left. The weight of an edge is
+    # the cost per unit of the flow, plus the cost of the edge if it has to be activated (when active_edges is given).
+    # If shares is given, the flow pays the share of the cost of the edges to activate instead, and the cost per unit of
+    # the flow times flow_weight (with flow_weight = 0, the active edges only have a small weight, so that the shortest
+    # paths are preferred)
+    # Returns the path as a list of edges, or None if there is no path
+    dist = {origin:0}
+    pred = {}
+    heap = [(0, origin)]
+    while heap:
+        d, v = heapq.heappop(heap)
+        if v == terminal:
+            break
+        if d > dist[v]:
+            continue
+        for e in index.out_edges[v]:
+            if capacity[e] < units:
+                continue
+            if shares is not None:
+                w = units*E[e].cost_per_unit*flow_weight + (units*shares[e] if e not in active_edges else 1e-6)
+            else:
+                w = units*E[e].cost_per_unit
+                if active_edges is not None and e not in active_edges:
+                    w += E[e].cost
+            if e[1] not in dist or d + w < dist[e[1]]:
+                dist[e[1]] = d + w
+                pred[e[1]] = e
+                heapq.heappush(heap, (d + w, e[1]))
+    if terminal not in pred:
+        return None
+
+    path = []
+    node = terminal
+    while node != origin:
+        path.append(pred[node])
+        node = pred[node][0]
+    path.reverse()
+    return path
+
+
+def payoffs_change(E, commodities, c, path, active_edges = None):
+    # Change of the payoff of each agent if the commodity c is routed through the path (paying the edges to activate, if active_edges is given)
+    units = commodities[c].units
+    change = {c[2]:units*commodities[c].revenue}
+    for e in path:
+        if e[2] != c[2]:
+            change[c[2]] -= units*E[e].cost_per_unit
+            change[e[2]] = change.get(e[2], 0) + units*E[e].cost_per_unit
+        if active_edges is not None and e not in active_edges:
+            change[e[2]] = change.get(e[2], 0) - E[e].cost
+    return change
+
+
+def has_minimal_profit(E, commodities, type_cooperation, agents_minimal_profit, result):
+    # Checks if every agent earns at least its minimal profit with the routes of the result (as in the cooperation models)
+    if agents_minimal_profit is None:
+        return True
+    payoffs = [0]*len(agents_minimal_profit)
+    for c, route in result['routes'].items():
+        units = commodities[c].units
+        payoffs[c[2]] += units*commodities[c].revenue
+        for e in route:
+            if e[2] != c[2]:
+                payoffs[c[2]] -= units*E[e].cost_per_unit
+                payoffs[e[2]] += units*E[e].cost_per_unit
+    if type_cooperation == 'full_cooperation':
+        for e in result['active_edges']:
+            payoffs[e[2]] -= E[e].cost
+    return all(payoffs[i] >= agents_minimal_profit[i] - 1e-6 for i in range(len(agents_minimal_profit)))
@@ -0,0 +1,98 @@
+'''
+Reading and writing of the instances.
+
+The text instances are parsed in one pass into two integer arrays (one row per commodity and one per edge), which can be
+saved in a binary .npz file next to the text file, so the next time the instance is loaded without parsing.
+
+Columns of the arrays:
+    - commodities: origin, terminal, owner, units, revenue
+    - edges: head, tail, owner, cost, capacity
+'''
+
+from array import array
+import numpy as np
+import os
+
+# Own modules
+import lib.classes as cl
+
+INSTANCES_DIRECTORY = os.path.join(os.path.dirname(__file__),os.pardir,os.pardir,'instances')
+
+
+# -----------------------------------------
+# ---- Paths of the instances
+# -----------------------------------------
+
+def instance_path(instance):
+    # The instance can be a name of a file in the instances folder or a path
+    return os.path.join(INSTANCES_DIRECTORY,instance)
+
+
+def binary_path(path):
+    return path if path.endswith('.npz') else path + '.npz'
+
+
+# -----------------------------------------
+# ---- Text and binary formats
+# -----------------------------------------
+
+def parse_text(path):
+    # Reads the text instance line by line, and returns N, the number of nodes and the arrays of commodities and edges
+    commodities = array('q')
+    edges = array('q')
+    with open(path,'r') as file:
+        N, num_nodes = (int(x) for x in file.readline().split())
+        target = None
+        for line in file:
+            values = line.split()
+            if len(values) == 5: # A row of the current section
+                target.extend(map(int,values))
+            elif values == ['Commodities']:
+                target = commodities
+            elif values == ['Edges']:
+                target = edges
+            # The lines of the 'Agent' sections are not needed, the owner is in each row
+
+    return N, num_nodes, np.frombuffer(commodities,dtype = np.int64).reshape(-1,5), np.frombuffer(edges,dtype = np.int64).reshape(-1,5)
+
+
+def save_binary(path,N,num_nodes,commodities,edges):
+    np.savez(binary_path(path),N = N,num_nodes = num_nodes,commodities = commodities,edges = edges)
+
+
+def load_binary(path):
+    with np.load(binary_path(path)) as data:
+        return int(data['N']), int(data['num_nodes']), data['commodities'], data['edges']
+
+
+def load_arrays(instance):
+    # Loads the binary file of the instance if it exists and the text file doesn't or is not newer, and parses the text file otherwise
+    path = instance_path(instance)
+    if path.endswith('.npz'):
+        return load_binary(path)
+    if os.path.exists(binary_path(path)) and (not os.path.exists(path) or os.path.getmtime(binary_path(path)) >= os.path.getmtime(path)):
+        return load_binary(path)
+    return parse_text(path)
+
+
+def convert(instance):
+    # Writes the binary file of a text instance, and returns its path
+    path = instance_path(instance)
+    save_binary(path,*parse_text(path))
+    return binary_path(path)
+
+
+# -----------------------------------------
+# ---- Objects of the model
+# -----------------------------------------
+
+def build_objects(N,num_nodes,commodities_array,edges_array):
+    # Returns the instance as read_data: N, the set of nodes and the dictionaries of commodities and edges of each agent
+    V = set(range(num_nodes))
+    commodities = {i:{} for i in range(N)}
+    edges = {i:{} for i in range(N)}
+    for origin, terminal, owner, units, revenue in commodities_array.tolist():
+        commodities[owner][(origin,terminal,owner)] = cl.Commodity(origin,terminal,owner,units,revenue)
+    for head, tail, owner, cost, capacity in edges_array.tolist():
+        edges[owner][(head,tail,owner)] = cl.Edge(head,tail,owner,cost,capacity)
+    return N, V, commodities, edges
@@ -0,0 +1,91 @@
+'''
+Times and statistics of the models solved by the mechanisms.
+
+For each model, the time to build it, to solve it and to recover the data of its solution is measured, together with its
+size (variables, constraints, non-zeros and user cuts) and the statistics of the solver (status, gap, nodes). If settings.stats_file
+is set, each model gives one JSON line in that file, which can be converted to CSV with jsonl_to_csv.
+'''
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+# Own modules
+import lib.functions as fn
+
+# Only one thread writes in the file at a time (the processes append whole lines)
+write_lock = threading.Lock()
+
+
+class ModelStats():
+
+    def __init__(self, settings, instance, mechanism, **fields):
+        # fields are other values which identify the model (e.g. the agent or the iteration)
+        self.stats_file = settings.stats_file
+        self.data = {'instance':instance, 'mechanism':mechanism, 'backend':settings.backend, 'cuts':settings.cuts, **fields}
+
+    @property
+    def enabled(self):
+        return self.stats_file is not None
+
+    @contextmanager
+    def measure(self, phase):
+        # Stores the time of the phase ('build', 'solve' or 'recover') as <phase>_time
+        init_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.data[phase + '_time'] = self.data.get(phase + '_time', 0) + time.perf_counter() - init_time
+
+    def add_model(self, mdl):
+        # Size of the model and statistics of its last solve
+        if not self.enabled:
+            return
+        self.data.update(model_size(mdl))
+        if mdl.solution is not None or getattr(mdl,'backend_details',None) is not None:
+            stats = fn.solve_statistics(mdl)
+            self.data.update({'status':stats['status'], 'gap':stats['gap'], 'nodes':stats['nodes']})
+        if getattr(mdl,'subtours_left',False):
+            self.data['status'] = 'time limit with subtours'
+
+    def add_matrix_model(self, mm, result):
+        # Same as add_model, for a MatrixModel (lib/matrix.py) and its result
+        if not self.enabled:
+            return
+        self.data.update(mm.size())
+        if result is not None:
+            self.data.update({'status':result['stats']['status'], 'gap':result['stats']['gap'], 'nodes':result['stats']['nodes']})
+        elif getattr(mm,'subtours_left',False):
+            self.data['status'] = 'time limit with subtours'
+
+    def add_result(self, result):
+        # Statistics of the solver of a result, for the engines which don't leave a model (column generation, Benders)
+        if not self.enabled or result is None:
+            return
+        self.data.update({k:result['stats'][k] for k in ('status','gap','nodes','iterations') if k in result['stats']})
+
+    def add(self, **fields):
+        self.data.update(fields)
+
+    def write(self):
+        if not self.enabled:
+            return
+        line = json.dumps({**self.data, 'pid':os.getpid(), 'timestamp':time.time()}, default = str)
+        with write_lock:
+            with open(self.stats_file, 'a') as file:
+                file.write(line + '\n')
+
+
+def model_size(mdl):
+    # Number of variables, constraints, non-zeros (terms of the linear constraints) and user cuts of a docplex model
+    nonzeros = sum(ct.lhs.number_of_terms() + ct.rhs.number_of_terms() for ct in mdl.iter_linear_constraints())
+    return {'variables':mdl.number_of_variables, 'constraints':mdl.number_of_constraints, 'nonzeros':nonzeros,
+            'user_cuts':mdl.number_of_user_cut_constraints}
+
+
+def jsonl_to_csv(stats_file, csv_file):
+    # Writes the statistics of a JSON lines file as a CSV table (one row per model)
+    import pandas as pd
+    pd.read_json(stats_file, lines = True).to_csv(csv_file, index = False)
@@ -0,0 +1,416 @@
+'''
+Arc formulation of the single agent and cooperation models built directly as a sparse matrix ('matrix' engine).
+
+The models of lib/models.py build each constraint as a docplex expression, term by term, which creates millions of Python
+objects on the instances with 5 agents (mostly for the subtour elimination constraints). Here the edges and commodities
+are numbered, and each family of constraints is generated with NumPy as arrays of (row, column, coefficient) over the grid
+of (edge, commodity) pairs. The rows are given to CPLEX in one call through its matrix API, or written as an LP file in one
+pass for the other backends. The model is the same as the one of lib/models.py (same variables, constraints and objective;
+the lexicographic objective of the single agent model is combined in one weighted objective, as in lib/backends.py), and
+the solution is returned as model_result, with the keys of the edges and commodities.
+
+The flow variable f[e,c] is the column e*num_commodities + c, and the variable u[e] of the models with fixed costs (single
+agent and full cooperation) is the column num_edges*num_commodities + e.
+'''
+
+import time
+import numpy as np
+
+# Own modules
+import lib.models as mdls
+import lib.backends as bk
+import lib.presolve as ps
+import lib.cuts as cts
+
+SENSES = {'L':'<=','G':'>=','E':'='}
+
+
+class MatrixModel():
+
+    def __init__(self, V, E, commodities, type_cooperation):
+        self.V = V
+        self.E = E
+        self.commodities = commodities
+        self.type_cooperation = type_cooperation
+        self.edges = list(E)
+        self.commodity_keys = list(commodities)
+        self.fixed_costs = type_cooperation in ('single_agent','full_cooperation')
+        self.num_flows = len(self.edges)*len(self.commodity_keys)
+        self.num_columns = self.num_flows + (len(self.edges) if self.fixed_costs else 0)
+        self.blocks = [] # (rows, columns, coefficients, rhs, senses) of each family of constraints
+        self.num_rows = 0
+        self.cut_blocks = [] # Same for the user cuts (see lib/cuts.py), with their own row numbers
+        self.num_cut_rows = 0
+        self.lazy_subtours = False
+
+    def add_rows(self, rows, columns, coefficients, rhs, sense, user_cuts = False):
+        # rows are numbered from 0 in the block, rhs has one value per row
+        rhs = np.asarray(rhs, dtype = float)
+        first_row = self.num_cut_rows if user_cuts else self.num_rows
+        block = (np.asarray(rows, dtype = np.int64) + first_row, np.asarray(columns, dtype = np.int64),
+                 np.asarray(coefficients, dtype = float), rhs, sense*len(rhs))
+        if user_cuts:
+            self.cut_blocks.append(block)
+            self.num_cut_rows += len(rhs)
+        else:
+            self.blocks.append(block)
+            self.num_rows += len(rhs)
+
+    def csr(self, first_block = 0, user_cuts = False):
+        # Rows of the blocks from first_block (of the user cuts if user_cuts) in CSR format (duplicated entries added,
+        # zeros removed), with their rhs and senses
+        blocks = (self.cut_blocks if user_cuts else self.blocks)[first_block:]
+        last_row = self.num_cut_rows if user_cuts else self.num_rows
+        first_row = last_row - sum(len(block[3]) for block in blocks)
+        num_rows = last_row - first_row
+        if not blocks:
+            return np.zeros(1, dtype = np.int64), np.zeros(0, dtype = np.int64), np.zeros(0), np.zeros(0), ''
+        keys = np.concatenate([(block[0] - first_row)*self.num_columns + block[1] for block in blocks])
+        order = np.argsort(keys, kind = 'stable')
+        keys = keys[order]
+        coefficients = np.concatenate([block[2] for block in blocks])[order]
+        del order
+        if len(keys):
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(keys)) + 1))
+            keys, data = keys[starts], np.add.reduceat(coefficients, starts)
+        else:
+            data = coefficients
+        keep = data != 0
+        keys, data = keys[keep], data[keep]
+        indptr = np.searchsorted(keys // self.num_columns, np.arange(num_rows + 1))
+        rhs = np.concatenate([block[3] for block in blocks])
+        senses = ''.join(block[4] for block in blocks)
+        return indptr, keys % self.num_columns, data, rhs, senses
+
+    def size(self):
+        return {'variables':self.num_columns, 'constraints':self.num_rows, 'nonzeros':int(sum(len(block[2]) for block in self.blocks)),
+                'user_cuts':self.num_cut_rows}
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------------- BUILD ---------------------------------------
+# -----------------------------------------------------------------------------------
+
+def build_matrix_model(V, E, commodities, type_cooperation, agents_minimal_profit = None, lazy_subtours = False, index = None, presolve = True, cuts = 'none'):
+    # Same arguments as build_cooperation_model, with type_cooperation = 'single_agent' for the model of build_single_agent_model
+    if presolve:
+        E, commodities, index = ps.presolve(E, commodities, type_cooperation, agents_minimal_profit, index)
+    mm = MatrixModel(V, E, commodities, type_cooperation)
+    mm.lazy_subtours = lazy_subtours
+
+    # --- data of the edges and commodities, and grid of (edge, commodity) pairs ---
+    edges = np.array(mm.edges, dtype = np.int64).reshape(-1,3)
+    keys = np.array(mm.commodity_keys, dtype = np.int64).reshape(-1,3)
+    num_edges, num_commodities = len(edges), len(keys)
+    head, tail, owner = edges[:,0], edges[:,1], edges[:,2]
+    origin, terminal, commodity_owner = keys[:,0], keys[:,1], keys[:,2]
+    capacity = np.array([E[e].free_capacity if type_cooperation == 'residual_cooperation' else E[e].original_capacity for e in mm.edges], dtype = float)
+    cost = np.array([E[e].cost for e in mm.edges], dtype = float)
+    cost_per_unit = np.array([E[e].cost_per_unit for e in mm.edges], dtype = float)
+    units = np.array([commodities[c].units for c in mm.commodity_keys], dtype = float)
+    revenue = np.array([commodities[c].revenue for c in mm.commodity_keys], dtype = float)
+
+    e_grid = np.repeat(np.arange(num_edges), num_commodities)
+    c_grid = np.tile(np.arange(num_commodities), num_edges)
+    f = e_grid*num_commodities + c_grid # Column of f[e,c]
+    u = mm.num_flows + np.arange(num_edges) # Column of u[e]
+
+    nodes = sorted(V)
+    position = {v:p for p, v in enumerate(nodes)}
+    node = np.vectorize(position.get, otypes = [np.int64])
+    head_p, tail_p = (node(head), node(tail)) if num_edges else (head, tail)
+    origin_p, terminal_p = (node(origin), node(terminal)) if num_commodities else (origin, terminal)
+
+    # --- First constraints: flow over transit nodes (in - out = 0) for each commodity and node different from its origin and terminal ---
+    transit = np.ones((num_commodities, len(nodes)), dtype = bool)
+    transit[np.arange(num_commodities), origin_p] = False
+    transit[np.arange(num_commodities), terminal_p] = False
+    row_of = np.cumsum(transit.ravel()).reshape(transit.shape) - 1
+    in_term = transit[c_grid, tail_p[e_grid]]
+    out_term = transit[c_grid, head_p[e_grid]]
+    mm.add_rows(np.concatenate((row_of[c_grid[in_term], tail_p[e_grid[in_term]]], row_of[c_grid[out_term], head_p[e_grid[out_term]]])),
+                np.concatenate((f[in_term], f[out_term])), np.concatenate((np.ones(in_term.sum()), -np.ones(out_term.sum()))),
+                np.zeros(transit.sum()), 'E')
+
+    # --- Second constraint: flow from the origin at most 1, third constraint: no flow from the terminal ---
+    from_origin = head[e_grid] == origin[c_grid]
+    mm.add_rows(c_grid[from_origin], f[from_origin], np.ones(from_origin.sum()), np.ones(num_commodities), 'L')
+    from_terminal = head[e_grid] == terminal[c_grid]
+    mm.add_rows(c_grid[from_terminal], f[from_terminal], np.ones(from_terminal.sum()), np.zeros(num_commodities), 'E')
+
+    # --- Fourth constraint: capacity of the edges (times u[e] in the models with fixed costs) ---
+    if mm.fixed_costs:
+        mm.add_rows(np.concatenate((e_grid, np.arange(num_edges))), np.concatenate((f, u)), np.concatenate((units[c_grid], -capacity)),
+                    np.zeros(num_edges), 'L')
+    else:
+        mm.add_rows(e_grid, f, units[c_grid], capacity, 'L')
+    if cuts != 'none':
+        add_capacity_cuts(mm, f, u, capacity, units, cuts)
+
+    # --- Subtour elimination constraints ---
+    if not lazy_subtours:
+        node_bit = 1 << np.arange(len(nodes), dtype = np.int64)
+        head_bit, tail_bit = node_bit[head_p], node_bit[tail_p]
+        rows, columns, rhs = [], [], []
+        for S in mdls.powerset(range(len(nodes)),2):
+            mask = int(node_bit[list(S)].sum())
+            inside = np.nonzero((head_bit & mask != 0) & (tail_bit & mask != 0))[0]
+            rows.append(np.tile(np.arange(num_commodities), len(inside)) + len(rhs)*num_commodities)
+            columns.append((inside[:,None]*num_commodities + np.arange(num_commodities)).ravel())
+            rhs.append(len(S) - 1)
+        if rhs:
+            mm.add_rows(np.concatenate(rows), np.concatenate(columns), np.ones(sum(len(r) for r in rows)), np.repeat(rhs, num_commodities), 'L')
+
+    into_terminal = tail[e_grid] == terminal[c_grid]
+    foreign = owner[e_grid] != commodity_owner[c_grid]
+    if type_cooperation != 'single_agent':
+        # Each served commodity earns at least what it pays for the edges of the other agents
+        mm.add_rows(np.concatenate((c_grid[into_terminal], c_grid[foreign])), np.concatenate((f[into_terminal], f[foreign])),
+                    np.concatenate(((units*revenue)[c_grid[into_terminal]], -(units[c_grid]*cost_per_unit[e_grid])[foreign])),
+                    np.zeros(num_commodities), 'G')
+
+    if type_cooperation in ('partial_cooperation','full_cooperation') and agents_minimal_profit:
+        # Every agent earns at least its minimal profit: revenues of its commodities, minus the payments for the edges of the
+        # other agents, plus the payments received for its edges (minus the costs of its edges in full cooperation)
+        num_agents = len(agents_minimal_profit)
+        payment = units[c_grid]*cost_per_unit[e_grid]
+        own_revenue = from_origin & (commodity_owner[c_grid] < num_agents)
+        paid = foreign & (commodity_owner[c_grid] < num_agents)
+        received = foreign & (owner[e_grid] < num_agents)
+        rows = [commodity_owner[c_grid[own_revenue]], commodity_owner[c_grid[paid]], owner[e_grid[received]]]
+        columns = [f[own_revenue], f[paid], f[received]]
+        coefficients = [(units*revenue)[c_grid[own_revenue]], -payment[paid], payment[received]]
+        if type_cooperation == 'full_cooperation':
+            own_edge = owner < num_agents
+            rows.append(owner[own_edge])
+            columns.append(u[own_edge])
+            coefficients.append(-cost[own_edge])
+        mm.add_rows(np.concatenate(rows), np.concatenate(columns), np.concatenate(coefficients), agents_minimal_profit, 'G')
+
+    # --- Objective: revenue of the served commodities (minus the costs of the edges) ---
+    mm.objective = np.zeros(mm.num_columns)
+    np.add.at(mm.objective, f[into_terminal], (units*revenue)[c_grid[into_terminal]])
+    if mm.fixed_costs:
+        mm.objective[u] = -cost
+    mm.primary_objective = mm.objective.copy()
+    if type_cooperation == 'single_agent':
+        # Lexicographic objective: profit, then free capacity (minus the units routed on the edges)
+        used = units[c_grid]
+        mm.objective = mm.objective*(used.sum() + 1)
+        mm.objective[f] -= used
+    return mm
+
+
+def add_capacity_cuts(mm, f, u, capacity, units, cuts):
+    # f[e,c] <= u[e] (models with fixed costs) and the cover inequalities of the capacity constraints (see lib/cuts.py),
+    # as rows of the model (cuts = 'static') or user cuts ('pool')
+    if cuts not in ('static','pool'):
+        raise ValueError('Unknown cuts %s' %(cuts))
+    user_cuts = cuts == 'pool'
+    num_commodities = len(mm.commodity_keys)
+    if mm.fixed_costs:
+        rows = np.arange(mm.num_flows)
+        mm.add_rows(np.concatenate((rows, rows)), np.concatenate((f, u.repeat(num_commodities))),
+                    np.concatenate((np.ones(mm.num_flows), -np.ones(mm.num_flows))), np.zeros(mm.num_flows), 'L', user_cuts)
+
+    rows, columns, coefficients, rhs = [], [], [], []
+    by_capacity = {}
+    for e, value in enumerate(capacity.tolist()):
+        if value not in by_capacity:
+            by_capacity[value] = cts.capacity_covers(dict(enumerate(units.tolist())), value)
+        for cover, cover_rhs in by_capacity[value]:
+            rows += [len(rhs)]*len(cover)
+            columns += [e*num_commodities + c for c in cover]
+            coefficients += [1]*len(cover)
+            if mm.fixed_costs:
+                rows.append(len(rhs))
+                columns.append(u[e])
+                coefficients.append(-cover_rhs)
+            rhs.append(0 if mm.fixed_costs else cover_rhs)
+    if rhs:
+        mm.add_rows(rows, columns, coefficients, rhs, 'L', user_cuts)
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------------- SOLVE ---------------------------------------
+# -----------------------------------------------------------------------------------
+
+def solve_matrix_model(mm, time_limit = None, threads = 0, backend = 'cplex', mip_start = None):
+    # Solves the model (with the lazy subtour elimination constraints if it was built with them), and returns its result
+    # as model_result (None if no solution was found). mip_start is a result whose routes are given as MIP start (CPLEX only)
+    # As in solve_model, if there is no time left while the last solution still has cycles, None is returned and
+    # mm.subtours_left is set
+    init_time = time.time()
+    cpx = None
+    first_block = 0
+    values = None
+    mm.subtours_left = False
+    while True:
+        remaining_time = None if time_limit is None else time_limit - (time.time() - init_time)
+        if remaining_time is not None and remaining_time <= 0:
+            mm.subtours_left = values is not None
+            return None
+        if backend == 'cplex':
+            if cpx is None:
+                cpx = cplex_model(mm, mip_start)
+            else:
+                add_cplex_rows(cpx, mm, first_block)
+            values, details = solve_cplex(cpx, remaining_time, threads)
+        else:
+            values, details = solve_open_source(mm, backend, remaining_time, threads)
+        if values is None:
+            return None
+
+        routes = {}
+        for column in np.nonzero(values[:mm.num_flows] > 0.9)[0]:
+            e, c = divmod(int(column), len(mm.commodity_keys))
+            routes.setdefault(mm.commodity_keys[c],set()).add(mm.edges[e])
+
+        first_block = len(mm.blocks)
+        if not mm.lazy_subtours or not add_subtour_cuts(mm, routes):
+            break
+
+    result = {'objective':float(mm.primary_objective @ np.round(values)), 'routes':routes, 'active_edges':set(), 'edges_costs':0, 'stats':details}
+    if mm.fixed_costs:
+        active = np.nonzero(values[mm.num_flows:] > 0.9)[0]
+        result['active_edges'] = {mm.edges[e] for e in active}
+        result['edges_costs'] = sum(mm.E[mm.edges[e]].cost for e in active)
+    return result
+
+
+def solve_matrix_relaxation(mm, time_limit = None, threads = 0, backend = 'cplex'):
+    # Value of the linear relaxation of the model (an upper bound of its first objective), or None if it wasn't solved
+    # The subtour elimination constraints of a model built with lazy_subtours are not in the relaxation (it is still a bound)
+    if backend == 'cplex':
+        cpx = cplex_model(mm, relaxation = True)
+        if time_limit is not None:
+            cpx.parameters.timelimit.set(time_limit)
+        if threads:
+            cpx.parameters.threads.set(threads)
+        cpx.solve()
+        if cpx.solution.get_status() != cpx.solution.status.optimal:
+            return None
+        return cpx.solution.get_objective_value()
+    values, details = solve_open_source(mm, backend, time_limit, threads, relaxation = True)
+    return None if values is None else float(mm.primary_objective @ values)
+
+
+def add_subtour_cuts(mm, routes):
+    # Adds the subtour elimination constraints violated by the routes, and returns whether there was any
+    c_position = {c:p for p, c in enumerate(mm.commodity_keys)}
+    e_position = {e:p for p, e in enumerate(mm.edges)}
+    rows, columns, rhs = [], [], []
+    for c, route in routes.items():
+        for S in mdls.cyclic_components(route):
+            inside = [e_position[e] for e in mm.edges if e[0] in S and e[1] in S]
+            rows += [len(rhs)]*len(inside)
+            columns += [e*len(mm.commodity_keys) + c_position[c] for e in inside]
+            rhs.append(len(S) - 1)
+    if rhs:
+        mm.add_rows(rows, columns, np.ones(len(rows)), rhs, 'L')
+    return bool(rhs)
+
+
+def cplex_model(mm, mip_start = None, relaxation = False):
+    # With relaxation, the linear relaxation of the model, with the first objective (see solve_matrix_relaxation)
+    import cplex
+    cpx = cplex.Cplex()
+    for stream in (cpx.set_log_stream, cpx.set_error_stream, cpx.set_warning_stream, cpx.set_results_stream):
+        stream(None)
+    cpx.objective.set_sense(cpx.objective.sense.maximize)
+    if relaxation:
+        cpx.variables.add(obj = mm.primary_objective.tolist(), ub = [1.0]*mm.num_columns)
+    else:
+        cpx.variables.add(obj = mm.objective.tolist(), types = cpx.variables.type.binary*mm.num_columns)
+    add_cplex_rows(cpx, mm)
+    if not relaxation: # The user cuts are only used in the MIP, the relaxation is a bound without them
+        add_cplex_rows(cpx, mm, user_cuts = True)
+    if mip_start is not None:
+        c_position = {c:p for p, c in enumerate(mm.commodity_keys)}
+        e_position = {e:p for p, e in enumerate(mm.edges)}
+        # The routes with edges or commodities removed by the presolve are not part of the start
+        columns = [e_position[e]*len(mm.commodity_keys) + c_position[c] for c, route in mip_start['routes'].items()
+                   if c in c_position and all(e in e_position for e in route) for e in route]
+        if mm.fixed_costs:
+            columns += [mm.num_flows + e_position[e] for e in mip_start['active_edges'] if e in e_position]
+        if columns:
+            cpx.MIP_starts.add(cplex.SparsePair(ind = columns, val = [1.0]*len(columns)), cpx.MIP_starts.effort_level.auto)
+    return cpx
+
+
+def add_cplex_rows(cpx, mm, first_block = 0, batch_nonzeros = 200000, user_cuts = False):
+    # The rows of the blocks from first_block (the user cuts if user_cuts), in calls of about batch_nonzeros non-zeros (so
+    # the Python lists given to CPLEX are never much larger than that)
+    import cplex
+    indptr, indices, data, rhs, senses = mm.csr(first_block, user_cuts)
+    add = cpx.linear_constraints.advanced.add_user_cuts if user_cuts else cpx.linear_constraints.add
+    first = 0
+    while first < len(rhs):
+        last = max(first + 1, int(np.searchsorted(indptr, indptr[first] + batch_nonzeros, side = 'right')) - 1)
+        last = min(last, len(rhs))
+        offset = indptr[first]
+        starts = (indptr[first:last+1] - offset).tolist()
+        batch_indices = indices[offset:indptr[last]].tolist()
+        batch_data = data[offset:indptr[last]].tolist()
+        add(lin_expr = [cplex.SparsePair(batch_indices[starts[r]:starts[r+1]], batch_data[starts[r]:starts[r+1]]) for r in range(last - first)],
+                                   senses = senses[first:last], rhs = rhs[first:last].tolist())
+        first = last
+
+
+def solve_cplex(cpx, time_limit, threads):
+    if time_limit is not None:
+        cpx.parameters.timelimit.set(time_limit)
+    if threads:
+        cpx.parameters.threads.set(threads)
+    init_time = time.time()
+    cpx.solve()
+    solution = cpx.solution
+    details = {'status':solution.get_status_string(), 'solve_time':time.time() - init_time, 'gap':None,
+               'nodes':solution.progress.get_num_nodes_processed()}
+    if solution.get_solution_type() == solution.type.none:
+        return None, details
+    if cpx.get_problem_type() == cpx.problem_type.MILP: # A model without columns (everything removed by the presolve) is an LP
+        details['gap'] = solution.MIP.get_mip_relative_gap()
+    return np.array(solution.get_values()), details
+
+
+def solve_open_source(mm, backend, time_limit, threads, relaxation = False):
+    solvers = {'highs':bk.solve_highs, 'cbc':bk.solve_cbc, 'cpsat':bk.solve_cpsat}
+    if backend not in solvers:
+        raise ValueError('Unknown backend %s' %(backend))
+    init_time = time.time()
+    values, details = solvers[backend](lp_string(mm, relaxation = relaxation), time_limit, threads)
+    details['solve_time'] = time.time() - init_time
+    if values is None:
+        return None, details
+    array = np.zeros(mm.num_columns)
+    for name, value in values.items():
+        array[int(name[1:]) - 1] = value
+    return array, details
+
+
+def lp_string(mm, terms_per_line = 20, relaxation = False):
+    # LP format of the model, written in one pass. The column j is the variable x(j+1), as in the files of lib/backends.py
+    # With relaxation, the variables are continuous in [0,1] and the objective is the first one
+    def expression(terms, start, end):
+        if start == end:
+            return '0 x1'
+        return '\n    '.join(' '.join(terms[i:min(i + terms_per_line, end)]) for i in range(start, end, terms_per_line))
+
+    # The user cuts are valid inequalities, so they are written as constraints
+    rows = [mm.csr(), mm.csr(user_cuts = True)]
+    indptr = np.concatenate((rows[0][0], rows[1][0][1:] + rows[0][0][-1]))
+    indices, data, rhs = (np.concatenate((rows[0][k], rows[1][k])) for k in (1, 2, 3))
+    senses = rows[0][4] + rows[1][4]
+    terms = ['%+.17g x%d' %(coefficient, column) for coefficient, column in zip(data.tolist(), (indices + 1).tolist())]
+    objective_coefficients = mm.primary_objective if relaxation else mm.objective
+    objective = np.nonzero(objective_coefficients)[0]
+    objective_terms = ['%+.17g x%d' %(coefficient, column) for coefficient, column in zip(objective_coefficients[objective].tolist(), (objective + 1).tolist())]
+    indptr = indptr.tolist()
+    lines = ['Maximize', ' obj: ' + expression(objective_terms, 0, len(objective_terms)), 'Subject To']
+    lines += [' c%d: %s %s %.17g' %(r + 1, expression(terms, indptr[r], indptr[r+1]), SENSES[sense], value)
+              for r, (sense, value) in enumerate(zip(senses, rhs.tolist()))]
+    lines.append('Bounds' if relaxation else 'Binaries')
+    lines += [(' 0 <= x%d <= 1' if relaxation else ' x%d') %(j + 1) for j in range(mm.num_columns)]
+    lines.append('End')
+    return '\n'.join(lines) + '\n'
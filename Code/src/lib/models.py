@@ -1,5 +1,12 @@
 from docplex.mp.model import Model # For modeling the LP problem and solving it with CPLEX
 import itertools as it
+import time
+
+# Own modules
+import lib.classes as cl
+import lib.backends as bk
+import lib.presolve as ps
+import lib.cuts as cts
 
 
 # -----------------------------------------------------------------------------------
@@ -10,8 +17,15 @@ import itertools as it
 # MODEL SINGLE AGENT
 # ---------------------------
 
-def build_single_agent_model(V, E, commodities, **kwargs):
+def build_single_agent_model(V, E, commodities, lazy_subtours = False, index = None, presolve = True, cuts = 'none', **kwargs):
     # Takes as input the nodes, V, the edges, E, q the capacity of the edges, r the revenue per unit of commoditie, c the cost of each edge and the commodities between pairs of nodes
+    # index is the GraphIndex with the in-edges and out-edges of each node in E. If it is not given, it is built here
+    # With presolve, the commodities and edges which can't have flow are not in the model (see lib/presolve.py)
+    # cuts is how the linking and cover inequalities of the capacity constraints are added: 'none', 'static' or 'pool' (see lib/cuts.py)
+    if presolve:
+        E, commodities, index = ps.presolve(E, commodities, 'single_agent', index = index)
+    if index is None:
+        index = cl.GraphIndex(E)
     mdl = Model('Single agent', **kwargs)
 
     # --- decision variables ---
@@ -19,14 +33,15 @@ def build_single_agent_model(V, E, commodities, **kwargs):
     mdl.u = mdl.binary_var_dict(E,name = 'u') # Binary variable which would indicate if an edge is used or not.
 
     # --- constraints ---
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[1] == z) == mdl.sum(mdl.f[e,c] for e in E if e[0] == z) for c in commodities for z in V if z!=c[0] and z!=c[1]) # First constraints: Flow over transit nodes
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[0] == c[0]) <= 1 for c in commodities) # Second constraint: Flow from source can only be one at max   (*)
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[0] == c[1]) == 0 for c in commodities) # Third constraint: Commodities dont flow from terminal to other nodes
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.in_edges[z]) == mdl.sum(mdl.f[e,c] for e in index.out_edges[z]) for c in commodities for z in V if z!=c[0] and z!=c[1]) # First constraints: Flow over transit nodes
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.out_edges[c[0]]) <= 1 for c in commodities) # Second constraint: Flow from source can only be one at max   (*)
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.out_edges[c[1]]) == 0 for c in commodities) # Third constraint: Commodities dont flow from terminal to other nodes
     mdl.add_constraints(mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= (E[e].original_capacity * mdl.u[e]) for e in E) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[0] in S and e[1] in S) <= len(S) -1 for S in powerset(V,2) for c in commodities) # Subtour elimination constraints
+    add_capacity_cuts(mdl, E, commodities, {e:E[e].original_capacity for e in E}, cuts) # Linking and cover inequalities
+    add_subtour_constraints(mdl, V, E, commodities, index, lazy_subtours) # Subtour elimination constraints
 
     # --- objective ---
-    mdl.commodities_revenues = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*commodities[c].revenue for e in E if e[1] == c[1]) for c in commodities)
+    mdl.commodities_revenues = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*commodities[c].revenue for e in index.in_edges[c[1]]) for c in commodities)
     mdl.add_kpi(mdl.commodities_revenues, "Demands revenue")
     mdl.edges_costs = mdl.sum(mdl.u[e]*E[e].cost for e in E)
     mdl.add_kpi(mdl.edges_costs, "Edges costs")
@@ -44,10 +59,16 @@ def build_single_agent_model(V, E, commodities, **kwargs):
 #  MODEL COOPERATION
 # ---------------------------
 
-def build_cooperation_model(V, E, commodities, type_cooperation, agents_minimal_profit = None,**kwargs):
+def build_cooperation_model(V, E, commodities, type_cooperation, agents_minimal_profit = None, lazy_subtours = False, index = None, presolve = True, cuts = 'none', **kwargs):
     # Takes as input the the nodes, V, the edges, E, that are tuples (v,w,i) and have some capacity and a cost, the commodities between pairs of nodes (which also are tuples (v,w,i) where i is is owner)
     # the type of cooperation want to be used, and which is the minimal payoff each agent should obtain.
     # In the case type_cooperation if residual_cooperation, the agents_minimal_rofit doesnt need to be specified
+    # With presolve, the commodities and edges which can't have flow are not in the model (see lib/presolve.py)
+    # cuts is how the linking and cover inequalities of the capacity constraints are added: 'none', 'static' or 'pool' (see lib/cuts.py)
+    if presolve:
+        E, commodities, index = ps.presolve(E, commodities, type_cooperation, agents_minimal_profit, index)
+    if index is None:
+        index = cl.GraphIndex(E)
 
     mdl = Model(type_cooperation, **kwargs)
 
@@ -58,9 +79,9 @@ def build_cooperation_model(V, E, commodities, type_cooperation, agents_minimal_
 
 
     # --- constraints ---
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[1] == z) == mdl.sum(mdl.f[e,c] for e in E if e[0]==z) for c in commodities for z in V if z!=c[0] and z!=c[1]) # First constraints: Flow over transit nodes
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[0] == c[0]) <= 1 for c in commodities) # Second constraint: Flow from source can only be one at max   (*)
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[0] == c[1]) == 0 for c in commodities) # Third constraint: Commodities dont flow from terminal to other nodes
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.in_edges[z]) == mdl.sum(mdl.f[e,c] for e in index.out_edges[z]) for c in commodities for z in V if z!=c[0] and z!=c[1]) # First constraints: Flow over transit nodes
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.out_edges[c[0]]) <= 1 for c in commodities) # Second constraint: Flow from source can only be one at max   (*)
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.out_edges[c[1]]) == 0 for c in commodities) # Third constraint: Commodities dont flow from terminal to other nodes
     
     if type_cooperation == 'residual_cooperation':
         mdl.add_constraints(mdl.sum(mdl.f[e,c] * commodities[c].units for c in commodities) <= E[e].free_capacity for e in E) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity
@@ -68,23 +89,24 @@ def build_cooperation_model(V, E, commodities, type_cooperation, agents_minimal_
         mdl.add_constraints(mdl.sum(mdl.f[e,c] * commodities[c].units for c in commodities) <= E[e].original_capacity for e in E) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity
     elif type_cooperation == 'full_cooperation':
         mdl.add_constraints(mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= (E[e].original_capacity * mdl.u[e]) for e in E) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity
-    
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in E if e[0] in S and e[1] in S) <= len(S) -1 for S in powerset(V,2) for c in commodities) # Subtour elimination constraints
+    add_capacity_cuts(mdl, E, commodities, {e:(E[e].free_capacity if type_cooperation == 'residual_cooperation' else E[e].original_capacity) for e in E}, cuts) # Linking and cover inequalities
 
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in E if e[1] == c[1]) - mdl.sum(mdl.f[e,c] * commodities[c].units * E[e].cost/E[e].original_capacity for e in E if e[2]!=c[2]) >= 0 for c in commodities)
+    add_subtour_constraints(mdl, V, E, commodities, index, lazy_subtours) # Subtour elimination constraints
+
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in index.in_edges[c[1]]) - mdl.sum(mdl.f[e,c] * commodities[c].units * E[e].cost_per_unit for e in E if e[2]!=c[2]) >= 0 for c in commodities)
     
     if type_cooperation == 'partial_cooperation':
-        mdl.add_constraints(mdl.sum(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in E if e[0] == c[0]) - mdl.sum(mdl.f[e,c] * commodities[c].units * (E[e].cost/E[e].original_capacity) for e in E if e[2] != i) for c in commodities if c[2] == i) + mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*(E[e].cost/E[e].original_capacity) for e in E if e[2] == i) for c in commodities if c[2]!= i) >= agents_minimal_profit[i] for i in range(len(agents_minimal_profit))) # Every agent has to earn at least as much as he will win without cooperation
+        mdl.add_constraints(mdl.sum(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in index.out_edges[c[0]]) - mdl.sum(mdl.f[e,c] * commodities[c].units * E[e].cost_per_unit for e in E if e[2] != i) for c in commodities if c[2] == i) + mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*E[e].cost_per_unit for e in E if e[2] == i) for c in commodities if c[2]!= i) >= agents_minimal_profit[i] for i in range(len(agents_minimal_profit))) # Every agent has to earn at least as much as he will win without cooperation
     elif type_cooperation == 'full_cooperation':
-        mdl.add_constraints(mdl.sum(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in E if e[0] == c[0]) - mdl.sum(mdl.f[e,c] * commodities[c].units * (E[e].cost/E[e].original_capacity) for e in E if e[2] != i) for c in commodities if c[2] == i) + mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*(E[e].cost/E[e].original_capacity) for e in E if e[2] == i) for c in commodities if c[2]!= i) - mdl.sum(mdl.u[e]*E[e].cost for e in E if e[2] == i) >= agents_minimal_profit[i] for i in range(len(agents_minimal_profit))) # Every agent has to earn at least as much as he will win without cooperation
+        mdl.add_constraints(mdl.sum(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in index.out_edges[c[0]]) - mdl.sum(mdl.f[e,c] * commodities[c].units * E[e].cost_per_unit for e in E if e[2] != i) for c in commodities if c[2] == i) + mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*E[e].cost_per_unit for e in E if e[2] == i) for c in commodities if c[2]!= i) - mdl.sum(mdl.u[e]*E[e].cost for e in E if e[2] == i) >= agents_minimal_profit[i] for i in range(len(agents_minimal_profit))) # Every agent has to earn at least as much as he will win without cooperation
 
     # --- objective ---
     if type_cooperation == 'residual_cooperation' or type_cooperation == 'partial_cooperation':
-        mdl.revenues = mdl.sum(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in E if e[1] == c[1])  for c in commodities)
+        mdl.revenues = mdl.sum(mdl.sum(mdl.f[e,c] * commodities[c].units * commodities[c].revenue for e in index.in_edges[c[1]])  for c in commodities)
         mdl.add_kpi(mdl.revenues, "commodities revenue")
         mdl.maximize(mdl.revenues)
     elif type_cooperation == 'full_cooperation':
-        mdl.commodities_revenues = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*commodities[c].revenue for e in E if e[1] == c[1]) for c in commodities)
+        mdl.commodities_revenues = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*commodities[c].revenue for e in index.in_edges[c[1]]) for c in commodities)
         mdl.add_kpi(mdl.commodities_revenues, "commodities revenue")
         mdl.edges_costs = mdl.sum(mdl.u[e]*E[e].cost for e in E)
         mdl.add_kpi(mdl.edges_costs, "Edges costs")
@@ -99,63 +121,228 @@ def build_cooperation_model(V, E, commodities, type_cooperation, agents_minimal_
 # ------------------------- MODEL FOR ITERATIVE MECHANISM ---------------------------
 # -----------------------------------------------------------------------------------
 
-def build_iterative_model(V, agent, info_platform,  **kwargs):
-    
+def build_iterative_model(V, agent, info_platform, lazy_subtours = False, other_edges = None, **kwargs):
+    # The model is built once and then updated in place on each round with update_iterative_model, since between rounds only
+    # the shared edges, the capacities of the conditioned edges and the payment conditions change.
+    # other_edges are all the edges the other agents could share: flow variables are created for all of them, and the ones which
+    # are not shared in the current round are fixed to 0. If it is not given, only the edges currently shared are used.
+
     # ORGANIZING INPUT DATA
-    if agent.id == 0:
-        other_agent_id = 1
-    else:
-        other_agent_id = 0
     E = agent.edges
     commodities = agent.commodities
-    L = info_platform.shared_edges[other_agent_id]
-    conditioned_edges = info_platform.demanded_edges[other_agent_id]
-    edges_condition_relations = info_platform.demanded_edges_conditions[other_agent_id]
+    if other_edges is None:
+        other_edges = info_platform.shared_edges_for(agent)
+    EO = {**E,**other_edges} # Own edges and edges which the other agents can share
+    index = agent.index.extended(other_edges)
     
     # Takes as input the nodes, V, the edges, E, q the capacity of the edges, r the revenue per unit of commoditie, c the cost of each edge and the commodities between pairs of nodes
     mdl = Model('Iterative model', **kwargs)
+    mdl.agent = agent
+    mdl.other_edges = other_edges
 
     # --- decision variables ---
-    mdl.f = mdl.binary_var_dict([(edge,commodity) for edge in {**E,**L} for commodity in commodities],name = 'f') # Binary variable indicating if a commodity is routed in some edge
+    mdl.f = mdl.binary_var_dict([(edge,commodity) for edge in EO for commodity in commodities],name = 'f') # Binary variable indicating if a commodity is routed in some edge
     mdl.u = mdl.binary_var_dict(E, name = 'u') # Binary variable which would indicate if an edge is used or not.
-    if conditioned_edges:
-        mdl.b = mdl.binary_var_dict(conditioned_edges, name = 'b')
+    mdl.b = mdl.binary_var_dict(E, name = 'b') # Binary variable indicating if the agent accepts the capacity demanded by the other agent on the edge (fixed to 0 if the edge is not conditioned)
+    mdl.z = [] # Binary variables indicating if the payment of each condition is received (the unused ones are fixed to 0)
 
     # --- constraints ---
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in {**E,**L} if e[1] == z) == mdl.sum(mdl.f[e,c] for e in {**E,**L} if e[0] == z) for c in commodities for z in V if z!=c[0] and z!=c[1]) # First constraints: Flow over transit nodes
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in {**E,**L} if e[0] == c[0]) <= 1 for c in commodities) # Second constraint: Flow from source can only be one at max   (*)
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in {**E,**L} if e[0] == c[1]) == 0 for c in commodities) # Third constraint: Commodities dont flow from terminal to other nodes
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.in_edges[z]) == mdl.sum(mdl.f[e,c] for e in index.out_edges[z]) for c in commodities for z in V if z!=c[0] and z!=c[1]) # First constraints: Flow over transit nodes
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.out_edges[c[0]]) <= 1 for c in commodities) # Second constraint: Flow from source can only be one at max   (*)
+    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in index.out_edges[c[1]]) == 0 for c in commodities) # Third constraint: Commodities dont flow from terminal to other nodes
     mdl.add_constraints(mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= (E[e].original_capacity * mdl.u[e]) for e in E) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity
-    
-    if conditioned_edges: # If b_e is equal to 1, the, the current agent cannt route more flow through the edge e than its original capacity - the capacity demanded by the other agent, for e an edge used for the other agent
-            mdl.add_indicator_constraints(mdl.indicator_constraint(mdl.b[e],mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= E[e].original_capacity - conditioned_edges[e]) for e in conditioned_edges) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity) 
-            mdl.add_constraints(mdl.b[e] <= mdl.u[e] for e in conditioned_edges)
-    if L:
-        mdl.add_constraints(mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= L[e].free_capacity for e in L) # Fourth constraint: The sum of commodities on an edge can't exceed its capacity
-    
-    mdl.add_constraints(mdl.sum(mdl.f[e,c] for e in {**E,**L} if e[0] in S and e[1] in S) <= len(S) -1 for S in powerset(V,2) for c in commodities) # Subtour elimination constraints
+    mdl.add_constraints(mdl.b[e] <= mdl.u[e] for e in E)
+    # Fourth constraint for the shared edges, the right hand side is the free capacity of the edge in the current round
+    mdl.shared_capacity_constraints = dict(zip(other_edges, mdl.add_constraints(mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= 0 for e in other_edges)))
+    mdl.shared_edges = set(other_edges) # Edges whose flow variables are not fixed to 0
+    mdl.conditioned_constraints = []
+    mdl.payments_constraints = []
+
+    add_subtour_constraints(mdl, V, EO, commodities, index, lazy_subtours) # Subtour elimination constraints
 
     # --- objective ---
-    mdl.commodities_revenues = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*commodities[c].revenue for e in {**E,**L} if e[1] == c[1]) for c in commodities)
-    mdl.add_kpi(mdl.commodities_revenues, "Demands revenue")
+    mdl.commodities_revenues = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*commodities[c].revenue for e in index.in_edges[c[1]]) for c in commodities)
     mdl.edges_costs = mdl.sum(mdl.u[e]*E[e].cost for e in E)
+    mdl.out_payments = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*other_edges[e].cost_per_unit for e in other_edges)for c in commodities)
+
+    update_iterative_model(mdl, info_platform)
+
+    return mdl
+
+
+def update_iterative_model(mdl, info_platform):
+    # Updates the model of the agent with the current state of the information platform, and adds the last solution as MIP start
+
+    # ORGANIZING INPUT DATA (what the agent sees from all the other agents)
+    agent = mdl.agent
+    E = agent.edges
+    commodities = agent.commodities
+    L = info_platform.shared_edges_for(agent)
+    conditioned_edges = info_platform.demanded_edges_for(agent)
+    edges_condition_relations = info_platform.demanded_edges_conditions_for(agent)
+    last_solution = mdl.solution
+
+    # --- shared edges: only the edges shared in this round can be used, up to their free capacity ---
+    not_shared = [e for e in mdl.shared_edges if e not in L]
+    newly_shared = [e for e in L if e not in mdl.shared_edges]
+    mdl.change_var_upper_bounds([mdl.f[e,c] for e in not_shared for c in commodities], 0)
+    mdl.change_var_upper_bounds([mdl.f[e,c] for e in newly_shared for c in commodities], 1)
+    mdl.shared_edges = set(L)
+    for e in mdl.other_edges:
+        mdl.shared_capacity_constraints[e].rhs = L[e].free_capacity if e in L else 0
+
+    # --- conditioned edges ---
+    # If b_e is equal to 1, the, the current agent cannt route more flow through the edge e than its original capacity - the capacity demanded by the other agent, for e an edge used for the other agent
+    mdl.remove_constraints(mdl.conditioned_constraints)
+    mdl.change_var_upper_bounds([mdl.b[e] for e in E], [1 if e in conditioned_edges else 0 for e in E])
+    mdl.conditioned_constraints = mdl.add_indicator_constraints(mdl.indicator_constraint(mdl.b[e],mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) <= E[e].original_capacity - conditioned_edges[e]) for e in conditioned_edges) if conditioned_edges else []
+
+    # --- payments to receive: the payment of a condition is received only if the agent accepts all its edges ---
+    mdl.remove_constraints(mdl.payments_constraints)
+    while len(mdl.z) < len(edges_condition_relations):
+        mdl.z.append(mdl.binary_var(name = 'z_%d' %(len(mdl.z))))
+    mdl.change_var_upper_bounds(mdl.z, [1 if k < len(edges_condition_relations) else 0 for k in range(len(mdl.z))])
+    mdl.payments_constraints = mdl.add_constraints(mdl.z[k] <= mdl.b[e] for k, condition in enumerate(edges_condition_relations) for e in condition.edges) if edges_condition_relations else []
+    mdl.in_payments = mdl.sum(mdl.z[k]*condition.price for k, condition in enumerate(edges_condition_relations))
+
+    # --- objective ---
+    mdl.profit = mdl.commodities_revenues - mdl.edges_costs - mdl.out_payments + mdl.in_payments
+    mdl.clear_kpis()
+    mdl.add_kpi(mdl.commodities_revenues, "Demands revenue")
     mdl.add_kpi(mdl.edges_costs, "Edges costs")
-    
-    mdl.out_payments = mdl.sum(mdl.sum(mdl.f[e,c]*commodities[c].units*L[e].cost_per_unit for e in L)for c in commodities)
     mdl.add_kpi(mdl.out_payments, "Payments to do to other agents")
-    mdl.in_payments = mdl.sum((mdl.sum(mdl.b[e]for e in condition.edges) == len(condition.edges))*condition.price for condition in edges_condition_relations)
     mdl.add_kpi(mdl.in_payments, "Payments to receive from other agents")
-
-    mdl.profit = mdl.commodities_revenues - mdl.edges_costs - mdl.out_payments + mdl.in_payments
     mdl.add_kpi(mdl.profit, 'Profit agent')
-    # mdl.free_capacity = mdl.sum(E[e].original_capacity - mdl.sum(mdl.f[e,c]*commodities[c].units for c in commodities) for e in E)
-    # mdl.add_kpi(mdl.free_capacity, 'Free capacity')
-    # mdl.maximize_static_lex([mdl.profit, mdl.free_capacity])
     mdl.maximize(mdl.profit)
 
-    return mdl
+    # --- warm start from the previous solution (without the values which are now out of the bounds) ---
+    mdl.clear_mip_starts()
+    if last_solution is not None:
+        mip_start = {var:value for var, value in last_solution.iter_var_values() if value <= var.ub}
+        if mip_start:
+            mdl.add_mip_start(mdl.new_solution(mip_start))
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------------------ MIP START ------------------------------------
+# -----------------------------------------------------------------------------------
+
+def add_routes_mip_start(mdl, result):
+    # Adds the routes (and active edges) of a result, e.g. from the greedy heuristic, as MIP start of a single agent or cooperation model
+    if result is None:
+        return
+    # The routes with edges or commodities removed by the presolve are not in the model, so they are not part of the start
+    mip_start = {mdl.f[e,c]:1 for c, route in result['routes'].items() if all((e,c) in mdl.f for e in route) for e in route}
+    if hasattr(mdl,'u'):
+        mip_start.update({mdl.u[e]:1 for e in result['active_edges'] if e in mdl.u})
+    if mip_start:
+        mdl.add_mip_start(mdl.new_solution(mip_start))
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------- LINKING AND COVER INEQUALITIES --------------------------
+# -----------------------------------------------------------------------------------
+
+def add_capacity_cuts(mdl, E, commodities, capacity, cuts = 'none'):
+    # Adds f[e,c] <= u[e] (in the models with u) and the cover inequalities of the capacity constraints (see lib/cuts.py)
+    # With cuts = 'static' they are constraints of the model, with 'pool' user cuts (CPLEX adds them when they are violated)
+    if cuts == 'none':
+        return
+    inequalities = []
+    if hasattr(mdl,'u'):
+        inequalities += [mdl.f[e,c] <= mdl.u[e] for e in E for c in commodities]
+    for e, covers in cts.edges_covers(E, commodities, capacity).items():
+        activation = mdl.u[e] if hasattr(mdl,'u') else 1
+        inequalities += [mdl.sum(mdl.f[e,c] for c in cover) <= rhs*activation for cover, rhs in covers]
+    if cuts == 'static':
+        mdl.add_constraints(inequalities)
+    elif cuts == 'pool':
+        mdl.add_user_cut_constraints(inequalities)
+    else:
+        raise ValueError('Unknown cuts %s' %(cuts))
+
+
+# -----------------------------------------------------------------------------------
+# ------------------------- SUBTOUR ELIMINATION CONSTRAINTS -------------------------
+# -----------------------------------------------------------------------------------
+
+def add_subtour_constraints(mdl, V, E, commodities, index, lazy_subtours = False):
+    # If lazy_subtours is False, one constraint is added for each subset of nodes and commodity (exponential in the number of nodes).
+    # Otherwise, no constraint is added now, and the model keeps the data needed to separate the violated ones in solve_model
+    mdl.lazy_subtours = lazy_subtours
+    mdl.subtour_edges = E
+    mdl.subtour_commodities = commodities
+    mdl.subtour_index = index
+    if not lazy_subtours:
+        mdl.add_constraints(subtour_expr(mdl, index, set(S), c) <= len(S) -1 for S in powerset(V,2) for c in commodities)
+
+
+def subtour_expr(mdl, index, S, c):
+    # Flow of the commodity c over the edges with both extremes in the set of nodes S
+    return mdl.sum(mdl.f[e,c] for v in S for e in index.out_edges[v] if e[1] in S)
+
+
+def separate_subtour_constraints(mdl):
+    # Returns the subtour elimination constraints violated by the current (integer) solution of the model
+    active_flow = {c:[] for c in mdl.subtour_commodities}
+    for (e,c), value in mdl.solution.get_value_dict(mdl.f, keep_zeros = False).items():
+        if value > 0.9: # We use >0.9 because sometimes CPLEX can say the value is 0.99999, even if it is 1
+            active_flow[c].append(e)
+
+    cuts = []
+    for c in active_flow:
+        for S in cyclic_components(active_flow[c]):
+            cuts.append(subtour_expr(mdl, mdl.subtour_index, S, c) <= len(S) -1)
+    return cuts
+
+
+def solve_model(mdl, time_limit = None, threads = 0, backend = 'cplex'):
+    # Solves the model. If it was built with lazy subtour elimination constraints, we check each integer solution
+    # for cycles, add only the violated constraints and solve it again, until the solution has no cycles.
+    # If there is no time left while the last solution still has cycles, it is not a solution of the model, so None is
+    # returned and mdl.subtours_left is set (the callers handle it as a model without solution)
+    # threads is the number of threads the solver can use (0 to let the solver decide), backend is the solver (see lib/backends.py)
+    init_time = time.time()
+    remaining_time = None
+    mdl.subtours_left = False
+    while True:
+        if time_limit is not None:
+            remaining_time = time_limit - (time.time() - init_time)
+            if remaining_time <= 0:
+                mdl.subtours_left = mdl.solution is not None
+                return None
+        solution = bk.solve(mdl, backend, remaining_time, threads)
+        if not solution or not mdl.lazy_subtours:
+            return solution
+        cuts = separate_subtour_constraints(mdl)
+        if not cuts:
+            return solution
+        mdl.add_constraints(cuts)
+
+
+# -----------------------------------
+# Recipe to get the connected components (ignoring directions) with cycles from a list of edges
+# -----------------------------------
 
+def cyclic_components(edges):
+    "cyclic_components([(0,1,0),(1,0,0),(1,2,0)]) --> [{0,1,2}]"
+    parent = {}
+    def find(v):
+        while parent.setdefault(v,v) != v:
+            parent[v] = parent[parent[v]]
+            v = parent[v]
+        return v
+    for e in edges:
+        parent[find(e[0])] = find(e[1])
 
+    nodes = {}
+    num_edges = {}
+    for v in parent:
+        nodes.setdefault(find(v),set()).add(v)
+    for e in edges:
+        num_edges[find(e[0])] = num_edges.get(find(e[0]),0) + 1
+    # A connected component with as many edges as nodes (or more) has a cycle
+    return [nodes[r] for r in nodes if num_edges.get(r,0) >= len(nodes[r])]
 
 
 # -----------------------------------
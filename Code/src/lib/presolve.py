@@ -0,0 +1,114 @@
+'''
+Presolve of the data of the single agent and cooperation models, which removes the commodities and edges which can't have
+flow in any solution before the model is built, so their flow variables and constraints are not created.
+
+    - A commodity can't be served if it has no units, or if every route from its origin to its terminal over edges with
+      enough capacity pays the owners of the edges more than its revenue (in the cooperation models, each served
+      commodity has to earn at least what it pays for the edges of the other agents).
+    - An edge can't be used if no remaining commodity has a route through it within these limits (e.g. the edges not
+      reachable from any origin or which can't reach any terminal).
+    - In the pooled graph of the central planner, when there are no minimal profits for the agents (residual cooperation,
+      or the values of the coalitions), an edge is removed if a parallel edge of another agent is at least as good for
+      every commodity (enough capacity for all of them, not more expensive and not a larger payment for any commodity).
+
+The edges and commodities which are kept are the same objects with the same keys, so the solutions of the reduced models
+are already in the keys of the original data: the removed commodities are not served and the removed edges are not used.
+'''
+
+import heapq
+
+# Own modules
+import lib.classes as cl
+
+
+def presolve(E, commodities, type_cooperation = 'single_agent', agents_minimal_profit = None, index = None):
+    # Returns the edges and commodities (dictionaries with the kept keys) and the GraphIndex of the kept edges
+    # index is the GraphIndex of E. If it is not given, it is built here
+    capacity = {e:(E[e].free_capacity if type_cooperation == 'residual_cooperation' else E[e].original_capacity) for e in E}
+    if index is None:
+        index = cl.GraphIndex(E)
+
+    # Edges which each commodity can use
+    usable = {}
+    for c in commodities:
+        if commodities[c].units > 0:
+            usable_edges = usable_edges_of(E, index, capacity, commodities, c, type_cooperation)
+            if usable_edges:
+                usable[c] = usable_edges
+
+    kept_edges = set().union(*usable.values())
+    if not agents_minimal_profit and type_cooperation in ('residual_cooperation','full_cooperation'):
+        kept_edges -= dominated_edges(E, commodities, kept_edges, capacity, usable, type_cooperation)
+
+    kept_E = {e:E[e] for e in E if e in kept_edges}
+    kept_commodities = {c:commodities[c] for c in commodities if c in usable}
+    return kept_E, kept_commodities, cl.GraphIndex(kept_E)
+
+
+def payment(E, e, c, type_cooperation):
+    # Payment per unit of the commodity c to the owner of the edge e
+    if type_cooperation == 'single_agent' or e[2] == c[2]:
+        return 0
+    return E[e].cost_per_unit
+
+
+def usable_edges_of(E, index, capacity, commodities, c, type_cooperation):
+    # Edges of the routes of the commodity (through edges with enough capacity, not leaving the terminal nor entering the
+    # origin) whose payment is not larger than its revenue per unit
+    units = commodities[c].units
+    revenue = commodities[c].revenue
+    def can_use(e):
+        return capacity[e] >= units and e[0] != c[1] and e[1] != c[0]
+
+    from_origin = dijkstra(c[0], lambda v: index.out_edges[v], 1, can_use, lambda e: payment(E, e, c, type_cooperation), revenue)
+    if c[1] not in from_origin:
+        return set()
+    to_terminal = dijkstra(c[1], lambda v: index.in_edges[v], 0, can_use, lambda e: payment(E, e, c, type_cooperation), revenue)
+    return {e for v in from_origin for e in index.out_edges[v]
+            if can_use(e) and e[1] in to_terminal and from_origin[v] + payment(E, e, c, type_cooperation) + to_terminal[e[1]] <= revenue + 1e-9}
+
+
+def dijkstra(source, edges_of, end, can_use, weight, max_distance):
+    # Distance from the source to each node (or from each node to the source, following the in-edges with end = 0), up to max_distance
+    dist = {source:0}
+    heap = [(0, source)]
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue
+        for e in edges_of(v):
+            if not can_use(e):
+                continue
+            w = d + weight(e)
+            if w <= max_distance + 1e-9 and (e[end] not in dist or w < dist[e[end]]):
+                dist[e[end]] = w
+                heapq.heappush(heap, (w, e[end]))
+    return dist
+
+
+def dominated_edges(E, commodities, kept_edges, capacity, usable, type_cooperation):
+    # Edges with a parallel edge (same extremes, another agent) which can replace them in any solution
+    users = {}
+    for c, usable_edges in usable.items():
+        for e in usable_edges:
+            users.setdefault(e,[]).append(c)
+
+    parallel = {}
+    for e in sorted(kept_edges):
+        parallel.setdefault((e[0],e[1]),[]).append(e)
+
+    dominated = set()
+    for edges in parallel.values():
+        for b in edges:
+            for a in edges:
+                if a == b or a in dominated:
+                    continue
+                if capacity[a] < sum(commodities[c].units for c in set(users[a]) | set(users[b])):
+                    continue # a could not carry all the commodities
+                if type_cooperation == 'full_cooperation' and E[a].cost > E[b].cost:
+                    continue
+                if any(payment(E, a, c, type_cooperation) > payment(E, b, c, type_cooperation) or c not in users[a] for c in users[b]):
+                    continue
+                dominated.add(b)
+                break
+    return dominated
@@ -1,55 +1,86 @@
 # Python packages
 import pandas as pd # Generate data frame
-import time # Control running time
+import os
 
 # Own modules
-import main_full_cooperation, main_partial_cooperation, main_residual_cooperation, main_iterative_cooperation, main_no_cooperation
-
-#-----------
-# For instances with 5 agents
-#--------
-
-instance_list = []
-n = 5
-for string in ['low','high']:
-    for i in range(5):
-        instance_list.append('%d_%s_%d' %(n,string,i))
-
-# Data frame to store results
-agents_5_df = pd.DataFrame(columns = ['No_cooperation','Full','Full%','Partial', 'Partial%','Residual','Residual%'])
-agents_5_time_df = pd.DataFrame(columns = ['No_cooperation','Full','Partial','Residual'])
-
-for instance in instance_list[7:10]:
-    print(instance)
-    time_1 = time.time()
-    main_no_cooperation.no_cooperation(instance)
-    time_end_no_coop = time.time()
-    full_payoff = main_full_cooperation.full_cooperation(instance)
-    time_end_full = time.time()
-    partial_payoff = main_partial_cooperation.partial_cooperation(instance)
-    time_end_partial = time.time() 
-    no_cooperation_payoff , residual_payoff = main_residual_cooperation.residual_cooperation(instance)
-    time_end_residual = time.time()
-    
-    temp = [no_cooperation_payoff,full_payoff,(full_payoff-no_cooperation_payoff)/no_cooperation_payoff*100,partial_payoff,
-    (partial_payoff-no_cooperation_payoff)/no_cooperation_payoff*100,residual_payoff,(residual_payoff-no_cooperation_payoff)/no_cooperation_payoff*100]
-    temp = [round(x,2) for x in temp]
+import lib.classes as cl
+import lib.cache as ch
+import lib.instrumentation as ins
+import runner
+
+# Settings to build and solve the models (lazy_subtours = True to separate the subtour elimination constraints only when they are violated)
+# threads = 0 divides the cores among the workers, and agent_workers stand-alone models of the agents are solved at the same time
+# (the runner limits them to the threads of each worker, so with one worker per core they are solved one after the other)
+# stats_file gets one line with the build, solve and recovery times and the size of each solved model
+settings = cl.SolverSettings(time_limit = 5400, lazy_subtours = False, threads = 0, agent_workers = 5, stats_file = '5_agents_stats.jsonl')
+# Number of processes running (instance, mechanism) jobs in parallel
+workers = os.cpu_count()
+
+
+# Value and running time of a job, NaN if it failed
+def job_value(results, instance, mechanism):
+    job = results[instance].get(mechanism)
+    return job.value if job is not None and job.value is not None else float('nan')
+
+def job_time(results, instance, mechanism):
+    job = results[instance].get(mechanism)
+    return job.time if job is not None and job.time is not None else float('nan')
+
+
+if __name__ == '__main__': # Needed, since the workers of the pool import this module
+
+    # Cache with the results of the solved models, so a rerun only solves the models whose data, mechanism or settings changed
+    # (cache.invalidate_mechanism('full_cooperation') or cache.clear() to force solving them again)
+    cache = ch.ResultCache(os.path.join(os.path.dirname(__file__),os.pardir,'cache'))
+
+    # The statistics of the previous run are removed, since the file is appended
+    if os.path.exists(settings.stats_file):
+        os.remove(settings.stats_file)
+
+    #-----------
+    # For instances with 5 agents
+    #--------
+
+    instance_list = []
+    n = 5
+    for string in ['low','high']:
+        for i in range(5):
+            instance_list.append('%d_%s_%d' %(n,string,i))
+
+    # Data frame to store results
+    agents_5_df = pd.DataFrame(columns = ['No_cooperation','Full','Full%','Partial', 'Partial%','Residual','Residual%'])
+    agents_5_time_df = pd.DataFrame(columns = ['No_cooperation','Full','Partial','Residual'])
+
+    results = runner.run_experiments(instance_list[7:10], ['full_cooperation','partial_cooperation','residual_cooperation'], settings, workers, cache)
+
+    for instance in instance_list[7:10]:
+        no_cooperation_payoff = job_value(results, instance, 'no_cooperation') # Stand-alone solutions, shared by all the mechanisms
+        full_payoff = job_value(results, instance, 'full_cooperation')
+        partial_payoff = job_value(results, instance, 'partial_cooperation')
+        residual_payoff = job_value(results, instance, 'residual_cooperation')
+
+        temp = [no_cooperation_payoff,full_payoff,(full_payoff-no_cooperation_payoff)/no_cooperation_payoff*100,partial_payoff,
+        (partial_payoff-no_cooperation_payoff)/no_cooperation_payoff*100,residual_payoff,(residual_payoff-no_cooperation_payoff)/no_cooperation_payoff*100]
+        temp = [round(x,2) for x in temp]
+
+        agents_5_df.loc[instance] = temp
 
-    agents_5_df.loc[instance] = temp
+        temp_time = [job_time(results, instance, mechanism) for mechanism in ['no_cooperation','full_cooperation','partial_cooperation','residual_cooperation']]
+        temp_time = [round(x,2) for x in temp_time]
 
-    temp_time = [time_end_no_coop-time_1,time_end_full-time_end_no_coop,time_end_partial-time_end_full,time_end_residual-time_end_partial]
-    temp_time = [round(x,2) for x in temp_time]
+        agents_5_time_df.loc[instance] = temp_time
 
-    agents_5_time_df.loc[instance] = temp_time
 
+    file = open("5_agents_payoffs.txt","w")
+    file.write(agents_5_df.to_latex())
+    file.close()
 
-file = open("5_agents_payoffs.txt","w")
-file.write(agents_5_df.to_latex())
-file.close()
+    file = open("5_agents_times.txt","w")
+    file.write(agents_5_time_df.to_latex())
+    file.close()
 
-file = open("5_agents_times.txt","w")
-file.write(agents_5_time_df.to_latex())
-file.close()
+    if os.path.exists(settings.stats_file):
+        ins.jsonl_to_csv(settings.stats_file,"5_agents_stats.csv")
 
 #------------------------------------------------------------------------
 # For instances with 2 agents
@@ -0,0 +1,79 @@
+# Python packages
+import time
+
+# Own scripts
+import lib.classes as cl
+import lib.functions as fn
+import lib.bounds as bn
+
+MECHANISMS = ('full_cooperation','partial_cooperation','residual_cooperation','iterative_cooperation')
+
+# -------------------------------------------------------------------------
+#  BOUNDS OF THE COALITION PAYOFF OF EACH MECHANISM
+# -------------------------------------------------------------------------
+
+def bounds_analysis(instance, mechanisms = MECHANISMS, settings = cl.SolverSettings(), baseline = None):
+    # Returns {mechanism: bounds} with the lower and upper bounds of the coalition payoff of each mechanism (and of
+    # 'no_cooperation'), the LP, Lagrangian and greedy values they come from, and 'gain', an upper bound of what the
+    # mechanism can earn over no cooperation (if it is not positive, the exact model doesn't need to be solved).
+    # The partial and residual cooperation models and the minimal profits of full cooperation depend on the stand-alone
+    # solutions, so without a baseline these mechanisms are bounded by the model of all the pooled edges without minimal
+    # profits, and from below by the greedy stand-alone payoffs.
+    # Iterative cooperation is not one model: its payoff comes from the agreements of its iterations, and is not shown to
+    # be at most the value of the pooled model, so it has no bounds ('lower', 'upper' and 'gain' are None). The values
+    # of the pooled model are still given
+    N, V, commodities, edges = fn.read_data(instance)
+    agents = baseline.create_agents() if baseline is not None else [cl.Agent(i,edges[i],commodities[i]) for i in range(N)]
+    solve = lambda E, C, type_cooperation, agents_minimal_profit, index: bn.model_bounds(V,E,C,type_cooperation,agents_minimal_profit,index,settings.time_limit,settings.threads,settings.backend)
+
+    # --- no cooperation: sum of the bounds of the agents ---
+    init_time = time.time()
+    if baseline is not None:
+        analysis = {'no_cooperation':{'lower':baseline.payoff, 'upper':baseline.payoff, 'time':0}}
+    else:
+        agents_bounds = [solve(agent.edges,agent.commodities,'single_agent',None,agent.index) for agent in agents]
+        analysis = {'no_cooperation':{'lower':sum(bounds['greedy'] or 0 for bounds in agents_bounds),
+                                      'upper':sum(bn.upper_bound(bounds) for bounds in agents_bounds),
+                                      'lp':sum(bounds['lp'] for bounds in agents_bounds) if all(bounds['lp'] is not None for bounds in agents_bounds) else None,
+                                      'lagrangian':sum(bounds['lagrangian'] for bounds in agents_bounds),
+                                      'greedy':sum(bounds['greedy'] or 0 for bounds in agents_bounds),
+                                      'time':time.time() - init_time}}
+    no_cooperation = analysis['no_cooperation']
+
+    pooled = None
+    for mechanism in mechanisms:
+        init_time = time.time()
+        if baseline is None or mechanism == 'iterative_cooperation':
+            if pooled is None:
+                central_planner = cl.CentralizedSystem(agents,'full_cooperation')
+                pooled = solve(central_planner.edges,central_planner.commodities,'full_cooperation',None,central_planner.index)
+            bounds = dict(pooled)
+            lower, upper = (no_cooperation['lower'], bn.upper_bound(pooled)) if mechanism != 'iterative_cooperation' else (None, None)
+        else:
+            # The model of the mechanism, and its objective converted to the coalition payoff as in its main script
+            central_planner = cl.CentralizedSystem(agents,mechanism)
+            if mechanism == 'full_cooperation':
+                agents_minimal_profit = [agent.payoff_no_cooperation for agent in agents]
+                offset = 0
+            elif mechanism == 'partial_cooperation':
+                agents_minimal_profit = [agent.payoff_no_cooperation + baseline.edges_costs.get(agent.id,0) for agent in agents]
+                offset = - sum(baseline.edges_costs.values())
+            else:
+                agents_minimal_profit = None
+                offset = baseline.payoff
+            bounds = solve(central_planner.edges,central_planner.commodities,mechanism,agents_minimal_profit,central_planner.index)
+            upper = bn.upper_bound(bounds) + offset
+            lower = max(baseline.payoff, bounds['greedy'] + offset if bounds['greedy'] is not None else baseline.payoff)
+        bounds.update({'lower':lower, 'upper':upper, 'gain':upper - no_cooperation['lower'] if upper is not None else None, 'time':time.time() - init_time})
+        analysis[mechanism] = bounds
+    return analysis
+
+
+if __name__ == '__main__':
+    instance = '5_low_0'
+    init_time = time.time()
+    analysis = bounds_analysis(instance)
+    print('Bounds computed in %.2f seconds' %(time.time() - init_time))
+    for mechanism, bounds in analysis.items():
+        print('%s: lower bound %s, upper bound %s%s (%.2f seconds)' %(mechanism, bounds['lower'], bounds['upper'],
+              ', gain over no cooperation at most %.2f' %(bounds['gain']) if bounds.get('gain') is not None else '', bounds['time']))
@@ -0,0 +1,33 @@
+# Python packages
+import time
+
+# Own scripts
+import lib.classes as cl
+import lib.coalitions as co
+
+# -------------------------------------------------------------------------
+#  VALUES OF THE COALITIONS, SHAPLEY VALUE AND CORE
+# -------------------------------------------------------------------------
+
+def coalition_analysis(instance, settings = cl.SolverSettings(), cache = None, workers = None):
+    # Solves all the coalitions of agents of the instance, and returns the values of the coalitions, the Shapley value of
+    # each agent, whether it is in the core, and an allocation of the least core with its largest excess (the core is empty if it is positive)
+    game = co.CoalitionGame(instance, settings, cache, workers)
+    values = game.values()
+    shapley = game.shapley_values()
+    core_allocation, excess = game.core_allocation()
+    return {'values':values, 'shapley':shapley, 'shapley_in_core':game.in_core(shapley),
+            'core_allocation':core_allocation, 'excess':excess}
+
+
+if __name__ == '__main__':
+    instance = '5_low_0'
+    init_time = time.time()
+    analysis = coalition_analysis(instance)
+    print('Values of the coalitions solved in %.2f seconds' %(time.time() - init_time))
+    for i, value in enumerate(analysis['shapley']):
+        print('Agent %d: alone %s, Shapley value %.2f' %(i, analysis['values'][frozenset([i])], value))
+    print('Value of the grand coalition: %s' %(analysis['values'][frozenset(range(len(analysis['shapley'])))]))
+    print('The Shapley value is %sin the core' %('' if analysis['shapley_in_core'] else 'not '))
+    print('Least core allocation: %s (largest excess %.2f, the core is %sempty)'
+          %([round(x,2) for x in analysis['core_allocation']], analysis['excess'], '' if analysis['excess'] > 1e-6 else 'not '))
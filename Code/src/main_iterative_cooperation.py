@@ -3,24 +3,36 @@ The idea is to find a way in which agent can interact with each other, still hav
 decision variables, and sharing as little information as possible with the other agents, but still interact
 with them and find an agreement about how to cooperatively solve the multicommodity flow problem they are facing
 
-In this script we will only consider the case with 2 agents, and later we will try to extend the model to more players
+Each agent sees the union of the edges shared by all the other agents, and the capacity they demand on its edges.
+The agents can re-optimize in two ways (schedule):
+    - 'round_robin': one after the other in the given order, each one seeing the platform updated by the previous ones
+    - 'jacobi': all at the same time (in parallel), on the platform as it was at the end of the previous round
+The mechanism stops when no agent changes its solution in a round (equilibrium), or when the solutions of the agents at
+the end of a round were already reached in a previous round (cycle), giving the best coalition payoff of the cycle.
 '''
 
+# Python packages
+import concurrent.futures as cf
+import os
+import time
+
 # Own scripts
-from numpy import NaN
 import lib.classes as cl
 import lib.models as mdls
 import lib.functions as fn
-import time
+import lib.cache as ch
+import lib.instrumentation as ins
 
 # -------------------------------------------------------------------------
 #  INSTANCE DATA
 # -------------------------------------------------------------------------
 
 
-def iterative_cooperation(instance,order=[0,1]):
+def iterative_cooperation(instance,order=None,settings = cl.SolverSettings(),cache = None,schedule = 'round_robin'):
+    # order is the list of positions of the agents in agents_list in which they re-optimize (all of them by default)
+    # cache is an optional ResultCache, where the result of the mechanism is looked up before running it
     init_time = time.time()
-    max_time = 5400
+    max_time = settings.time_limit
     N, V, commodities, edges = fn.read_data(instance)
 
     max_iter = 100
@@ -31,89 +43,151 @@ def iterative_cooperation(instance,order=[0,1]):
     for i in range(N-1,-1,-1):
         agents_list.append(cl.Agent(i,edges[i],commodities[i]))
 
+    if order is None:
+        order = list(range(N))
+
+    if cache is not None:
+        all_edges = {e:agent.edges[e] for agent in agents_list for e in agent.edges}
+        all_commodities = {c:agent.commodities[c] for agent in agents_list for c in agent.commodities}
+        key = ch.make_key(ch.data_fingerprint(all_edges,all_commodities),'iterative_cooperation',(tuple(order),schedule),settings)
+        result = cache.get(key)
+        if result is not None:
+            return result['objective'],result['stats']['iterations']
+
 
     # ----- Creating the information platform ------
 
     info_platform = cl.informationPlatform(agents_list)
 
+    # ----- Each agent keeps its model between rounds, and updates it in place before solving it again ------
+
+    models = {}
+
+    # In the parallel schedule, the threads are divided among the agents solving at the same time
+    if schedule == 'jacobi':
+        threads = max(1, (settings.threads or os.cpu_count()) // len(order))
+    else:
+        threads = settings.threads
+
 
     # ----------------------------------------------------------------------------
-    # First, Agent 1 will solve his own optimization problem
+    # The agents re-optimize in each round until no one changes its solution, or the solutions of a previous round repeat
     # ----------------------------------------------------------------------------
 
-    first_agent = order[0]
-    second_agent = order[1]
+    # The solutions of the agents at the end of a round (joint state) determine the next rounds, so if a joint state is
+    # reached again the agents cycle through the same states forever. Each joint state is stored with the round where it
+    # was reached, by the fingerprints of the solutions
+    states = {}
+    round_payoffs = []
+    cycle = None
 
     iteration = 0
     while(iteration<max_iter):
 
         iteration += 1
-        # print(iteration)
-        # print("************")
         # print('Iteration %s' %(iteration))
-        # print("************")
-        # print()
-
 
-        # print('Agent %d' %(first_agent))
-        # print("----------------------")
+        if schedule == 'round_robin':
+            for position in order:
+                stats = ins.ModelStats(settings,instance,'iterative_cooperation',agent = agents_list[position].id,iteration = iteration,schedule = schedule)
+                with stats.measure('build'):
+                    model = prepare_model(V,models,position,agents_list,info_platform,settings)
+                solved = solve_and_recover(model,agents_list[position],info_platform,max_time-(time.time()-init_time),threads,settings.backend,stats)
+                stats.write()
+                if not solved:
+                    print("Problem has no solution")
+                    return -1,iteration
+
+        elif schedule == 'jacobi':
+            # All the agents see the platform as it was at the end of the previous round
+            previous_platform = info_platform.snapshot()
+            round_stats = [ins.ModelStats(settings,instance,'iterative_cooperation',agent = agents_list[position].id,iteration = iteration,schedule = schedule) for position in order]
+            round_models = []
+            for position, stats in zip(order,round_stats):
+                with stats.measure('build'):
+                    round_models.append(prepare_model(V,models,position,agents_list,previous_platform,settings))
+            with cf.ThreadPoolExecutor(max_workers = len(order)) as pool:
+                solutions = list(pool.map(lambda args: timed_solve(*args,max_time-(time.time()-init_time),threads,settings.backend), zip(round_models,round_stats)))
+            for position, model, solution, stats in zip(order,round_models,solutions,round_stats):
+                stats.add_model(model)
+                if not solution:
+                    stats.write()
+                    print("Problem has no solution")
+                    return -1,iteration
+                with stats.measure('recover'):
+                    recover(model,agents_list[position],info_platform)
+                stats.write()
 
-        # We have to re-start the info each time an agent reoptimizes
-        agents_list[first_agent].restore_commodities_info()
-        agents_list[first_agent].restore_edges_info()
-
-        info_platform.restore_info(agents_list[first_agent])
-
-        # Build the model
-        model = mdls.build_iterative_model(V,agents_list[first_agent],info_platform)
-        model.set_time_limit(max_time-(time.time()-init_time))
-        # Solve the model.
-        if model.solve():
-            #fn.print_iterative_solution(model)
-            fn.recover_data_iterative(model,agents_list[first_agent],info_platform)
-            agents_list[first_agent].history_solutions.append(cl.Solution(agents_list[first_agent],model))
-            #agents_list[first_agent].history_solutions[-1].print_data()
-        else:
-            print("Problem has no solution")
-            return -1
-
-        
-        # print("----------------------")
-        # print('Agent %d' %(second_agent))
-        # print("----------------------")
-
-        # We have to re-start the info each time an agent reoptimizes
-        agents_list[second_agent].restore_commodities_info()
-        agents_list[second_agent].restore_edges_info()
-
-        info_platform.restore_info(agents_list[second_agent])
-
-        # Build the model
-        model = mdls.build_iterative_model(V,agents_list[second_agent],info_platform)
-        model.set_time_limit(max_time-(time.time()-init_time))
-        # Solve the model.
-        if model.solve():
-            #fn.print_iterative_solution(model)
-            fn.recover_data_iterative(model,agents_list[second_agent],info_platform)
-            agents_list[second_agent].history_solutions.append(cl.Solution(agents_list[second_agent],model))
-            #agents_list[second_agent].history_solutions[-1].print_data()
         else:
-            print("Problem has no solution")
-            return -1
-
-        if(iteration >= 2 and agents_list[first_agent].history_solutions[-1].equal_to(agents_list[first_agent].history_solutions[-2]) and agents_list[second_agent].history_solutions[-1].equal_to(agents_list[second_agent].history_solutions[-2])):
-            # print('Equilibrium was found in %d iterations!' %(iteration))
-            coalition_payoff = agents_list[first_agent].history_solutions[-1].payoff + agents_list[second_agent].history_solutions[-1].payoff
+            raise ValueError('Unknown schedule %s' %(schedule))
+
+        solutions = [agents_list[position].history_solutions[-1] for position in order]
+        round_payoffs.append(sum(solution.payoff for solution in solutions))
+        state = tuple(solution.fingerprint for solution in solutions)
+        previous = states.get(state)
+        if previous is not None and all(solution.equal_to(agents_list[position].history_solutions[previous-1]) for position, solution in zip(order,solutions)):
+            if iteration - previous == 1:
+                # print('Equilibrium was found in %d iterations!' %(iteration))
+                coalition_payoff = round_payoffs[-1]
+            else:
+                # The rounds previous+1, ..., iteration are the cycle. The best coalition payoff among them is reported
+                cycle = {'start':previous,'period':iteration - previous}
+                coalition_payoff = max(round_payoffs[previous:])
+                print('Cycle of period %d found in iteration %d (rounds %d to %d), best coalition payoff in the cycle: %s'
+                      %(cycle['period'],iteration,previous+1,iteration,coalition_payoff))
             break
+        states[state] = iteration
     else:
         print('No equilibrium found in %d iterations' %(iteration))
         coalition_payoff = -1
     
+    if cache is not None:
+        cache.put(key,{'objective':coalition_payoff,'stats':{'iterations':iteration,'cycle':cycle,'time':time.time()-init_time}})
     
     return coalition_payoff,iteration
     #print(coalition_payoff,iteration)
 
 
+def prepare_model(V,models,position,agents_list,info_platform,settings):
+    # Restores the info of the agent and returns its model, updated with the platform (built the first time)
+    agent = agents_list[position]
+
+    # We have to re-start the info each time an agent reoptimizes
+    agent.restore_commodities_info()
+    agent.restore_edges_info()
+
+    if position not in models:
+        other_edges = {e:other.edges[e] for other in agents_list if other.id != agent.id for e in other.edges}
+        models[position] = mdls.build_iterative_model(V,agent,info_platform,settings.lazy_subtours,other_edges)
+    else:
+        mdls.update_iterative_model(models[position],info_platform)
+    return models[position]
+
+
+def recover(model,agent,info_platform):
+    info_platform.restore_info(agent)
+    fn.recover_data_iterative(model,agent,info_platform)
+    agent.history_solutions.append(cl.Solution(agent,model))
+    #agent.history_solutions[-1].print_data()
+
+
+def timed_solve(model,stats,time_limit,threads,backend):
+    with stats.measure('solve'):
+        return mdls.solve_model(model,time_limit,threads,backend)
+
+
+def solve_and_recover(model,agent,info_platform,time_limit,threads,backend,stats):
+    # stats is the ModelStats where the times and statistics of the model are stored
+    solution = timed_solve(model,stats,time_limit,threads,backend)
+    stats.add_model(model)
+    if solution:
+        #fn.print_iterative_solution(model)
+        with stats.measure('recover'):
+            recover(model,agent,info_platform)
+        return True
+    return False
+
+
 if __name__ == '__main__':
     instance = '2_high_1'
     iterative_cooperation(instance,[1,0])
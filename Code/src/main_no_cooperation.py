@@ -1,40 +1,105 @@
+# Python packages
+import concurrent.futures as cf
+import os
+
 # Own scripts
 import lib.classes as cl
 import lib.models as mdls
 import lib.functions as fn
+import lib.cache as ch
+import lib.heuristics as hr
+import lib.matrix as mx
+import lib.instrumentation as ins
 
 # -------------------------------------------------------------------------
 #  INSTANCE DATA
 # -------------------------------------------------------------------------
 
-def no_cooperation(instance):
+def no_cooperation(instance, settings = cl.SolverSettings(), cache = None):
+    # Solves the stand-alone model of each agent and returns the Baseline with the solutions, which can be given as input to the other mechanisms
+    # cache is an optional ResultCache, where the solutions of the models are looked up before solving them
 
     N, V, commodities, edges = fn.read_data(instance)
+    baseline = cl.Baseline(N, V, commodities, edges)
 
     # ------ Creating the agents objects ----------
 
-    agents_list = []
-    for i in range(N):
-        agents_list.append(cl.Agent(i,edges[i],commodities[i]))
+    agents_list = baseline.create_agents()
+    stats = {agent.id:ins.ModelStats(settings,instance,'no_cooperation',agent = agent.id) for agent in agents_list}
 
 
     # ----------------------------------------------------------------------------
     # Solving the model and display the result for each agent
     # ----------------------------------------------------------------------------
 
-    for agent in agents_list:
+    # The models of the agents are independent, so they can be solved at the same time (settings.agent_workers at once),
+    # dividing the threads among them
+    if settings.agent_workers > 1:
+        threads = max(1, (settings.threads or os.cpu_count()) // settings.agent_workers)
+        with cf.ThreadPoolExecutor(max_workers = settings.agent_workers) as pool:
+            results = list(pool.map(lambda agent: solve_single_agent(V, agent, settings, cache, threads, stats[agent.id]), agents_list))
+    else:
+        results = [solve_single_agent(V, agent, settings, cache, settings.threads, stats[agent.id]) for agent in agents_list]
+
+    for agent, result in zip(agents_list, results):
+        if result is not None:
+            with stats[agent.id].measure('recover'):
+                fn.apply_single_agent_result(result,agent)
+            agent.payoff_no_cooperation = result['objective']
+            baseline.add_agent_solution(agent, result['edges_costs'])
+        else:
+            print("Problem has no solution")
+        stats[agent.id].write()
+
+    return baseline
+
 
+def solve_single_agent(V, agent, settings, cache = None, threads = 0, stats = None):
+    # Returns the result of the stand-alone model of the agent (from the cache if it is there), or None if it has no solution
+    # stats is the ModelStats where the times and statistics of the model are stored
+    if stats is None:
+        stats = ins.ModelStats(settings,None,'no_cooperation',agent = agent.id)
+    result = None
+    if cache is not None:
+        key = ch.make_key(ch.data_fingerprint(agent.edges,agent.commodities),'single_agent',(),settings)
+        result = cache.get(key)
+        stats.add(cached = result is not None)
+
+    if result is None and settings.heuristic == 'only':
+        # Fast mode: the greedy routes are the solution
+        with stats.measure('solve'):
+            result = hr.heuristic_solution(agent.edges,agent.commodities,'single_agent',index = agent.index)
+    elif result is None and settings.engine == 'matrix':
+        # Same model built as a sparse matrix
+        with stats.measure('build'):
+            model = mx.build_matrix_model(V,agent.edges,agent.commodities,'single_agent',None,settings.lazy_subtours,agent.index,settings.presolve,settings.cuts)
+            start = hr.greedy_routes(agent.edges,agent.commodities,'single_agent',index = agent.index) if settings.heuristic == 'start' else None
+        with stats.measure('solve'):
+            result = mx.solve_matrix_model(model,threads = threads,backend = settings.backend,mip_start = start)
+        stats.add_matrix_model(model,result)
+        if result is not None and cache is not None:
+            cache.put(key,result)
+    elif result is None:
         # Build the model
-        model = mdls.build_single_agent_model(V,agent.edges,agent.commodities)
+        with stats.measure('build'):
+            model = mdls.build_single_agent_model(V,agent.edges,agent.commodities,settings.lazy_subtours,agent.index,settings.presolve,settings.cuts)
+            if settings.heuristic == 'start':
+                mdls.add_routes_mip_start(model,hr.greedy_routes(agent.edges,agent.commodities,'single_agent',index = agent.index))
         # model.print_information()
 
         # Solve the model.
-        if model.solve():
+        with stats.measure('solve'):
+            solution = mdls.solve_model(model,threads = threads,backend = settings.backend)
+        stats.add_model(model)
+        if solution:
             # fn.print_single_agent_solution(model)
-            fn.recover_data_single_agent(model,agent)
-            agent.payoff_no_cooperation = model.objective_value
-        else:
-            print("Problem has no solution")
+            with stats.measure('recover'):
+                result = fn.model_result(model)
+            if cache is not None:
+                cache.put(key,result)
+
+    return result
+
 
 if __name__ == '__main__':
     instance = '2_low_0'
@@ -1,40 +1,27 @@
 # Own scripts
 import lib.classes as cl
-import lib.models as mdls
 import lib.functions as fn
+import lib.engines as eng
+import lib.instrumentation as ins
+import main_no_cooperation
 
 # -------------------------------------------------------------------------
 #  INSTANCE DATA
 # -------------------------------------------------------------------------
 
-def partial_cooperation(instance):
-    N, V, commodities, edges = fn.read_data(instance)
+def partial_cooperation(instance, settings = cl.SolverSettings(), baseline = None, cache = None):
+    # baseline is the stand-alone solution of the agents (computed with main_no_cooperation). If it is not given, it is computed here
+    # cache is an optional ResultCache, where the solution of the cooperation model is looked up before solving it
 
-    # ------ Creating the agents objects ----------
+    if baseline is None:
+        baseline = main_no_cooperation.no_cooperation(instance, settings, cache)
+    V = baseline.V
 
-    agents_list = []
-    for i in range(N):
-        agents_list.append(cl.Agent(i,edges[i],commodities[i]))
-
-
-    # ----------------------------------------------------------------------------
-    # Solving the model and display the result for each agent
-    # ----------------------------------------------------------------------------
+    # ------ Creating the agents objects, with their stand-alone solution ----------
 
+    agents_list = baseline.create_agents()
     for agent in agents_list:
-
-        # Build the model
-        model = mdls.build_single_agent_model(V,agent.edges,agent.commodities)
-        # model.print_information()
-
-        # Solve the model.
-        if model.solve():
-            # fn.print_no_info_solution(model)
-            fn.recover_data_single_agent(model,agent)
-            agent.payoff_no_cooperation = model.objective_value
-            agent.payoff_cooperation = - model.edges_costs.solution_value
-        else:
-            print("Problem has no solution")
+        agent.payoff_cooperation = - baseline.edges_costs.get(agent.id,0)
 
 
     # -------------------------------------------------------------
@@ -51,21 +38,20 @@ def partial_cooperation(instance):
     # SOLVING THE PARTIAL2 COOPERATION MODEL
     # ----------------------------------------
 
-    # Build the model
-    model = mdls.build_cooperation_model(V,central_planner.edges,central_planner.commodities,'partial_cooperation',agents_minimal_profit)
-    # model.print_information()
-    model.set_time_limit(5400)
-    # Solve the model.
-    if model.solve():
-        # fn.print_cooperation_solution(model)
-        fn.recover_data_cooperation(model, central_planner,'partial_cooperation')
+    stats = ins.ModelStats(settings,instance,'partial_cooperation',engine = settings.engine,heuristic = settings.heuristic)
+    result = eng.solve_cooperation(V,central_planner,'partial_cooperation',agents_minimal_profit,settings,stats,cache)
+
+    if result is not None:
+        with stats.measure('recover'):
+            fn.apply_cooperation_result(result, central_planner,'partial_cooperation')
+        stats.write()
 
         # ------ Recover how much each agent earn in the second stage
         for c in central_planner.served_commodities:
             agents_list[c[2]].payoff_cooperation += agents_list[c[2]].commodities[c].units*agents_list[c[2]].commodities[c].revenue
             for e in central_planner.commodities[c].route:
                 if e[2] != c[2]:
-                    side_payment =  agents_list[c[2]].commodities[c].units * agents_list[e[2]].edges[e].cost/agents_list[e[2]].edges[e].original_capacity
+                    side_payment =  agents_list[c[2]].commodities[c].units * agents_list[e[2]].edges[e].cost_per_unit
                     agents_list[e[2]].payoff_cooperation += side_payment
                     agents_list[c[2]].payoff_cooperation -= side_payment
 
@@ -79,6 +65,7 @@ def partial_cooperation(instance):
             coalition_payoff += agent.total_payoff('partial_cooperation')
         return coalition_payoff
     else:
+        stats.write()
         print("Problem has no solution")
         return -1
 
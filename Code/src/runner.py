@@ -0,0 +1,112 @@
+'''
+Runs the mechanisms over a list of instances, with up to workers processes at once.
+
+First the stand-alone solutions (baseline) of each instance are computed, and as soon as the baseline of an instance
+is ready, one job per mechanism is queued with it. Each job runs in its own process, so a job that fails, takes its
+whole time limit or kills its process (out of memory, crash of the solver) only fails itself, and the number of
+threads of each solve is limited so that the workers don't use more cores than the machine has.
+'''
+
+# Python packages
+from collections import namedtuple
+import multiprocessing as mp
+from multiprocessing.connection import wait
+import os
+import time
+
+# Own modules
+import lib.classes as cl
+import main_no_cooperation, main_full_cooperation, main_partial_cooperation, main_residual_cooperation, main_iterative_cooperation
+
+# Result of a job. value is the coalition payoff of the mechanism (None if the job failed, with the reason in error)
+JobResult = namedtuple('JobResult','instance mechanism value time error')
+
+
+# ---------------------------------
+# ---- Jobs (run in the workers)
+# ---------------------------------
+
+def run_baseline(instance, settings, cache):
+    init_time = time.time()
+    baseline = main_no_cooperation.no_cooperation(instance, settings, cache)
+    return baseline, JobResult(instance, 'no_cooperation', baseline.payoff, time.time() - init_time, None)
+
+
+def run_mechanism(instance, mechanism, settings, baseline, cache):
+    init_time = time.time()
+    try:
+        if mechanism == 'full_cooperation':
+            value = main_full_cooperation.full_cooperation(instance, settings, baseline, cache)
+        elif mechanism == 'partial_cooperation':
+            value = main_partial_cooperation.partial_cooperation(instance, settings, baseline, cache)
+        elif mechanism == 'residual_cooperation':
+            value = main_residual_cooperation.residual_cooperation(instance, settings, baseline, cache)[1]
+        elif mechanism == 'iterative_cooperation':
+            value = main_iterative_cooperation.iterative_cooperation(instance, settings = settings, cache = cache)[0]
+        else:
+            raise ValueError('Unknown mechanism %s' %(mechanism))
+        return JobResult(instance, mechanism, value, time.time() - init_time, None)
+    except Exception as error:
+        return JobResult(instance, mechanism, None, time.time() - init_time, repr(error))
+
+
+def run_job(connection, function, args):
+    # Runs the job in the child process and sends (True, output) to the parent, or (False, error) if it failed
+    try:
+        connection.send((True, function(*args)))
+    except Exception as error:
+        connection.send((False, repr(error)))
+    connection.close()
+
+
+# ---------------------------------
+# ---- Runner
+# ---------------------------------
+
+def run_experiments(instance_list, mechanisms, settings = cl.SolverSettings(), workers = None, cache = None):
+    # Returns a dictionary {instance: {mechanism: JobResult}}, with the baseline of each instance as mechanism 'no_cooperation'
+    # If settings.threads is 0, the cores are divided among the workers
+    if workers is None:
+        workers = os.cpu_count()
+    if not settings.threads:
+        settings = settings._replace(threads = max(1, os.cpu_count() // workers))
+    # The stand-alone models of a baseline job share the threads of its worker, so at most one model per thread is solved at once
+    settings = settings._replace(agent_workers = max(1, min(settings.agent_workers, settings.threads)))
+
+    results = {instance:{} for instance in instance_list}
+    queue = [(run_baseline, (instance, settings, cache), instance, 'no_cooperation') for instance in instance_list]
+    running = {} # Process of each job, by the end of the pipe where its output is received
+    while queue or running:
+        # Each process only runs one job, so nothing (memory, solver state) is shared between jobs
+        while queue and len(running) < workers:
+            function, args, instance, mechanism = queue.pop(0)
+            receiver, sender = mp.Pipe(duplex = False)
+            process = mp.Process(target = run_job, args = (sender, function, args))
+            process.start()
+            sender.close()
+            running[receiver] = (process, instance, mechanism)
+
+        for receiver in wait(list(running)):
+            process, instance, mechanism = running.pop(receiver)
+            try:
+                finished, output = receiver.recv()
+            except EOFError: # The process died before sending its output
+                finished, output = False, None
+            receiver.close()
+            process.join()
+            if not finished:
+                error = output if output is not None else 'The worker exited with code %s' %(process.exitcode)
+                print('%s in %s failed: %s' %(mechanism, instance, error))
+                results[instance][mechanism] = JobResult(instance, mechanism, None, None, error)
+                continue
+
+            if mechanism == 'no_cooperation':
+                baseline, job_result = output
+                queue.extend((run_mechanism, (instance, other_mechanism, settings, baseline, cache), instance, other_mechanism) for other_mechanism in mechanisms)
+            else:
+                job_result = output
+            if job_result.error is not None:
+                print('%s in %s failed: %s' %(mechanism, instance, job_result.error))
+            results[instance][mechanism] = job_result
+
+    return results
@@ -0,0 +1,160 @@
+# Export of the models to the LP format used by the open-source backends (lib/backends.py)
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+from docplex.mp.model import Model
+
+import lib.classes as cl
+import lib.functions as fn
+import lib.models as mdls
+import lib.backends as bk
+
+INSTANCE = '2_low_0'
+
+# max 3x + 2y + z  s.t.  x + 2y + z <= 4.5,  x integer in [0,3], y binary, z in [0,2.5]: optimum 10.5 with x = 3, y = 0, z = 1.5
+TINY_MODEL = '''
+import json, sys
+from docplex.mp.model import Model
+import lib.backends as bk
+mdl = Model('tiny')
+x, y, z = mdl.integer_var(ub = 3, name = 'x'), mdl.binary_var(name = 'y'), mdl.continuous_var(ub = 2.5, name = 'z')
+mdl.add_constraint(x + 2*y + z <= 4.5)
+mdl.maximize(3*x + 2*y + z)
+solution = bk.solve(mdl, sys.argv[1], 10, 1)
+print(json.dumps({'objective':solution.objective_value, 'values':{var.name:solution.get_value(var) for var in (x, y, z)}}))
+'''
+
+
+def exported_rows(lp):
+    # Number of constraints of an LP string (each one ends with its sense and right hand side)
+    constraints = re.split(r'\n(?:Bounds|Binaries|Generals|End)\n', lp.split('\nSubject To\n')[1])[0]
+    return len(re.findall(r'(?:<=|>=|=) -?[\d.e+]+$', constraints, re.MULTILINE))
+
+
+def test_export_single_agent_model_with_pool_cuts():
+    # The linking cuts f[e,c] <= u[e] have a variable on each side
+    N, V, commodities, edges = fn.read_data(INSTANCE)
+    mdl = mdls.build_single_agent_model(V, edges[0], commodities[0], cuts = 'pool')
+    assert mdl.number_of_user_cut_constraints > 0
+    lp = bk.export_lp(mdl)
+    assert 'User Cuts' not in lp
+    assert exported_rows(lp) == mdl.number_of_constraints + mdl.number_of_user_cut_constraints
+
+
+def test_export_cooperation_model_with_pool_cuts():
+    N, V, commodities, edges = fn.read_data(INSTANCE)
+    central_planner = cl.CentralizedSystem([cl.Agent(i, edges[i], commodities[i]) for i in range(N)], 'full_cooperation')
+    mdl = mdls.build_cooperation_model(V, central_planner.edges, central_planner.commodities, 'full_cooperation', [0]*N,
+                                       index = central_planner.index, cuts = 'pool')
+    assert mdl.number_of_user_cut_constraints > 0
+    lp = bk.export_lp(mdl)
+    assert 'User Cuts' not in lp
+    assert exported_rows(lp) == mdl.number_of_constraints + mdl.number_of_user_cut_constraints
+
+
+def test_difference_of_variables_and_constants():
+    N, V, commodities, edges = fn.read_data(INSTANCE)
+    mdl = mdls.build_single_agent_model(V, edges[0], commodities[0])
+    x, y = mdl.get_var_by_index(0), mdl.get_var_by_index(1)
+    for ct, terms, constant in ((x <= y, {x:1, y:-1}, 0), (x <= 1, {x:1}, -1), (2*x + 3 >= y, {x:2, y:-1}, 3)):
+        expr = bk.difference(mdl, ct.lhs, ct.rhs)
+        assert {var:coef for var, coef in expr.iter_terms() if coef != 0} == terms
+        assert expr.constant == constant
+
+
+# ----------------------------- Solves with the open-source backends -----------------------------
+
+def solve_tiny_model(backend):
+    # The solve runs in its own interpreter: the wheels of highspy and ortools ship different builds of HiGHS, which
+    # can't be loaded in the same process
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', TINY_MODEL, backend], cwd = src, capture_output = True, text = True, check = True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def check_tiny_solution(solution):
+    assert solution['objective'] == pytest.approx(10.5)
+    assert solution['values'] == pytest.approx({'x':3, 'y':0, 'z':1.5})
+
+
+def test_solve_highs():
+    pytest.importorskip('highspy')
+    check_tiny_solution(solve_tiny_model('highs'))
+
+
+def test_solve_cbc():
+    if shutil.which('cbc') is None:
+        pytest.skip('cbc is not in the PATH')
+    check_tiny_solution(solve_tiny_model('cbc'))
+
+
+def test_solve_cpsat():
+    pytest.importorskip('ortools')
+    check_tiny_solution(solve_tiny_model('cpsat'))
+
+
+# ----------------------------- Parsing of the solutions and of the LP files -----------------------------
+
+def test_variable_values_by_exported_name():
+    mdl = Model('names')
+    x, y, z = mdl.continuous_var(name = 'x'), mdl.continuous_var(name = 'y'), mdl.continuous_var(name = 'z')
+    assert bk.variable_values(mdl, {'x1':2.0, 'x2':0.0, 'x3':1e-12}) == {x:2.0}
+    assert bk.variable_values(mdl, {'x3':-1.5, 'x2':4.0}) == {z:-1.5, y:4.0}
+
+
+class FakeHighs:
+    # Columns and solution of a HiGHS model, as given by highspy
+    class Solution:
+        col_value = [3.0, 0.0, 1.5]
+
+    def getSolution(self):
+        return self.Solution()
+
+    def getColName(self, col):
+        return 0, ['x1','x2','x3'][col] # status of the call and name
+
+
+def test_highs_values():
+    assert bk.highs_values(FakeHighs()) == {'x1':3.0, 'x2':0.0, 'x3':1.5}
+
+
+def test_read_cbc_solution():
+    text = 'Optimal - objective value 10.50000000\n      0 x1                       3                      -2.5\n      2 x3                     1.5                         0\n'
+    assert bk.read_cbc_solution(text) == ({'x1':3.0, 'x3':1.5}, 'Optimal')
+    text = 'Stopped on time - objective value 9.00000000\n**    1 x2                       1                         0\n'
+    assert bk.read_cbc_solution(text) == ({'x2':1.0}, 'Stopped on time')
+    assert bk.read_cbc_solution('Infeasible - objective value 0.00000000\n')[0] is None
+    text = 'Stopped on time (no integer solution - continuous used) - objective value 11.5\n      0 x1                     0.5                         0\n'
+    assert bk.read_cbc_solution(text) == (None, 'Stopped on time (no integer solution - continuous used)')
+
+
+def test_read_lp_of_docplex():
+    mdl = Model('tiny')
+    x, y, z = mdl.integer_var(ub = 3, name = 'x'), mdl.binary_var(name = 'y'), mdl.continuous_var(lb = -1, ub = 2.5, name = 'z')
+    w = mdl.continuous_var(lb = -mdl.infinity, name = 'w')
+    mdl.add_constraint(x + 2*y + z - w <= 4.5)
+    mdl.add_constraint(x - y == 1)
+    mdl.add_constraint(z + w >= -2)
+    mdl.maximize(3*x + 2*y + z)
+    data = bk.read_lp(bk.export_lp(mdl))
+    assert data['maximize']
+    assert data['objective'] == {'x1':3, 'x2':2, 'x3':1}
+    assert data['constraints'] == [({'x1':1, 'x2':2, 'x3':1, 'x4':-1}, '<=', 4.5), ({'x1':1, 'x2':-1}, '=', 1), ({'x3':1, 'x4':1}, '>=', -2)]
+    assert data['bounds'] == {'x1':(0, 3), 'x2':(0, 1), 'x3':(-1, 2.5), 'x4':(-math.inf, math.inf)}
+    assert data['integers'] == {'x1', 'x2'}
+
+
+def test_read_lp_of_matrix_models():
+    lp = 'Minimize\n obj: +3 x1 -1.5e+00 x2 + 2\nSubject To\n c1: +1 x1 +2 x2\n +1 x3 <= +2\n c2: -1 x1 >= -1\nBounds\n 0 <= x2 <= 1\n x3 free\nBinaries\n x1\nEnd\n'
+    data = bk.read_lp(lp)
+    assert not data['maximize']
+    assert (data['objective'], data['objective_constant']) == ({'x1':3, 'x2':-1.5}, 2)
+    assert data['constraints'] == [({'x1':1, 'x2':2, 'x3':1}, '<=', 2), ({'x1':-1}, '>=', -1)]
+    assert data['bounds'] == {'x1':(0, 1), 'x2':(0, 1), 'x3':(-math.inf, math.inf)}
+    assert data['integers'] == {'x1'}
@@ -0,0 +1,28 @@
+# Bounds of the coalition payoff of the mechanisms (main_bounds.py) against the payoffs of their exact models
+import os
+
+import pytest
+
+import main_bounds
+import main_no_cooperation
+import main_full_cooperation
+import main_partial_cooperation
+import main_residual_cooperation
+
+INSTANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)),'instances')
+
+
+@pytest.mark.parametrize('instance', ['2_3_nodes', '2_4_nodes', '3_3_nodes'])
+@pytest.mark.parametrize('with_baseline', [True, False])
+def test_bounds_of_the_mechanisms(instance, with_baseline):
+    instance = os.path.join(INSTANCES,instance)
+    baseline = main_no_cooperation.no_cooperation(instance)
+    exact = {'full_cooperation':main_full_cooperation.full_cooperation(instance, baseline = baseline),
+             'partial_cooperation':main_partial_cooperation.partial_cooperation(instance, baseline = baseline),
+             'residual_cooperation':main_residual_cooperation.residual_cooperation(instance, baseline = baseline)[1]}
+    analysis = main_bounds.bounds_analysis(instance, baseline = baseline if with_baseline else None)
+    for mechanism, payoff in exact.items():
+        assert analysis[mechanism]['lower'] - 1e-6 <= payoff <= analysis[mechanism]['upper'] + 1e-6
+    assert analysis['no_cooperation']['lower'] - 1e-6 <= baseline.payoff <= analysis['no_cooperation']['upper'] + 1e-6
+    iterative = analysis['iterative_cooperation']
+    assert iterative['lower'] is None and iterative['upper'] is None and iterative['gain'] is None
@@ -0,0 +1,49 @@
+# Shapley value, least core and core of the coalition games (lib/coalitions.py), with given values of the coalitions
+import os
+
+import pytest
+
+import lib.coalitions as co
+
+INSTANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)),'instances')
+
+
+def game(instance, values):
+    # Game of the agents of the instance with the given values ({tuple of agent ids: value}) instead of solving the coalitions
+    game = co.CoalitionGame(os.path.join(INSTANCES,instance))
+    assert len(values) == 2**game.N - 1
+    game.results = {frozenset(coalition):{'objective':value} for coalition, value in values.items()}
+    return game
+
+
+def test_two_agents():
+    two_agents = game('2_3_nodes', {(0,):8, (1,):6, (0,1):25})
+    assert two_agents.shapley_values() == pytest.approx([13.5, 11.5])
+    allocation, excess = two_agents.core_allocation()
+    assert allocation == pytest.approx([13.5, 11.5])
+    assert excess == pytest.approx(-5.5)
+    assert two_agents.in_core([13.5, 11.5])
+    assert two_agents.in_core([19, 6])
+    assert two_agents.core_violations([20, 5]) == {frozenset({1}):pytest.approx(1)}
+    assert set(two_agents.core_violations([13, 11])) == {frozenset({0,1})} # Doesn't divide the value of the grand coalition
+
+
+def test_three_agents_with_core():
+    # Any two agents obtain 2 and the three agents 6, so the core is the allocations of 6 with at most 4 for each agent
+    three_agents = game('3_3_nodes', {(0,):0, (1,):0, (2,):0, (0,1):2, (0,2):2, (1,2):2, (0,1,2):6})
+    assert three_agents.shapley_values() == pytest.approx([2, 2, 2])
+    allocation, excess = three_agents.core_allocation()
+    assert allocation == pytest.approx([2, 2, 2])
+    assert excess == pytest.approx(-2)
+    assert three_agents.in_core([3, 3, 0])
+    assert three_agents.core_violations([5, 1, 0]) == {frozenset({1,2}):pytest.approx(1)}
+
+
+def test_three_agents_with_empty_core():
+    # Majority game: any two agents obtain 1, as the three agents, so some pair always gets less than 1
+    majority = game('3_3_nodes', {(0,):0, (1,):0, (2,):0, (0,1):1, (0,2):1, (1,2):1, (0,1,2):1})
+    assert majority.shapley_values() == pytest.approx([1/3, 1/3, 1/3])
+    allocation, excess = majority.core_allocation()
+    assert allocation == pytest.approx([1/3, 1/3, 1/3])
+    assert excess == pytest.approx(1/3)
+    assert not majority.in_core(allocation)
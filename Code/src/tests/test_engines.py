@@ -0,0 +1,62 @@
+# Engines of the cooperation models (lib/engines.py), on instances small enough for CPLEX Community Edition
+import os
+import warnings
+
+import pytest
+
+import lib.classes as cl
+import lib.functions as fn
+import lib.engines as eng
+import lib.column_generation as cg
+import lib.heuristics as hr
+import lib.instrumentation as ins
+
+INSTANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)),'instances')
+
+
+def central_planner(instance):
+    N, V, commodities, edges = fn.read_data(os.path.join(INSTANCES,instance))
+    return N, V, cl.CentralizedSystem([cl.Agent(i, edges[i], commodities[i]) for i in range(N)], 'full_cooperation')
+
+
+def solve(instance, type_cooperation, agents_minimal_profit, **settings):
+    # Result of the model and the engine which solved it
+    N, V, planner = central_planner(instance)
+    settings = cl.SolverSettings(**settings)
+    stats = ins.ModelStats(settings, instance, type_cooperation)
+    result = eng.solve_cooperation(V, planner, type_cooperation, agents_minimal_profit, settings, stats)
+    return result, stats.data['engine']
+
+
+def test_benders_without_minimal_profits():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        result, engine = solve('2_3_nodes', 'full_cooperation', None, engine = 'benders')
+    assert engine == 'benders'
+    assert result['objective'] == pytest.approx(20)
+
+
+def test_benders_with_minimal_profits_uses_the_arc_model():
+    with pytest.warns(UserWarning, match = "engine = 'benders'"):
+        result, engine = solve('2_3_nodes', 'full_cooperation', [0, 0], engine = 'benders')
+    assert engine == 'arc'
+    assert result['objective'] == pytest.approx(solve('2_3_nodes', 'full_cooperation', [0, 0])[0]['objective'])
+
+
+# ----------------------------- Path formulation -----------------------------
+
+@pytest.mark.parametrize('instance', ['2_3_nodes', '2_4_nodes', '3_3_nodes'])
+@pytest.mark.parametrize('type_cooperation', ['full_cooperation', 'partial_cooperation'])
+def test_path_engine_between_greedy_routes_and_relaxation_bound(instance, type_cooperation):
+    # The relaxation bounds the optimum of the arc model, and price-and-branch (without branching) is at most the optimum
+    # and at least the greedy routes given as its start
+    N, V, planner = central_planner(instance)
+    minimal_profits = [0]*N
+    greedy = hr.greedy_routes(planner.edges, planner.commodities, type_cooperation, minimal_profits, planner.index)
+    optimum = solve(instance, type_cooperation, minimal_profits)[0]['objective']
+    result = cg.solve_cooperation_paths(planner.edges, planner.commodities, type_cooperation, minimal_profits, planner.index, start = greedy)
+    assert result['stats']['relaxation_bound'] is not None
+    assert result['stats']['relaxation_bound'] >= optimum - 1e-6
+    assert optimum >= result['objective'] - 1e-6
+    assert result['objective'] >= greedy['objective'] - 1e-6
+    assert result['stats']['bound_gap'] == pytest.approx(result['stats']['relaxation_bound'] - result['objective'])
@@ -0,0 +1,34 @@
+# Reading of the instances in the text and binary formats (lib/instances.py)
+import os
+import shutil
+
+import numpy as np
+
+import lib.instances as ins
+
+INSTANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)),'instances')
+
+
+def assert_same_arrays(arrays, expected):
+    assert arrays[:2] == expected[:2]
+    assert np.array_equal(arrays[2], expected[2]) and np.array_equal(arrays[3], expected[3])
+
+
+def test_binary_file_without_text_file(tmp_path):
+    text = ins.parse_text(os.path.join(INSTANCES,'2_3_nodes'))
+    path = str(tmp_path / '2_3_nodes')
+    ins.save_binary(path, *text)
+    assert_same_arrays(ins.load_arrays(path), text)
+    assert_same_arrays(ins.load_arrays(path + '.npz'), text)
+
+
+def test_text_file_newer_than_binary_file(tmp_path):
+    path = str(tmp_path / '2_3_nodes')
+    shutil.copy(os.path.join(INSTANCES,'2_3_nodes'), path)
+    text = ins.parse_text(path)
+    ins.save_binary(path, *text)
+    assert_same_arrays(ins.load_arrays(path), text)
+    # The text file is edited after the binary file was written, so the binary file is out of date
+    shutil.copy(os.path.join(INSTANCES,'3_3_nodes'), path)
+    os.utime(path, (os.path.getmtime(ins.binary_path(path)) + 10,)*2)
+    assert_same_arrays(ins.load_arrays(path), ins.parse_text(os.path.join(INSTANCES,'3_3_nodes')))
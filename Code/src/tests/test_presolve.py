@@ -0,0 +1,31 @@
+# Presolve of the models (lib/presolve.py): the mechanisms give the same results with and without it
+import os
+
+import pytest
+
+import lib.classes as cl
+import lib.functions as fn
+import lib.presolve as ps
+import main_full_cooperation
+import main_partial_cooperation
+import main_residual_cooperation
+
+INSTANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)),'instances')
+
+
+def test_presolve_removes_the_commodities_without_units():
+    N, V, commodities, edges = fn.read_data(os.path.join(INSTANCES,'2_4_nodes'))
+    agent = cl.Agent(0, edges[0], commodities[0])
+    E, kept, index = ps.presolve(agent.edges, agent.commodities)
+    assert set(kept) == {c for c in agent.commodities if agent.commodities[c].units > 0} != set(agent.commodities)
+    assert set(index.edges) == set(E)
+
+
+@pytest.mark.parametrize('engine', ['arc', 'matrix'])
+@pytest.mark.parametrize('mechanism', [main_full_cooperation.full_cooperation, main_partial_cooperation.partial_cooperation,
+                                       main_residual_cooperation.residual_cooperation])
+def test_same_result_with_and_without_presolve(mechanism, engine):
+    instance = os.path.join(INSTANCES,'2_4_nodes')
+    with_presolve = mechanism(instance, cl.SolverSettings(engine = engine, presolve = True))
+    without_presolve = mechanism(instance, cl.SolverSettings(engine = engine, presolve = False))
+    assert with_presolve == pytest.approx(without_presolve)